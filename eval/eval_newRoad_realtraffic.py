@@ -107,14 +107,14 @@ for i in range(3):
     driver_types[d.id] = "BaseAStar"
 
 extra_drivers = []
+trip_ends = {}  # driver id -> (origin, dest) for background traffic, others go A -> P
 traffic_routes = [
     ("A", "P"), ("A", "P"), ("E", "P"), ("E", "P"),
     ("I", "P"), ("I", "P"), ("A", "L"), ("A", "L"),
 ]
 for i, (origin, dest) in enumerate(traffic_routes):
     d = Driver(driver_id=f"Traffic_{i}", network=network, stress_tolerance=0.0, familiarity_weight=0.0, learning_rate=0.0)
-    d.fixed_origin = origin
-    d.fixed_dest = dest
+    trip_ends[d.id] = (origin, dest)
     extra_drivers.append(d)
     driver_types[d.id] = "Traffic"
 
@@ -133,8 +133,7 @@ for trip in range(1, NUM_TRIPS_BEFORE + 1):
     reset_network(network)
     for d in all_drivers:
         d.current_vehicle = None
-        origin = getattr(d, 'fixed_origin', 'A')
-        dest = getattr(d, 'fixed_dest', 'P')
+        origin, dest = trip_ends.get(d.id, ('A', 'P'))
         d.start_trip(origin, dest, network)
     for dtype, col in collectors.items():
         col.log_roads(trip, network.roads)
@@ -156,8 +155,7 @@ for trip in range(NUM_TRIPS_BEFORE + 1, NUM_TRIPS_BEFORE + NUM_TRIPS_AFTER + 1):
     reset_network(network)
     for d in all_drivers:
         d.current_vehicle = None
-        origin = getattr(d, 'fixed_origin', 'A')
-        dest = getattr(d, 'fixed_dest', 'P')
+        origin, dest = trip_ends.get(d.id, ('A', 'P'))
         d.start_trip(origin, dest, network)
     for dtype, col in collectors.items():
         col.log_roads(trip, network.roads)
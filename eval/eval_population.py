@@ -4,7 +4,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from src.network import TrafficNetwork, Node, Road
 from src.driver import Driver
-from src.dataCollection import DataCollector
+from src.scenarioRunner import ScenarioSpec, run_scenarios
 from src.visualization import visualize_network_with_traffic
 import matplotlib.pyplot as plt
 
@@ -91,49 +91,59 @@ def run_scenario(network, drivers, num_trips, collector):
             log_trip_data(collector, d)
 
 
+def run_trips(network, drivers, collector, spec):
+    run_scenario(network, drivers, NUM_TRIPS, collector)
+
+
+def base_drivers(network):
+    return [Driver(f"Base_{i}", network, stress_tolerance=0.0, familiarity_weight=0.0, learning_rate=0.0) for i in range(NUM_DRIVERS)]
+
+
+def balanced_drivers(network):
+    return [Driver(f"Balanced_{i}", network, stress_tolerance=0.5, familiarity_weight=0.5, learning_rate=0.3) for i in range(NUM_DRIVERS)]
+
+
+def mixed_drivers(network):
+    drivers = []
+    configs = [
+        ("Explorer",  5, 0.1, 0.1, 0.3),
+        ("Habitual",  5, 0.9, 0.1, 0.3),
+        ("Cautious",  5, 0.1, 0.9, 0.3),
+        ("Balanced",  5, 0.5, 0.5, 0.3),
+    ]
+    for dtype, count, fam, stress, lr in configs:
+        for i in range(count):
+            drivers.append(Driver(f"{dtype}_{i}", network, stress_tolerance=stress, familiarity_weight=fam, learning_rate=lr))
+    return drivers
+
+
+FINAL_STATE_PLOTS = {
+    "AllBaseAStar": (f"All Base A* ({NUM_DRIVERS} drivers)", "network_all_astar.png"),
+    "AllBalanced": (f"All Balanced Adaptive ({NUM_DRIVERS} drivers)", "network_all_balanced.png"),
+    "Mixed": (f"Mixed Personalities ({NUM_DRIVERS} drivers)", "network_mixed.png"),
+}
+
+
+def save_final_state(spec, network, drivers):
+    title, filename = FINAL_STATE_PLOTS[spec.name]
+    fig, ax = visualize_network_with_traffic(network, title)
+    plt.savefig(os.path.join(OUTPUT_DIR, filename), dpi=150)
+    plt.close()
+
+
 # ============================================================
 
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-
-# Scenario 1: All base A*
-net1 = build_network()
-drivers1 = [Driver(f"Base_{i}", net1, stress_tolerance=0.0, familiarity_weight=0.0, learning_rate=0.0) for i in range(NUM_DRIVERS)]
-col1 = DataCollector(output_dir=os.path.join(OUTPUT_DIR, "AllBaseAStar"), log_interval=1)
-run_scenario(net1, drivers1, NUM_TRIPS, col1)
-
-fig, ax = visualize_network_with_traffic(net1, f"All Base A* ({NUM_DRIVERS} drivers)")
-plt.savefig(os.path.join(OUTPUT_DIR, "network_all_astar.png"), dpi=150)
-plt.close()
-
-# Scenario 2: All balanced adaptive
-net2 = build_network()
-drivers2 = [Driver(f"Balanced_{i}", net2, stress_tolerance=0.5, familiarity_weight=0.5, learning_rate=0.3) for i in range(NUM_DRIVERS)]
-col2 = DataCollector(output_dir=os.path.join(OUTPUT_DIR, "AllBalanced"), log_interval=1)
-run_scenario(net2, drivers2, NUM_TRIPS, col2)
-
-fig, ax = visualize_network_with_traffic(net2, f"All Balanced Adaptive ({NUM_DRIVERS} drivers)")
-plt.savefig(os.path.join(OUTPUT_DIR, "network_all_balanced.png"), dpi=150)
-plt.close()
-
-# Scenario 3: Mixed personalities
-net3 = build_network()
-drivers3 = []
-configs = [
-    ("Explorer",  5, 0.1, 0.1, 0.3),
-    ("Habitual",  5, 0.9, 0.1, 0.3),
-    ("Cautious",  5, 0.1, 0.9, 0.3),
-    ("Balanced",  5, 0.5, 0.5, 0.3),
-]
-for dtype, count, fam, stress, lr in configs:
-    for i in range(count):
-        drivers3.append(Driver(f"{dtype}_{i}", net3, stress_tolerance=stress, familiarity_weight=fam, learning_rate=lr))
-
-col3 = DataCollector(output_dir=os.path.join(OUTPUT_DIR, "Mixed"), log_interval=1)
-run_scenario(net3, drivers3, NUM_TRIPS, col3)
-
-fig, ax = visualize_network_with_traffic(net3, f"Mixed Personalities ({NUM_DRIVERS} drivers)")
-plt.savefig(os.path.join(OUTPUT_DIR, "network_mixed.png"), dpi=150)
-plt.close()
-
-print(f"Results saved to {OUTPUT_DIR}/")
\ No newline at end of file
+if __name__ == "__main__":
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    # The three populations are independent, so they run in parallel
+    specs = [
+        ScenarioSpec(name, build_network, factory, duration=0, seed=0,
+                     output_dir=os.path.join(OUTPUT_DIR, name), log_interval=1,
+                     run_function=run_trips, finish=save_final_state)
+        for name, factory in [("AllBaseAStar", base_drivers), ("AllBalanced", balanced_drivers), ("Mixed", mixed_drivers)]
+    ]
+    run_scenarios(specs)
+
+    print(f"Results saved to {OUTPUT_DIR}/")
@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from src.networkGenerators import grid_network
+from src.pathfinding import AStar, AdaptivePathfinder
+from src.driver import Driver
+from src.vehicle import Vehicle
+from src.network import Road
+from src.simulation import Simulation
+from src.dataCollection import DataCollector
+from src.routeDictionary import RouteDictionary
+
+"""
+Benchmarks for routing, ticking, logging and memory per object.
+
+    python -m src.benchmark --sizes small medium --output bench.json
+    python -m src.benchmark --baseline bench.json --tolerance 0.2
+
+Each size is a square grid network (see networkGenerators) and a driver population.
+Results are written as JSON. Metrics ending in _per_sec are better when higher,
+bytes_per_* when lower; with --baseline, any metric more than tolerance worse than
+the baseline is reported and the exit code is 1.
+"""
+
+# Size name -> (grid side, number of drivers)
+SIZES = {
+    "tiny": (5, 10),
+    "small": (10, 50),
+    "medium": (30, 500),
+    "large": (100, 5000),
+}
+
+
+def _best_rate(work: Callable[[], int], repeat: int) -> float:
+    # Best of repeat runs of work(), which returns how many operations it did
+    best = 0.0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operations = work()
+        elapsed = time.perf_counter() - started
+        best = max(best, operations / elapsed if elapsed > 0 else 0.0)
+    return best
+
+
+def _bytes_per(create: Callable[[int], List], count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def bench_routing(side: int, queries: int, repeat: int, seed: int = 0) -> Dict[str, float]:
+    network = grid_network(side, side, seed=seed)
+    rng = random.Random(seed)
+    node_ids = list(network.nodes)
+    pairs = [tuple(rng.sample(node_ids, 2)) for _ in range(queries)]
+
+    # A driver that has learned about a random half of the roads
+    driver = Driver("bench", network)
+    for road_id in rng.sample(list(network.roads), len(network.roads) // 2):
+        driver.memory[road_id] = {"usage": rng.randint(1, 5), "avg_speed": rng.uniform(10, 60), "avg_stress": rng.random()}
+
+    def run(pathfinder):
+        def work():
+            for start, goal in pairs:
+                pathfinder.find_path(start, goal)
+            return len(pairs)
+        return work
+
+    return {
+        "astar_queries_per_sec": _best_rate(run(AStar(network)), repeat),
+        "adaptive_queries_per_sec": _best_rate(run(AdaptivePathfinder(network, driver=driver)), repeat),
+    }
+
+
+def bench_simulation(side: int, num_drivers: int, ticks: int, repeat: int, seed: int = 0) -> Dict[str, float]:
+    # Vehicle updates are the moves of vehicles on the road that the run performed
+    # (Simulation.vehicle_updates), not counting idle drivers or ones waiting to start
+    best = {"ticks_per_sec": 0.0, "vehicle_updates_per_sec": 0.0}
+
+    for _ in range(repeat):
+        network = grid_network(side, side, seed=seed)
+        drivers = [Driver(f"D{i}", network) for i in range(num_drivers)]
+
+        with tempfile.TemporaryDirectory() as run_dir:
+            collector = DataCollector(output_dir=run_dir, log_interval=ticks)
+            simulation = Simulation(network, drivers, collector, seed=seed)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # Keep the JSON on stdout clean
+                simulation.run(duration=ticks)
+            elapsed = time.perf_counter() - started
+
+        best["ticks_per_sec"] = max(best["ticks_per_sec"], ticks / elapsed)
+        best["vehicle_updates_per_sec"] = max(best["vehicle_updates_per_sec"], simulation.vehicle_updates / elapsed)
+    return best
+
+
+def bench_logging(side: int, rows: int, repeat: int, seed: int = 0) -> Dict[str, float]:
+    network = grid_network(side, side, seed=seed)
+    road_ids = list(network.roads)
+    routes = [road_ids[i:i + 5] for i in range(0, min(len(road_ids), 500), 5)]
+
+    with tempfile.TemporaryDirectory() as run_dir:
+        collector = DataCollector(output_dir=run_dir, route_dictionary=RouteDictionary())
+
+        def trips():
+            for i in range(rows):
+                collector.log_trip(f"D{i % 100}", i, "A", "B", routes[i % len(routes)], 60.0, 500.0, 30.0, 0.1)
+            collector.flush()
+            return rows
+
+        def snapshots():
+            count = 0
+            while count < rows:
+                collector.log_roads(count, network.roads)
+                count += len(network.roads)
+            collector.flush()
+            return count
+
+        return {
+            "trip_rows_per_sec": _best_rate(trips, repeat),
+            "road_rows_per_sec": _best_rate(snapshots, repeat),
+        }
+
+
+def bench_memory(side: int, count: int, seed: int = 0) -> Dict[str, float]:
+    network = grid_network(side, side, seed=seed)
+    roads = list(network.roads.values())
+    start, end = roads[0].start, roads[0].end
+
+    return {
+        "bytes_per_driver": _bytes_per(lambda n: [Driver(f"D{i}", network, max_speed=20.0) for i in range(n)], count),
+        "bytes_per_vehicle": _bytes_per(lambda n: [Vehicle(f"V{i}", route=roads[:5]) for i in range(n)], count),
+        "bytes_per_road": _bytes_per(lambda n: [Road(f"R{i}", start, end, 50, 5) for i in range(n)], count),
+    }
+
+
+def run_benchmarks(sizes: List[str], repeat: int = 3, queries: int = 200, ticks: int = 100,
+                   rows: int = 20000, seed: int = 0, progress: Optional[Callable] = print) -> Dict:
+
+    report = {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": {},
+    }
+    for size in sizes:
+        side, num_drivers = SIZES[size]
+        results = {"nodes": side * side, "drivers": num_drivers}
+        results.update(bench_routing(side, queries, repeat, seed))
+        results.update(bench_simulation(side, num_drivers, ticks, repeat, seed))
+        results.update(bench_logging(side, rows, repeat, seed))
+        results.update(bench_memory(side, 1000, seed))
+        report["results"][size] = results
+        if progress:
+            progress(f"{size}: " + ", ".join(f"{k}={v:,.0f}" for k, v in results.items()))
+    return report
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    # Returns a line for each metric more than tolerance worse than the baseline
+    regressions = []
+    for size, results in report["results"].items():
+        for metric, value in results.items():
+            old = baseline.get("results", {}).get(size, {}).get(metric)
+            if not old:
+                continue
+            if metric.endswith("_per_sec"):
+                change = (old - value) / old
+            elif metric.startswith("bytes_per_"):
+                change = (value - old) / old
+            else:
+                continue
+            if change > tolerance:
+                regressions.append(f"{size} {metric}: {value:,.1f} vs baseline {old:,.1f} ({change:.0%} worse)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark routing, simulation, logging and memory")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, repeat=args.repeat, progress=lambda line: print(line, file=sys.stderr))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        # stderr, so the JSON on stdout stays parseable without --output
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,61 +1,218 @@
 import csv
+import gzip
+import io
+import json
+import lzma
 import os
+import weakref
+from typing import Dict, Iterator, List, Optional
+from src.routeDictionary import RouteDictionary
+from src.loggingPolicy import LoggingPolicy, AggregateCounters
+
+# Compression name -> file extension
+COMPRESSION_EXTENSIONS = {
+    None: "",
+    "gzip": ".gz",
+    "lzma": ".xz",
+}
+
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_BLOCK_SIZE = 1 << 20  # 1 MiB of CSV text per compressed block
+
+
+class BlockWriter:
+    # Appends CSV rows to a file. Compressed output is buffered and written as
+    # independent gzip members / xz streams of about block_size bytes, so the file
+    # is always readable and never has to be rewritten or held open.
+
+    def __init__(self, filepath: str, compression: Optional[str] = None,
+                 level: int = DEFAULT_COMPRESSION_LEVEL, block_size: int = DEFAULT_BLOCK_SIZE):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.filepath = filepath
+        self.compression = compression
+        self.level = level
+        self.block_size = block_size
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+        with open(filepath, 'wb'):  # Truncate
+            pass
+
+    def write_rows(self, rows: List[List]):
+        if self.compression is None:
+            with open(self.filepath, 'a', newline='') as f:
+                csv.writer(f).writerows(rows)
+            return
+
+        self.writer.writerows(rows)
+        if self.buffer.tell() >= self.block_size:
+            self.flush()
+
+    def pending_bytes(self) -> int: # Buffered text not yet compressed and written
+        return self.buffer.tell()
+
+    def flush(self):
+        data = self.buffer.getvalue()
+        if not data:
+            return
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+        raw = data.encode("utf-8")
+        if self.compression == "gzip":
+            block = gzip.compress(raw, compresslevel=self.level)
+        else:
+            block = lzma.compress(raw, preset=self.level)
+
+        with open(self.filepath, 'ab') as f:
+            f.write(block)
+
+
+def _flush_writers(writers: List[BlockWriter]):
+    for writer in writers:
+        writer.flush()
+
+
+def open_results_file(filepath: str, mode: str = 'rt'):
+    # Opens plain, .gz or .xz results files transparently
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, mode, newline='')
+    if filepath.endswith(".xz"):
+        return lzma.open(filepath, mode, newline='')
+    return open(filepath, mode, newline='')
+
+
+def find_results_file(directory: str, filename: str) -> Optional[str]:
+    # Returns the path of filename in directory, with whichever compression it was written
+    for extension in COMPRESSION_EXTENSIONS.values():
+        filepath = os.path.join(directory, filename + extension)
+        if os.path.exists(filepath):
+            return filepath
+    return None
+
+
+def iter_row_batches(filepath: str, batch_size: int = 1024) -> Iterator[List[Dict[str, str]]]:
+    # Streams rows back as lists of dicts without decompressing the whole file
+    with open_results_file(filepath) as f:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
 
 class DataCollector:
-    
-    def __init__(self, output_dir: str = "simulation_data", log_interval: int = 60): # Default log_interval: 60 in simulation seconds
+
+    def __init__(self, output_dir: str = "simulation_data", log_interval: int = 60, route_dictionary = None,
+                 compression: Optional[str] = None, compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+                 block_size: int = DEFAULT_BLOCK_SIZE, policy: LoggingPolicy = None): # Default log_interval: 60 in simulation seconds
         self.output_dir = output_dir
         self.log_interval = log_interval
-        
+        self.route_dictionary = route_dictionary if route_dictionary is not None else RouteDictionary()
+        self.logged_routes = set()  # route ids already written to the side table
+        self.compression = compression
+        self.policy = policy if policy is not None else LoggingPolicy()
+        self.aggregates = AggregateCounters()  # Unsampled trips and roads in tiered mode
+
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
-        
-        self.trips_file = os.path.join(output_dir, "trips.csv")
-        self.roads_file = os.path.join(output_dir, "road_snapshots.csv")
-        
+
+        extension = COMPRESSION_EXTENSIONS.get(compression, "")
+        self.trips_file = os.path.join(output_dir, "trips.csv" + extension)
+        self.roads_file = os.path.join(output_dir, "road_snapshots.csv" + extension)
+        self.routes_file = os.path.join(output_dir, "routes.csv" + extension)
+        self.aggregates_file = os.path.join(output_dir, "aggregates.json")
+
+        self.trips_writer = BlockWriter(self.trips_file, compression, compression_level, block_size)
+        self.roads_writer = BlockWriter(self.roads_file, compression, compression_level, block_size)
+        self.routes_writer = BlockWriter(self.routes_file, compression, compression_level, block_size)
+
+        # Buffered blocks are written out even if flush() is never called
+        self._finalizer = weakref.finalize(self, _flush_writers,
+                                           [self.trips_writer, self.roads_writer, self.routes_writer])
+
         # Create files with headers
-        with open(self.trips_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["driver_id", "trip_number", "start_node", "goal_node", 
-                           "route_taken", "total_trip_time", "total_distance", 
-                           "average_speed", "average_stress"])
-        
-        with open(self.roads_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["timestamp", "road_id", "vehicle_count", 
-                           "current_speed_kmh", "density", "stress_level"])
-    
+        self.trips_writer.write_rows([["driver_id", "trip_number", "start_node", "goal_node",
+                                       "route_id", "total_trip_time", "total_distance",
+                                       "average_speed", "average_stress"]])
+
+        self.roads_writer.write_rows([["timestamp", "road_id", "vehicle_count",
+                                       "current_speed_kmh", "density", "stress_level"]])
+
+        self.routes_writer.write_rows([["route_id", "route_taken"]])
+
+    def wants_trip(self, driver_id) -> bool: # Whether this driver's trips get full rows
+        return self.policy.samples_driver(driver_id)
+
+    def count_trip(self, trip_time, distance): # Aggregate-only path for unsampled drivers
+        if self.policy.tiered:
+            self.aggregates.add_trip(trip_time, distance)
+
     def log_trip(self, driver_id, trip_number, start_node, goal_node,
                  route_taken, trip_time, distance, avg_speed, avg_stress):
-        
-        with open(self.trips_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                driver_id,
-                trip_number,
-                start_node,
-                goal_node,
-                "->".join(route_taken),
-                round(trip_time, 2),
-                round(distance, 2),
-                round(avg_speed, 2),
-                round(avg_stress, 4)
-            ])
-    
+
+        if not self.policy.samples_driver(driver_id):
+            self.count_trip(trip_time, distance)
+            return
+
+        # route_taken is a route id from this collector's route_dictionary, or a list of road ids to intern
+        if isinstance(route_taken, int):
+            route_id = route_taken
+        else:
+            route_id = self.route_dictionary.intern(route_taken)
+
+        if route_id not in self.logged_routes:
+            self.logged_routes.add(route_id)
+            self.routes_writer.write_rows([[route_id, self.route_dictionary.to_string(route_id)]])
+
+        self.trips_writer.write_rows([[
+            driver_id,
+            trip_number,
+            start_node,
+            goal_node,
+            route_id,
+            round(trip_time, 2),
+            round(distance, 2),
+            round(avg_speed, 2),
+            round(avg_stress, 4)
+        ]])
+
     def log_roads(self, timestamp, roads):
-        
-        with open(self.roads_file, 'a', newline='') as f:
-            writer = csv.writer(f)
+
+        if not self.policy.logs_everything:
+            selected = {}
             for road_id, road in roads.items():
-                writer.writerow([
-                    round(timestamp, 2),
-                    road_id,
-                    len(road.vehicles),
-                    round(road.current_speed * 3.6, 2),  # Convert m/s to km/h
-                    round(road.get_density(), 4),
-                    round(road.get_stress_level(), 4)
-                ])
-    
+                if self.policy.samples_road(road):
+                    selected[road_id] = road
+                elif self.policy.tiered:
+                    self.aggregates.add_road(road)
+            roads = selected
+
+        self.roads_writer.write_rows([[
+            round(timestamp, 2),
+            road_id,
+            road.occupancy,
+            round(road.current_speed * 3.6, 2),  # Convert m/s to km/h
+            round(road.get_density(), 4),
+            round(road.get_stress_level(), 4)
+        ] for road_id, road in roads.items()])
+
     def should_log_roads(self, timestamp): # Chack whether to make a snapshot
-        return timestamp % self.log_interval == 0
\ No newline at end of file
+        return timestamp % self.log_interval == 0
+
+    def pending_bytes(self) -> int:
+        return self.trips_writer.pending_bytes() + self.roads_writer.pending_bytes() + self.routes_writer.pending_bytes()
+
+    def flush(self): # Write out any buffered compressed blocks and the tiered aggregates
+        self.trips_writer.flush()
+        self.roads_writer.flush()
+        self.routes_writer.flush()
+
+        if self.policy.tiered:
+            with open(self.aggregates_file, 'w') as f:
+                json.dump(self.aggregates.to_dict(), f, indent=2)
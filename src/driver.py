@@ -1,13 +1,84 @@
-from typing import Dict, List, Optional
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
 from src.vehicle import Vehicle
-from src.pathfinding import AdaptivePathfinder
+from src.pathfinding import AdaptivePathfinder, RoutingContext
+from src.routeDictionary import RouteDictionary, EMPTY_ROUTE
+from src.randomStreams import stream
+
+# Fields of a TripRecord that can also be read and written by key, as in the old trip dict
+TRIP_FIELDS = ("start_node", "goal_node", "roads_traveled", "total_time", "total_distance")
+
+
+class TripRecord:
+    # The trip in progress. Observations are kept per road as [speed sum (km/h), stress sum, count]
+    # instead of growing lists, with running sums over the whole trip for the summary.
+    # A driver keeps one record and resets it at the start of every trip
+
+    __slots__ = TRIP_FIELDS + ("observations", "speed_sum", "stress_sum", "observation_count")
+
+    def __init__(self, start_node: str = None, goal_node: str = None):
+        self.observations: Dict[str, List] = {}
+        self.reset(start_node, goal_node)
+
+    def reset(self, start_node: str = None, goal_node: str = None):
+        self.start_node = start_node
+        self.goal_node = goal_node
+        self.roads_traveled = EMPTY_ROUTE  # interned route id, extended road by road
+        self.total_time = 0.0
+        self.total_distance = 0.0
+        self.observations.clear()
+        self.speed_sum = 0.0
+        self.stress_sum = 0.0
+        self.observation_count = 0
+
+    def observe(self, road_id: str, speed: float, stress: float):
+        entry = self.observations.get(road_id)
+        if entry is None:
+            entry = self.observations[road_id] = [0.0, 0.0, 0]
+        entry[0] += speed
+        entry[1] += stress
+        entry[2] += 1
+        self.speed_sum += speed
+        self.stress_sum += stress
+        self.observation_count += 1
+
+    def __getitem__(self, key: str):
+        if key not in TRIP_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in TRIP_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def to_dict(self) -> Dict:
+        data = {field: getattr(self, field) for field in TRIP_FIELDS}
+        data["observations"] = {road_id: list(entry) for road_id, entry in self.observations.items()}
+        data["totals"] = [self.speed_sum, self.stress_sum, self.observation_count]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TripRecord':
+        record = cls()
+        for field in TRIP_FIELDS:
+            setattr(record, field, data[field])
+        record.observations = {road_id: list(entry) for road_id, entry in data["observations"].items()}
+        record.speed_sum, record.stress_sum, record.observation_count = data["totals"]
+        return record
+
 
 class Driver:
 
-    def __init__(self, driver_id: str, network, stress_tolerance: float = 0.5, familiarity_weight: float = 0.5, learning_rate: float = 0.3, fixed_route: List[str] = None):
+    __slots__ = ("id", "pathfinder", "routes", "stress_tolerance", "familiarity_weight", "learning_rate",
+                 "fixed_route", "last_goal", "exact_transitions", "leftover_time", "rng", "memory",
+                 "current_vehicle", "trip_count", "current_trip_data", "waiting_to_start")
+
+    def __init__(self, driver_id: str, network, stress_tolerance: float = 0.5, familiarity_weight: float = 0.5, learning_rate: float = 0.3, fixed_route: List[str] = None, exact_transitions: bool = True, seed: Optional[int] = None, max_speed: Optional[float] = None, context: Optional[RoutingContext] = None):
 
         self.id = driver_id
-        self.pathfinder = AdaptivePathfinder(network, driver=self)
+        self.pathfinder = AdaptivePathfinder(network, driver=self, max_speed=max_speed, context=context)
+        self.routes: Optional[RouteDictionary] = None  # Set by Simulation to its collector's, else own one from the first trip
 
         # Personality paramenters
         self.stress_tolerance = stress_tolerance
@@ -18,44 +89,74 @@ class Driver:
         self.fixed_route = fixed_route
         self.last_goal = None
 
+        # Passed to each Vehicle, False restores one-road-change-per-tick movement
+        self.exact_transitions = exact_transitions
+        self.leftover_time = 0.0  # Unused part of the last tick when a trip ends mid-tick
+
+        # Own random stream when a master seed is given, otherwise the shared global one
+        self.rng = random
+        if seed is not None:
+            self.seed_stream(seed)
+
         self.memory: Dict[str, Dict] = {}
 
         self.current_vehicle: Optional[Vehicle] = None
         self.trip_count = 0
+        self.waiting_to_start = False
 
-        self.current_trip_data = {
-            "start_node": None,
-            "goal_node": None,
-            "roads_traveled": [],
-            "total_time": 0.0,
-            "total_distance": 0.0,
-            "speed_observations": {},
-            "stress_observations": {}
-        }
+        self.current_trip_data = TripRecord()
+
+    @classmethod
+    def build_many(cls, network, personalities: Iterable[Tuple[str, Dict]], **options) -> List['Driver']:
+        # One driver per (driver id, keyword arguments) pair, options going to all of them.
+        # The network's RoutingContext is looked up once and shared by every pathfinder
+        context = RoutingContext.of(network)
+        return [cls(driver_id, network, context=context, **options, **personality)
+                for driver_id, personality in personalities]
+
+    def use_routes(self, routes: RouteDictionary):
+        # Switch to another route dictionary, re-interning the route of a trip in progress
+        if self.routes is not None and self.routes is not routes:
+            trip = self.current_trip_data
+            trip.roads_traveled = routes.intern(self.routes.roads(trip.roads_traveled))
+        self.routes = routes
 
-    def start_trip(self, start_node: str, goal_node: str, network):
+    def seed_stream(self, master_seed: int):
+        self.rng = stream(master_seed, f"driver:{self.id}")
+
+    def start_trip(self, start_node: str, goal_node: str, network, enter: bool = True, route: List = None): # enter=False leaves entering the first road to the caller, route skips planning
 
         self.trip_count += 1
+        if self.routes is None:
+            self.routes = RouteDictionary()
 
-        self.current_trip_data = { # Reset trip tracking
-            "start_node": start_node,
-            "goal_node": goal_node,
-            "roads_traveled": [],
-            "total_time": 0.0,
-            "total_distance": 0.0,
-            "speed_observations": {},  # road_id -> [speeds] (per-road tracking)
-            "stress_observations": {}  # road_id -> [stresses] (per-road tracking)
-        }
+        self.current_trip_data.reset(start_node, goal_node) # Reset trip tracking in place
 
-        # Creating vehicle
-        self.current_vehicle = Vehicle(vehicle_id=f"{self.id}_trip_{self.trip_count}", start_node=start_node, goal_node=goal_node, pathfinder=self.pathfinder)
+        # The finished vehicle of the last trip is off the roads and is reused, otherwise a new one.
+        # Its id is only formatted if something reads it
+        if route is not None: # Planned elsewhere, e.g. by a RoutingService
+            trip = dict(route=route, pathfinder=self.pathfinder, exact_transitions=self.exact_transitions)
+        else:
+            trip = dict(start_node=start_node, goal_node=goal_node, pathfinder=self.pathfinder, exact_transitions=self.exact_transitions)
+        vehicle = self.current_vehicle
+        if vehicle is not None and vehicle.has_reached_destination():
+            vehicle.reset(None, **trip)
+        else:
+            vehicle = Vehicle(None, **trip)
+        if route is not None:
+            vehicle.start_node = start_node
+            vehicle.goal_node = goal_node
+        vehicle.owner = self.id
+        vehicle.trip_number = self.trip_count
+        self.current_vehicle = vehicle
         self.waiting_to_start = False
 
         if self.current_vehicle.route:
             first_road = self.current_vehicle.route[0]
-            if first_road.has_space():
+            if enter and first_road.has_space():
                 first_road.add_vehicle(self.current_vehicle)
-                self.current_trip_data["roads_traveled"].append(first_road.id)
+                trip = self.current_trip_data
+                trip.roads_traveled = self.routes.extend(trip.roads_traveled, first_road.id)
             else:
                 self.waiting_to_start = True
 
@@ -73,38 +174,43 @@ class Driver:
             first_road = self.current_vehicle.route[0]
             if first_road.has_space():
                 first_road.add_vehicle(self.current_vehicle)
-                self.current_trip_data["roads_traveled"].append(first_road.id)
+                trip = self.current_trip_data
+                trip.roads_traveled = self.routes.extend(trip.roads_traveled, first_road.id)
                 self.waiting_to_start = False
             else:
-                self.current_trip_data["total_time"] += time_step
+                self.current_trip_data.total_time += time_step
                 return False
         
         road = self.current_vehicle.get_current_road()
         if road:
-            if road.id not in self.current_trip_data["speed_observations"]:
-                self.current_trip_data["speed_observations"][road.id] = []
-                self.current_trip_data["stress_observations"][road.id] = []
-            self.current_trip_data["speed_observations"][road.id].append(road.current_speed * 3.6)  # km/h
-            self.current_trip_data["stress_observations"][road.id].append(road.get_stress_level())
+            self._observe(road)
 
         old_road_index = self.current_vehicle.route_index
 
-        self.current_vehicle.update_position(time_step)
-        self.current_trip_data["total_time"] += time_step
+        elapsed = self.current_vehicle.update_position(time_step)
+        self.current_trip_data.total_time += elapsed
 
-        # Check if moved to a new road
+        # Check if moved to new roads (several in one tick with large time steps)
         new_road_index = self.current_vehicle.route_index
-        if new_road_index > old_road_index and new_road_index < len(self.current_vehicle.route):
-            new_road = self.current_vehicle.route[new_road_index]
-            self.current_trip_data["roads_traveled"].append(new_road.id)
+        route = self.current_vehicle.route
+        for index in range(old_road_index + 1, min(new_road_index, len(route) - 1) + 1):
+            new_road = route[index]
+            trip = self.current_trip_data
+            trip.roads_traveled = self.routes.extend(trip.roads_traveled, new_road.id)
+            if index < new_road_index:
+                self._observe(new_road)  # Crossed entirely within this tick
         
         # Check if trip finished
         if self.current_vehicle.has_reached_destination():
+            self.leftover_time = time_step - elapsed
             self.finish_trip()
             return True
         
         return False
     
+    def _observe(self, road):
+        self.current_trip_data.observe(road.id, road.current_speed * 3.6, road.get_stress_level())  # km/h
+
     # Getting next destination for fixed route
     def get_next_destination(self, current_node: str, all_nodes: List[str]) -> str:
 
@@ -119,10 +225,11 @@ class Driver:
         
     def finish_trip(self):
 
-        for road_id in self.current_trip_data["roads_traveled"]:
+        trip = self.current_trip_data
+        for road_id in self.routes.roads(trip.roads_traveled):
             for road in self.current_vehicle.route:
                 if road.id == road_id:
-                    self.current_trip_data["total_distance"] += road.distance
+                    trip.total_distance += road.distance
                     break
 
         for road in self.current_vehicle.route:
@@ -135,16 +242,12 @@ class Driver:
                     "avg_stress": 0.0
                 }
 
-            if road_id in self.current_trip_data["speed_observations"]:
-                road_speeds = self.current_trip_data["speed_observations"][road_id]
-                observed_speed = sum(road_speeds) / len(road_speeds)
-            else:
-                observed_speed = self.memory[road_id]["avg_speed"] # If not just use what is already stored
-            
-            if road_id in self.current_trip_data["stress_observations"]:
-                road_stresses = self.current_trip_data["stress_observations"][road_id]
-                observed_stress = sum(road_stresses) / len(road_stresses)
-            else:
+            observed = trip.observations.get(road_id)
+            if observed is not None:
+                observed_speed = observed[0] / observed[2]
+                observed_stress = observed[1] / observed[2]
+            else: # If not just use what is already stored
+                observed_speed = self.memory[road_id]["avg_speed"]
                 observed_stress = self.memory[road_id]["avg_stress"]
             
             # Update memory using learning rate
@@ -156,35 +259,129 @@ class Driver:
     def get_trip_summary(self) -> Dict:
         # Get summary of completed trip for logging
         
+        trip = self.current_trip_data
         avg_speed = 0.0
         avg_stress = 0.0
-        
-        if self.current_trip_data["speed_observations"]:
-            all_speeds = [s for speeds in self.current_trip_data["speed_observations"].values() for s in speeds]
-            if all_speeds:
-                avg_speed = sum(all_speeds) / len(all_speeds)
-        
-        if self.current_trip_data["stress_observations"]:
-            all_stresses = [s for stresses in self.current_trip_data["stress_observations"].values() for s in stresses]
-            if all_stresses:
-                avg_stress = sum(all_stresses) / len(all_stresses)
-        
+
+        if trip.observation_count:
+            avg_speed = trip.speed_sum / trip.observation_count
+            avg_stress = trip.stress_sum / trip.observation_count
+
         return {
             "driver_id": self.id,
             "trip_number": self.trip_count,
-            "start_node": self.current_trip_data["start_node"],
-            "goal_node": self.current_trip_data["goal_node"],
-            "route_taken": self.current_trip_data["roads_traveled"],
-            "trip_time": self.current_trip_data["total_time"],
-            "distance": self.current_trip_data["total_distance"],
+            "start_node": trip.start_node,
+            "goal_node": trip.goal_node,
+            "route_taken": self._roads_traveled(),  # Road ids, so any collector can intern them
+            "trip_time": trip.total_time,
+            "distance": trip.total_distance,
             "avg_speed": avg_speed,
             "avg_stress": avg_stress
         }
     
+    def _roads_traveled(self) -> tuple:
+        if self.routes is None:
+            return ()
+        return self.routes.roads(self.current_trip_data.roads_traveled)
+
+    def to_state(self, memory_roads=None, with_rng: bool = True) -> Dict: # Plain-data copy of the driver, e.g. to move it to another process
+
+        # memory_roads limits memory to those entries and with_rng=False leaves out the random
+        # state, for a receiver that already holds an older copy of this driver, see load_state
+        trip = self.current_trip_data.to_dict()
+        trip["roads_traveled"] = self._roads_traveled()
+
+        vehicle = None
+        if self.current_vehicle is not None:
+            v = self.current_vehicle
+            vehicle = {
+                "id": v.id,
+                "route": [road.id for road in v.route],
+                "route_index": v.route_index,
+                "position": v.position,
+                "waiting": v.waiting,
+                "start_node": v.start_node,
+                "goal_node": v.goal_node,
+            }
+
+        memory = self.memory
+        if memory_roads is not None:
+            memory = {road_id: memory[road_id] for road_id in memory_roads}
+
+        return {
+            "id": self.id,
+            "stress_tolerance": self.stress_tolerance,
+            "familiarity_weight": self.familiarity_weight,
+            "learning_rate": self.learning_rate,
+            "fixed_route": self.fixed_route,
+            "last_goal": self.last_goal,
+            "exact_transitions": self.exact_transitions,
+            "leftover_time": self.leftover_time,
+            "rng_state": None if self.rng is random or not with_rng else self.rng.getstate(),
+            "memory": memory,
+            "trip_count": self.trip_count,
+            "waiting_to_start": self.waiting_to_start,
+            "trip": trip,
+            "vehicle": vehicle,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict, network, max_speed: Optional[float] = None,
+                   routes: Optional[RouteDictionary] = None) -> 'Driver': # Rebuild a driver from to_state() on this network
+
+        driver = cls(state["id"], network,
+                     stress_tolerance=state["stress_tolerance"],
+                     familiarity_weight=state["familiarity_weight"],
+                     learning_rate=state["learning_rate"],
+                     fixed_route=state["fixed_route"],
+                     exact_transitions=state["exact_transitions"],
+                     max_speed=max_speed)
+        driver.routes = routes if routes is not None else RouteDictionary()
+        driver.load_state(state, network)
+        return driver
+
+    def load_state(self, state: Dict, network): # Bring this driver up to date from a later to_state() of it, in place
+
+        # Memory entries in the state replace this driver's, the others are kept, and
+        # without a random state the driver's stream is left as it is
+        self.last_goal = state["last_goal"]
+        self.leftover_time = state["leftover_time"]
+        if state["rng_state"] is not None:
+            if self.rng is random:
+                self.rng = random.Random()
+            self.rng.setstate(state["rng_state"])
+        self.memory.update(state["memory"])
+        self.trip_count = state["trip_count"]
+        self.waiting_to_start = state["waiting_to_start"]
+        if self.routes is None:
+            self.routes = RouteDictionary()
+
+        trip = TripRecord.from_dict(state["trip"])
+        trip.roads_traveled = self.routes.intern(trip.roads_traveled)
+        self.current_trip_data = trip
+
+        v = state["vehicle"]
+        if v is None:
+            self.current_vehicle = None
+            return
+
+        route = [network.roads[road_id] for road_id in v["route"]]
+        vehicle = self.current_vehicle
+        if vehicle is None:
+            vehicle = Vehicle(v["id"], route=route, pathfinder=self.pathfinder, exact_transitions=self.exact_transitions)
+        else:
+            vehicle.reset(v["id"], route=route, pathfinder=self.pathfinder, exact_transitions=self.exact_transitions)
+        vehicle.route_index = v["route_index"]
+        vehicle.position = v["position"]
+        vehicle.waiting = v["waiting"]
+        vehicle.start_node = v["start_node"]
+        vehicle.goal_node = v["goal_node"]
+        self.current_vehicle = vehicle
+
     def has_active_trip(self) -> bool: # Check if on trip
         if self.current_vehicle is None:
             return False
-        if getattr(self, 'waiting_to_start', False):
+        if self.waiting_to_start:
             return True
         return not self.current_vehicle.has_reached_destination()
     
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+"""
+Live metrics for a running Simulation.
+
+The simulation thread calls LiveMetrics.tick() after every tick. At most once per
+interval (wall clock) it builds a snapshot of plain numbers and swaps it in; a
+background thread only ever reads the latest snapshot and never touches the
+simulation, so runs stay deterministic.
+
+The snapshot is served over HTTP (port=..., GET /metrics in Prometheus text format,
+/metrics.json as JSON) and/or rewritten atomically to a text file (path=...) in
+the same Prometheus format, e.g. for node_exporter's textfile collector or to
+watch with `watch cat`.
+"""
+
+PREFIX = "typ_"
+
+
+def to_prometheus(snapshot: Dict[str, float]) -> str:
+    return "".join(f"{PREFIX}{name} {value}\n" for name, value in snapshot.items())
+
+
+class LiveMetrics:
+
+    def __init__(self, path: Optional[str] = None, port: Optional[int] = None,
+                 host: str = "127.0.0.1", interval: float = 1.0):
+        self.path = path
+        self.port = port
+        self.host = host
+        self.interval = interval
+
+        self.snapshot: Dict[str, float] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+        self._started = None
+        self._last_publish = 0.0
+        self._last_ticks = 0
+        self._ticks = 0
+
+    def start(self):
+        self._started = self._last_publish = time.perf_counter()
+        self._stop.clear()
+
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            self.port = self.server.server_address[1]  # The real port when 0 was asked for
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        if self.path is not None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def tick(self, simulation):
+        # Called by the simulation thread; cheap unless a snapshot is due
+        if self._started is None:
+            return
+        self._ticks += 1
+        now = time.perf_counter()
+        if now - self._last_publish >= self.interval:
+            self.publish(simulation, now)
+
+    def publish(self, simulation, now: Optional[float] = None):
+        now = now if now is not None else time.perf_counter()
+        elapsed = now - self._last_publish
+        wall = now - self._started
+
+        active = 0
+        for driver in simulation.drivers:
+            if driver.has_active_trip():
+                active += 1
+
+        routes = simulation.data_collector.route_dictionary
+        snapshot = {
+            "simulation_time_seconds": simulation.time,
+            "wall_time_seconds": round(wall, 3),
+            "simulation_speedup": round(simulation.time / wall, 3) if wall > 0 else 0.0,
+            "ticks_total": self._ticks,
+            "ticks_per_second": round((self._ticks - self._last_ticks) / elapsed, 3) if elapsed > 0 else 0.0,
+            "active_vehicles": active,
+            "blocked_vehicles": simulation.count_blocked(),
+            "trips_completed_total": simulation.trips_completed,
+            "route_dedup_ratio": round(routes.dedup_ratio(), 4),
+            "writer_pending_bytes": simulation.data_collector.pending_bytes(),
+        }
+
+        self.snapshot = snapshot  # Single reference swap, readers see a whole snapshot
+        self._last_publish = now
+        self._last_ticks = self._ticks
+
+    def _write_loop(self):
+        while not self._stop.wait(max(self.interval, 0.1)):
+            self.write_file()
+        self.write_file()
+
+    def write_file(self):
+        snapshot = self.snapshot
+        if not snapshot:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, 'w') as f:
+            f.write(to_prometheus(snapshot))
+        os.replace(temporary, self.path)
+
+    def _handler(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                snapshot = metrics.snapshot
+                if self.path == "/metrics":
+                    body, content_type = to_prometheus(snapshot), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(snapshot), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep the simulation's output clean
+
+        return Handler
+
+    def __enter__(self) -> 'LiveMetrics':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
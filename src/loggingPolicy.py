@@ -0,0 +1,97 @@
+import zlib
+from typing import Callable, Dict, Iterable, Optional, Union
+
+"""
+Decides which drivers and roads get full rows in the output.
+
+Drivers are sampled by a stable hash of their id (not Python's salted hash()), so
+the same drivers are picked on every run. In tiered mode everything that is not
+sampled still feeds a few aggregate counters instead of being dropped.
+"""
+
+
+def arterials(min_speed_kmh: float = 60) -> Callable:
+    # Road filter keeping only roads at or above a speed limit
+    return lambda road: road.speed_limit_kmh >= min_speed_kmh
+
+
+class AggregateCounters:
+
+    def __init__(self):
+        self.trips = 0
+        self.trip_time = 0.0
+        self.trip_distance = 0.0
+        self.road_rows = 0
+        self.vehicle_count = 0
+        self.density = 0.0
+
+    def add_trip(self, trip_time: float, distance: float):
+        self.trips += 1
+        self.trip_time += trip_time
+        self.trip_distance += distance
+
+    def add_road(self, road):
+        self.road_rows += 1
+        self.vehicle_count += road.occupancy
+        self.density += road.get_density()
+
+    def to_dict(self) -> Dict:
+        return {
+            "trips": {
+                "count": self.trips,
+                "total_trip_time": round(self.trip_time, 2),
+                "total_distance": round(self.trip_distance, 2),
+                "average_trip_time": round(self.trip_time / self.trips, 2) if self.trips else 0.0,
+            },
+            "roads": {
+                "rows": self.road_rows,
+                "average_vehicle_count": round(self.vehicle_count / self.road_rows, 4) if self.road_rows else 0.0,
+                "average_density": round(self.density / self.road_rows, 4) if self.road_rows else 0.0,
+            },
+        }
+
+
+class LoggingPolicy:
+
+    def __init__(self, driver_sample_rate: float = 1.0,
+                 road_filter: Optional[Union[Iterable[str], Callable]] = None,
+                 tiered: bool = False, seed: int = 0):
+
+        if not 0.0 <= driver_sample_rate <= 1.0:
+            raise ValueError("driver_sample_rate must be between 0 and 1")
+
+        self.driver_sample_rate = driver_sample_rate
+        self.tiered = tiered
+        self.seed = seed
+
+        # road_filter is a collection of road ids or a predicate on Road
+        if road_filter is None or callable(road_filter):
+            self.road_filter = road_filter
+        else:
+            road_ids = set(road_filter)
+            self.road_filter = lambda road: road.id in road_ids
+
+        self._driver_decisions: Dict[str, bool] = {}
+        self._road_decisions: Dict[str, bool] = {}
+
+    @property
+    def logs_everything(self) -> bool:
+        return self.driver_sample_rate >= 1.0 and self.road_filter is None
+
+    def samples_driver(self, driver_id: str) -> bool:
+        decision = self._driver_decisions.get(driver_id)
+        if decision is None:
+            if self.driver_sample_rate >= 1.0:
+                decision = True
+            else:
+                digest = zlib.crc32(f"{self.seed}:{driver_id}".encode("utf-8"))
+                decision = digest / 0x100000000 < self.driver_sample_rate
+            self._driver_decisions[driver_id] = decision
+        return decision
+
+    def samples_road(self, road) -> bool:
+        decision = self._road_decisions.get(road.id)
+        if decision is None:
+            decision = self.road_filter is None or bool(self.road_filter(road))
+            self._road_decisions[road.id] = decision
+        return decision
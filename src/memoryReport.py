@@ -0,0 +1,194 @@
+import csv
+import os
+import sys
+import tracemalloc
+from typing import Dict, Iterable, List, Optional
+
+"""
+Memory footprint of a running Simulation, attributed to components.
+
+Each sample walks the simulation's objects and adds up sys.getsizeof of every
+object reachable from a component, counting each object once (in the first
+component that reaches it, in COMPONENTS order). The walk descends into dicts,
+lists, tuples, sets and the attributes of this package's objects, but stops at
+other simulation objects, so that, for example, a vehicle's route counts its list
+but not the Road objects in it. Resident set size and, when tracemalloc is
+tracing, traced memory are recorded alongside for comparison.
+
+Samples are appended to memory.csv in the output directory every interval
+simulation seconds. Walks are O(objects), so keep the interval coarse for very
+large runs.
+"""
+
+COMPONENTS = [
+    "driver_memory",       # Driver.memory
+    "trip_observations",   # per-road speed / stress sums of the current trips
+    "trip_records",        # the rest of current_trip_data
+    "vehicles",            # Vehicle objects and their routes
+    "drivers",             # Driver objects themselves
+    "population",          # idle driver rows of a PopulationStore, memory not included
+    "pathfinders",         # AdaptivePathfinder objects and their stats
+    "road_vehicles",       # Road.vehicles lists
+    "network",             # Node and Road objects, network dicts
+    "route_dictionary",    # interned routes
+    "collector_buffers",   # buffered output not yet written, ids of routes already written
+]
+
+
+def _attributes(obj) -> Iterable:
+    # Instance attribute values, from __dict__ and/or __slots__
+    if hasattr(obj, "__dict__"):
+        yield obj.__dict__
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                yield getattr(obj, name)
+
+
+class SizeWalker:
+
+    def __init__(self, stop_types: tuple = ()):
+        self.seen = set()
+        self.stop_types = stop_types  # Types only counted when they are the root of a walk
+
+    def size(self, obj, root: bool = True) -> int:
+        total = 0
+        stack = [(obj, root)]
+        while stack:
+            current, is_root = stack.pop()
+            if id(current) in self.seen:
+                continue
+            if not is_root and isinstance(current, self.stop_types):
+                continue
+            self.seen.add(id(current))
+            total += sys.getsizeof(current)
+
+            if isinstance(current, dict):
+                for key, value in current.items():
+                    stack.append((key, False))
+                    stack.append((value, False))
+            elif isinstance(current, (list, tuple, set, frozenset)):
+                stack.extend((item, False) for item in current)
+            elif type(current).__module__.startswith("src."):
+                stack.extend((value, False) for value in _attributes(current))
+        return total
+
+
+def resident_bytes() -> int:
+    # Current resident set size on Linux, peak RSS elsewhere, 0 if neither is available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return 0
+
+
+def component_sizes(simulation) -> Dict[str, int]:
+    from src.driver import Driver
+    from src.vehicle import Vehicle
+    from src.network import Node, Road, TrafficNetwork
+    from src.pathfinding import AStar
+    from src.routeDictionary import RouteDictionary
+    from src.dataCollection import DataCollector
+    from src.population import PopulationStore
+
+    walker = SizeWalker(stop_types=(Driver, Vehicle, Node, Road, TrafficNetwork, AStar,
+                                    RouteDictionary, DataCollector, PopulationStore))
+    drivers = simulation.drivers
+    sizes = dict.fromkeys(COMPONENTS, 0)
+
+    for driver in drivers:
+        sizes["driver_memory"] += walker.size(driver.memory)
+    for driver in drivers:
+        trip = driver.current_trip_data
+        sizes["trip_observations"] += walker.size(trip.observations)
+        sizes["trip_records"] += walker.size(trip)
+    for driver in drivers:
+        if driver.current_vehicle is not None:
+            sizes["vehicles"] += walker.size(driver.current_vehicle)
+    for driver in drivers:
+        sizes["drivers"] += walker.size(driver)
+    for driver in drivers:
+        sizes["pathfinders"] += walker.size(driver.pathfinder)
+
+    population = getattr(simulation, "population", None)
+    if population is not None:
+        for memory in population.memory:
+            if memory is not None:
+                sizes["driver_memory"] += walker.size(memory)
+        sizes["population"] = walker.size(population)
+
+    roads = simulation.network.roads.values()
+    for road in roads:
+        sizes["road_vehicles"] += walker.size(road.vehicles)
+    sizes["network"] += walker.size(simulation.network)
+    for road in roads:
+        sizes["network"] += walker.size(road)
+    for node in simulation.network.nodes.values():
+        sizes["network"] += walker.size(node)
+
+    collector = simulation.data_collector
+    sizes["route_dictionary"] = walker.size(collector.route_dictionary)
+    sizes["collector_buffers"] = collector.pending_bytes() + walker.size(collector.logged_routes)
+    return sizes
+
+
+class MemoryReport:
+
+    def __init__(self, output_dir: str, interval: float = 600, filename: str = "memory.csv"):
+        self.interval = interval  # Simulation seconds between samples
+        self.filepath = os.path.join(output_dir, filename)
+        self.samples: List[Dict] = []
+        self._next_sample = 0.0
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(self.filepath, 'w', newline='') as f:
+            csv.writer(f).writerow(["timestamp", "resident_bytes", "traced_bytes", "traced_peak_bytes",
+                                    "driver_count", "active_vehicles"] + COMPONENTS)
+
+    def tick(self, simulation):
+        # Called by Simulation after each tick, once the clock has been advanced
+        if simulation.time >= self._next_sample:
+            self.sample(simulation)
+            while self.interval > 0 and self._next_sample <= simulation.time:
+                self._next_sample += self.interval
+
+    def finish(self, simulation):
+        # Called at the end of a run so the final state is always sampled
+        if not self.samples or self.samples[-1]["timestamp"] != round(simulation.time, 2):
+            self.sample(simulation)
+
+    def sample(self, simulation) -> Dict:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        sample = {
+            "timestamp": round(simulation.time, 2),
+            "resident_bytes": resident_bytes(),
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "driver_count": len(simulation.drivers),
+            "active_vehicles": sum(1 for d in simulation.drivers if d.current_vehicle is not None and d.has_active_trip()),
+        }
+        sample.update(component_sizes(simulation))
+        self.samples.append(sample)
+
+        with open(self.filepath, 'a', newline='') as f:
+            csv.writer(f).writerow(sample.values())
+        return sample
+
+    def summary(self, sample: Optional[Dict] = None) -> str:
+        sample = sample or (self.samples[-1] if self.samples else None)
+        if sample is None:
+            return "No memory samples"
+        total = sum(sample[name] for name in COMPONENTS)
+        lines = [f"t={sample['timestamp']}: {total / 1e6:.1f} MB attributed, "
+                 f"{sample['resident_bytes'] / 1e6:.1f} MB resident"]
+        for name in sorted(COMPONENTS, key=lambda n: -sample[n]):
+            share = sample[name] / total if total else 0.0
+            lines.append(f"  {name}: {sample[name] / 1e6:.2f} MB ({share:.0%})")
+        return "\n".join(lines)
@@ -12,6 +12,8 @@ UNITS USED IN THIS SIMULATION:
 
 class Node:
 
+    __slots__ = ("id", "x", "y")
+
     def __init__(self, node_id: str, x: float, y: float):
 
         self.id = node_id
@@ -26,27 +28,50 @@ class Node:
         return f"Node({self.id}, x={self.x}, y={self.y})"
     
 class Road:
-    
+
+    __slots__ = ("id", "start", "end", "_speed_limit_kmh", "speed_limit", "capacity", "distance",
+                 "_vehicles", "occupancy", "current_speed", "base_stress")
+
+    limit_changes = 0  # Speed limits set on any road so far, so cached bounds such as RoutingContext.max_speed can tell they are stale
+
     def __init__(self, road_id: str, start_node: Node, end_node: Node, speed_limit_kmh: float, capacity: int, base_stress: float = 0.0):
 
         self.id = road_id
         self.start = start_node
         self.end = end_node
         
-        self.speed_limit_kmh = speed_limit_kmh # Storing speed limit in km/h for readability
-        
-        # Convert to m/s for internal calculations
-        # 50 km/h = 50 * 1000 / 3600 = 13.89 m/s
-        self.speed_limit = speed_limit_kmh * 1000 / 3600
-        
+        self.speed_limit_kmh = speed_limit_kmh # Storing speed limit in km/h for readability, also sets speed_limit
+
         self.capacity = capacity
         self.distance = start_node.euc_distance(end_node)  # Distance in meters
-        self.vehicles = []
+        self.vehicles = []  # Also sets occupancy, the vehicle count that speeds and space are based on
         self.current_speed = self.speed_limit  # Start at speed limit (m/s)
         self.base_stress = base_stress
 
+    @property
+    def speed_limit_kmh(self) -> float:
+        return self._speed_limit_kmh
+
+    @speed_limit_kmh.setter
+    def speed_limit_kmh(self, speed_limit_kmh: float):
+        self._speed_limit_kmh = speed_limit_kmh
+
+        # Convert to m/s for internal calculations
+        # 50 km/h = 50 * 1000 / 3600 = 13.89 m/s
+        self.speed_limit = speed_limit_kmh * 1000 / 3600
+        Road.limit_changes += 1
+
+    @property
+    def vehicles(self) -> List:
+        return self._vehicles
+
+    @vehicles.setter
+    def vehicles(self, vehicles: List):
+        self._vehicles = vehicles
+        self.occupancy = len(vehicles)
+
     def get_density(self) -> float:
-        return len(self.vehicles) / self.capacity
+        return self.occupancy / self.capacity
     
     def update_speed(self):
         density = self.get_density()
@@ -67,24 +92,26 @@ class Road:
         return min(total_stress, 1.0)
     
     def has_space(self) -> bool:
-        return len(self.vehicles) < self.capacity
+        return self.occupancy < self.capacity
     
     def is_at_capacity(self) -> bool:
-        return len(self.vehicles) >= self.capacity
+        return self.occupancy >= self.capacity
 
     def add_vehicle(self, vehicle):
-        self.vehicles.append(vehicle)
+        self._vehicles.append(vehicle)
+        self.occupancy += 1
         self.update_speed()
 
     def remove_vehicle(self, vehicle):
-        if vehicle in self.vehicles:
-            self.vehicles.remove(vehicle)
+        if vehicle in self._vehicles:
+            self._vehicles.remove(vehicle)
+            self.occupancy -= 1
             self.update_speed()
 
     def __repr__(self) -> str:
         return f"Road({self.id}: {self.start.id}->{self.end.id}, " \
                f"speed={self.current_speed:.1f}/{self.speed_limit}, " \
-               f"vehicles={len(self.vehicles)}/{self.capacity})"
+               f"vehicles={self.occupancy}/{self.capacity})"
     
 class TrafficNetwork:
     
@@ -0,0 +1,212 @@
+import math
+import random
+from typing import Dict, List, Optional, Tuple
+from src.network import Node, Road, TrafficNetwork
+
+"""
+Synthetic networks for scaling tests, from a few nodes up to about 1M.
+
+Roads are drawn from a speed hierarchy (ROAD_CLASSES). Each road's speed limit and
+capacity are jittered around its class values and base_stress is drawn uniformly,
+all from a random.Random(seed), so the same arguments always give the same network.
+Except for braess_network, every generator returns a network of two-way roads in
+which every node can reach every other, so random trips never fail to find a path.
+"""
+
+# Road class -> (speed limit km/h, capacity)
+ROAD_CLASSES = {
+    "arterial": (70, 20),
+    "collector": (50, 10),
+    "local": (30, 5),
+}
+
+
+class RoadAttributes:
+    # Draws the attributes of each new road from one seeded stream
+
+    def __init__(self, seed: int = 0, jitter: float = 0.1, max_base_stress: float = 0.2):
+        self.rng = random.Random(seed)
+        self.jitter = jitter
+        self.max_base_stress = max_base_stress
+
+    def draw(self, road_class: str) -> Dict:
+        speed, capacity = ROAD_CLASSES[road_class]
+        return {
+            "speed_limit_kmh": round(speed * self.rng.uniform(1 - self.jitter, 1 + self.jitter), 1),
+            "capacity": max(1, round(capacity * self.rng.uniform(1 - 2 * self.jitter, 1 + 2 * self.jitter))),
+            "base_stress": round(self.rng.uniform(0.0, self.max_base_stress), 3),
+        }
+
+
+def _add_two_way(network: TrafficNetwork, a: Node, b: Node, road_class: str, attributes: RoadAttributes):
+    # Both directions share the same attributes, like the hand-built networks
+    values = attributes.draw(road_class)
+    network.add_road(Road(f"{a.id}-{b.id}", a, b, **values))
+    network.add_road(Road(f"{b.id}-{a.id}", b, a, **values))
+
+
+def grid_network(rows: int, cols: int, spacing: float = 100, arterial_every: int = 8,
+                 seed: int = 0, **attribute_options) -> TrafficNetwork:
+    # Manhattan grid. Every arterial_every-th row and column is an arterial, halfway
+    # between them a collector, and the rest local streets
+
+    attributes = RoadAttributes(seed, **attribute_options)
+    network = TrafficNetwork()
+    grid: List[List[Node]] = []
+    for r in range(rows):
+        row = []
+        for c in range(cols):
+            node = Node(f"r{r}c{c}", c * spacing, r * spacing)
+            network.add_node(node)
+            row.append(node)
+        grid.append(row)
+
+    collector_every = max(1, arterial_every // 2)
+
+    def road_class(line: int) -> str:
+        if line % arterial_every == 0:
+            return "arterial"
+        if line % collector_every == 0:
+            return "collector"
+        return "local"
+
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                _add_two_way(network, grid[r][c], grid[r][c + 1], road_class(r), attributes)
+            if r + 1 < rows:
+                _add_two_way(network, grid[r][c], grid[r + 1][c], road_class(c), attributes)
+    return network
+
+
+def _largest_component(nodes: List[Node], edges: List[Tuple[int, int]]) -> set:
+    # Union-find over undirected edges, returns the node indices of the biggest component
+    parent = list(range(len(nodes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in edges:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    sizes: Dict[int, int] = {}
+    for i in range(len(nodes)):
+        root = find(i)
+        sizes[root] = sizes.get(root, 0) + 1
+    biggest = max(sizes, key=lambda root: (sizes[root], -root))
+    return {i for i in range(len(nodes)) if find(i) == biggest}
+
+
+def random_geometric_network(num_nodes: int, spacing: float = 100, average_degree: float = 6.0,
+                             seed: int = 0, **attribute_options) -> TrafficNetwork:
+    # Nodes placed uniformly at random, about spacing apart on average, joined to every node
+    # within the radius giving average_degree neighbours. Only the largest connected
+    # component is kept, so the result can have slightly fewer than num_nodes nodes.
+    # Longer roads get faster classes.
+
+    rng = random.Random(seed)
+    side = math.sqrt(num_nodes) * spacing
+    radius = spacing * math.sqrt(average_degree / math.pi)
+    nodes = [Node(f"g{i}", round(rng.uniform(0, side), 2), round(rng.uniform(0, side), 2))
+             for i in range(num_nodes)]
+
+    # Bucket nodes into radius-sized cells so only neighbouring cells are compared
+    cells: Dict[Tuple[int, int], List[int]] = {}
+    for i, node in enumerate(nodes):
+        cells.setdefault((int(node.x // radius), int(node.y // radius)), []).append(i)
+
+    edges = []
+    for (cx, cy), members in cells.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx + dx, cy + dy), ()):
+                    for i in members:
+                        if i < j and 0 < nodes[i].euc_distance(nodes[j]) <= radius:
+                            edges.append((i, j))
+    edges.sort()
+
+    keep = _largest_component(nodes, edges)
+    network = TrafficNetwork()
+    for i in sorted(keep):
+        network.add_node(nodes[i])
+
+    attributes = RoadAttributes(seed, **attribute_options)
+    for i, j in edges:
+        if i in keep:
+            length = nodes[i].euc_distance(nodes[j]) / radius
+            road_class = "arterial" if length > 0.8 else "collector" if length > 0.5 else "local"
+            _add_two_way(network, nodes[i], nodes[j], road_class, attributes)
+    return network
+
+
+def radial_ring_network(rings: int, spokes: int, ring_spacing: float = 200,
+                        seed: int = 0, **attribute_options) -> TrafficNetwork:
+    # City layout: a centre joined by arterial spokes to concentric rings. The outermost
+    # ring is an arterial ring road, inner rings are collectors. Nodes: 1 + rings * spokes
+
+    if spokes < 3:
+        raise ValueError("A ring needs at least 3 spokes")
+
+    attributes = RoadAttributes(seed, **attribute_options)
+    network = TrafficNetwork()
+    centre = Node("center", 0.0, 0.0)
+    network.add_node(centre)
+
+    previous = [centre] * spokes
+    for ring in range(1, rings + 1):
+        radius = ring * ring_spacing
+        current = []
+        for s in range(spokes):
+            angle = 2 * math.pi * s / spokes
+            node = Node(f"ring{ring}_{s}", round(radius * math.cos(angle), 2), round(radius * math.sin(angle), 2))
+            network.add_node(node)
+            current.append(node)
+
+        ring_class = "arterial" if ring == rings else "collector"
+        for s in range(spokes):
+            _add_two_way(network, previous[s], current[s], "arterial", attributes)
+            _add_two_way(network, current[s], current[(s + 1) % spokes], ring_class, attributes)
+        previous = current
+    return network
+
+
+def braess_network(gadgets: int = 1, include_shortcut: bool = True, spacing: float = 100,
+                   seed: Optional[int] = None) -> TrafficNetwork:
+    # Braess gadgets in series: A0 -> B0 -> B1 ..., each with a fast narrow and a slow
+    # wide road on both sides, plus the optional shortcut S -> T. Roads are one-way as in
+    # eval_braess, so trips must run from A0 to B{gadgets-1}. Attributes follow eval_braess
+    # exactly unless a seed is given, in which case base_stress is randomised.
+
+    rng = random.Random(seed) if seed is not None else None
+    network = TrafficNetwork()
+
+    def node(node_id, x, y):
+        n = Node(node_id, x, y)
+        network.add_node(n)
+        return n
+
+    def road(start, end, speed, capacity):
+        stress = round(rng.uniform(0.0, 0.2), 3) if rng else 0.0
+        network.add_road(Road(f"{start.id}-{end.id}", start, end, speed_limit_kmh=speed,
+                              capacity=capacity, base_stress=stress))
+
+    top = node("A0", spacing, 2 * spacing)
+    for g in range(gadgets):
+        offset = g * 2 * spacing  # Gadgets run downwards, each sharing its exit with the next entry
+        s = node(f"S{g}", 0, spacing - offset)
+        t = node(f"T{g}", 2 * spacing, spacing - offset)
+        bottom = node(f"B{g}", spacing, -offset)
+
+        road(top, s, 80, 5)
+        road(s, bottom, 30, 50)
+        road(top, t, 30, 50)
+        road(t, bottom, 80, 5)
+        if include_shortcut:
+            road(s, t, 200, 50)
+        top = bottom
+    return network
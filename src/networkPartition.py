@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional
+from src.network import Node, Road, TrafficNetwork
+
+"""
+Splits a TrafficNetwork into k balanced regions with few roads between them.
+
+Nodes are first split by recursive coordinate bisection on Node.x / Node.y, which
+gives compact regions of equal size. The split is then refined on the road graph:
+nodes on a region border move to the neighbouring region they have more roads to,
+as long as region sizes stay within the balance tolerance. A road belongs to the
+region of its start node, and is a boundary road when its end node is elsewhere.
+"""
+
+
+class NetworkPartition:
+
+    def __init__(self, network: TrafficNetwork, node_region: Dict[str, int], num_regions: int):
+        self.network = network
+        self.node_region = node_region  # node id -> region
+        self.num_regions = num_regions
+
+    def road_region(self, road: Road) -> int:
+        return self.node_region[road.start.id]
+
+    def road_owner(self) -> Dict[str, int]: # road id -> region
+        return {road_id: self.road_region(road) for road_id, road in self.network.roads.items()}
+
+    def region_nodes(self, region: int) -> List[str]:
+        return [node_id for node_id, r in self.node_region.items() if r == region]
+
+    def sizes(self) -> List[int]:
+        sizes = [0] * self.num_regions
+        for region in self.node_region.values():
+            sizes[region] += 1
+        return sizes
+
+    def is_boundary(self, road: Road) -> bool:
+        return self.node_region[road.start.id] != self.node_region[road.end.id]
+
+    def boundary_roads(self, region: Optional[int] = None) -> List[Road]:
+        # Roads crossing between regions. For one region: the roads leaving or entering it
+        roads = [road for road in self.network.roads.values() if self.is_boundary(road)]
+        if region is None:
+            return roads
+        return [road for road in roads
+                if self.node_region[road.start.id] == region or self.node_region[road.end.id] == region]
+
+    def cut_size(self) -> int:
+        return len(self.boundary_roads())
+
+    def subgraph(self, region: int, include_boundary: bool = True) -> TrafficNetwork:
+        # Network of the region's nodes and the roads between them. With include_boundary the
+        # roads leaving the region and their end nodes are added as well.
+        # Node and Road objects are shared with the full network, not copied.
+        sub = TrafficNetwork()
+        for node_id in self.region_nodes(region):
+            sub.add_node(self.network.nodes[node_id])
+
+        for road in self.network.roads.values():
+            if self.node_region[road.start.id] != region:
+                continue
+            if road.end.id not in sub.nodes:
+                if not include_boundary:
+                    continue
+                sub.add_node(road.end)
+            sub.add_road(road)
+        return sub
+
+    def __repr__(self) -> str:
+        return f"NetworkPartition({self.num_regions} regions, sizes={self.sizes()}, cut={self.cut_size()})"
+
+
+def _bisect(nodes: List[Node], first_region: int, num_regions: int, node_region: Dict[str, int]):
+    if num_regions == 1:
+        for node in nodes:
+            node_region[node.id] = first_region
+        return
+
+    # Split along the wider axis, in proportion to the number of regions on each side
+    left_regions = num_regions // 2
+    x_spread = max(n.x for n in nodes) - min(n.x for n in nodes)
+    y_spread = max(n.y for n in nodes) - min(n.y for n in nodes)
+    if x_spread >= y_spread:
+        ordered = sorted(nodes, key=lambda n: (n.x, n.y, n.id))
+    else:
+        ordered = sorted(nodes, key=lambda n: (n.y, n.x, n.id))
+
+    cut = round(len(ordered) * left_regions / num_regions)
+    _bisect(ordered[:cut], first_region, left_regions, node_region)
+    _bisect(ordered[cut:], first_region + left_regions, num_regions - left_regions, node_region)
+
+
+def _refine(network: TrafficNetwork, node_region: Dict[str, int], num_regions: int,
+            max_size: int, passes: int):
+
+    # Undirected neighbour lists, one entry per road so two-way streets count twice
+    neighbours: Dict[str, List[str]] = {node_id: [] for node_id in network.nodes}
+    for road in network.roads.values():
+        if road.start.id != road.end.id:
+            neighbours[road.start.id].append(road.end.id)
+            neighbours[road.end.id].append(road.start.id)
+
+    sizes = [0] * num_regions
+    for region in node_region.values():
+        sizes[region] += 1
+
+    for _ in range(passes):
+        moved = False
+        for node_id in sorted(network.nodes):
+            current = node_region[node_id]
+            if sizes[current] <= 1:
+                continue
+
+            links = {}
+            for other in neighbours[node_id]:
+                region = node_region[other]
+                links[region] = links.get(region, 0) + 1
+
+            best, best_gain = current, 0
+            for region in sorted(links):
+                if region == current or sizes[region] >= max_size:
+                    continue
+                gain = links[region] - links.get(current, 0)
+                if gain > best_gain:
+                    best, best_gain = region, gain
+
+            if best != current:
+                node_region[node_id] = best
+                sizes[current] -= 1
+                sizes[best] += 1
+                moved = True
+
+        if not moved:
+            break
+
+
+def partition_network(network: TrafficNetwork, num_regions: int, balance: float = 0.05,
+                      refine_passes: int = 10) -> NetworkPartition:
+    # balance: how far above the average size a region may grow during refinement
+
+    if num_regions < 1:
+        raise ValueError("num_regions must be at least 1")
+    if num_regions > len(network.nodes):
+        raise ValueError(f"Cannot split {len(network.nodes)} nodes into {num_regions} regions")
+
+    node_region: Dict[str, int] = {}
+    _bisect(list(network.nodes.values()), 0, num_regions, node_region)
+
+    if num_regions > 1:
+        average = len(network.nodes) / num_regions
+        max_size = max(int(average * (1 + balance)), -(-len(network.nodes) // num_regions))
+        _refine(network, node_region, num_regions, max_size, refine_passes)
+
+    return NetworkPartition(network, node_region, num_regions)
@@ -0,0 +1,204 @@
+import csv
+import hashlib
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+from src.driver import Driver
+from src.simulation import Simulation
+from src.dataCollection import DataCollector
+from src.resultsLoader import load_run
+from src.routeDictionary import RouteDictionary
+
+"""
+Sweeps Driver personality parameters over a grid or a Latin hypercube sample.
+
+Every point is a dict of personality parameters. A homogeneous population with
+that personality is simulated, and one row of summary metrics per point is
+appended to a single CSV table as soon as the point finishes. Points already
+in the table are skipped, so an interrupted sweep can simply be restarted.
+
+Each row also records the run configuration: seed, number of drivers, duration,
+time step and a fingerprint of the network. A sweep refuses to resume a table
+written with a different configuration, whose points would not be comparable.
+"""
+
+PERSONALITY_PARAMETERS = ("stress_tolerance", "familiarity_weight", "learning_rate")
+
+CONFIG_COLUMNS = ["seed", "num_drivers", "duration", "time_step", "network"]
+
+METRIC_COLUMNS = ["trips", "average_trip_time", "average_distance",
+                  "average_speed", "average_stress", "unique_routes"]
+
+
+def grid(values: Dict[str, List[float]]) -> List[Dict[str, float]]:
+    # Full factorial grid, e.g. grid({"stress_tolerance": [0.1, 0.5, 0.9], "learning_rate": [0.1, 0.3]})
+    points = [{}]
+    for name, options in values.items():
+        points = [dict(point, **{name: value}) for point in points for value in options]
+    return points
+
+
+def latin_hypercube(ranges: Dict[str, Tuple[float, float]], samples: int, seed: int = 0) -> List[Dict[str, float]]:
+    # One sample per stratum in every dimension, strata shuffled independently
+    rng = random.Random(seed)
+    columns = {}
+    for name, (low, high) in ranges.items():
+        strata = list(range(samples))
+        rng.shuffle(strata)
+        columns[name] = [low + (high - low) * (s + rng.random()) / samples for s in strata]
+    return [{name: columns[name][i] for name in ranges} for i in range(samples)]
+
+
+def point_key(point: Dict) -> Tuple:
+    # Parameters left at the Driver default are missing from the point (or "" in the table)
+    return tuple(None if point.get(name, "") == "" else round(float(point[name]), 6)
+                 for name in PERSONALITY_PARAMETERS)
+
+
+def network_fingerprint(network) -> str:
+    # Hash of the nodes and roads, equal for networks built the same way
+    digest = hashlib.sha1()
+    for node_id in sorted(network.nodes):
+        node = network.nodes[node_id]
+        digest.update(f"{node_id}:{node.x!r}:{node.y!r};".encode("utf-8"))
+    for road_id in sorted(network.roads):
+        road = network.roads[road_id]
+        digest.update(f"{road_id}:{road.start.id}:{road.end.id}:{road.speed_limit_kmh!r}:"
+                      f"{road.capacity}:{road.base_stress!r};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class PersonalitySweep:
+
+    def __init__(self, network_builder: Callable, results_file: str, num_drivers: int = 20,
+                 duration: float = 1000, time_step: float = 1.0, seed: int = 42,
+                 run_function: Callable = None):
+
+        self.network_builder = network_builder  # () -> TrafficNetwork, module level so it pickles
+        self.results_file = results_file
+        self.num_drivers = num_drivers
+        self.duration = duration
+        self.time_step = time_step
+        self.seed = seed
+
+        # Optional (network, drivers, collector) -> None replacing Simulation.run
+        self.run_function = run_function
+
+    def config(self) -> Dict[str, str]:
+        # As written to the table. The network is built once here, seeded as in evaluate
+        random.seed(self.seed)
+        return {
+            "seed": str(int(self.seed)),
+            "num_drivers": str(int(self.num_drivers)),
+            "duration": repr(float(self.duration)),
+            "time_step": repr(float(self.time_step)),
+            "network": network_fingerprint(self.network_builder()),
+        }
+
+    def completed_points(self, config: Optional[Dict[str, str]] = None) -> set:
+        # Raises ValueError if the table was written with another configuration
+        if not os.path.exists(self.results_file):
+            return set()
+        if config is None:
+            config = self.config()
+
+        done = set()
+        with open(self.results_file, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                different = [name for name in CONFIG_COLUMNS if row.get(name) != config[name]]
+                if different:
+                    raise ValueError(f"{self.results_file} was written with a different {', '.join(different)}; "
+                                     f"use another results file for this configuration")
+                done.add(point_key(row))
+        return done
+
+    def evaluate(self, point: Dict[str, float]) -> Dict:
+
+        unknown = set(point) - set(PERSONALITY_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Not personality parameters: {sorted(unknown)}")
+
+        # Every point uses the same seed, so differences come from the personality
+        random.seed(self.seed)
+        network = self.network_builder()
+        routes = RouteDictionary()
+        drivers = []
+        for i in range(self.num_drivers):
+            driver = Driver(f"P_{i}", network, **point)
+            driver.routes = routes
+            drivers.append(driver)
+
+        with tempfile.TemporaryDirectory() as run_dir:
+            collector = DataCollector(output_dir=run_dir, log_interval=self.duration or 1, route_dictionary=routes)
+            if self.run_function is not None:
+                self.run_function(network, drivers, collector)
+            else:
+                Simulation(network, drivers, collector).run(duration=self.duration, time_step=self.time_step)
+            collector.flush()
+            results = load_run(run_dir)
+
+        trips = results.trips
+        count = len(trips)
+
+        def mean(column):
+            return sum(trips[column]) / count if count else 0.0
+
+        row = {name: point.get(name, "") for name in PERSONALITY_PARAMETERS}
+        row.update({
+            "trips": count,
+            "average_trip_time": round(mean("total_trip_time"), 3),
+            "average_distance": round(mean("total_distance"), 3),
+            "average_speed": round(mean("average_speed"), 3),
+            "average_stress": round(mean("average_stress"), 5),
+            "unique_routes": len(results.unique_routes()),
+        })
+        return row
+
+    def run(self, points: List[Dict[str, float]], max_workers: Optional[int] = None,
+            progress: Optional[Callable] = None) -> int:
+        # Returns how many new points were computed
+
+        config = self.config()
+        done = self.completed_points(config)
+        todo = []
+        for point in points:
+            key = point_key(point)
+            if key not in done:
+                done.add(key)
+                todo.append(point)
+
+        if not todo:
+            return 0
+
+        directory = os.path.dirname(self.results_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        write_header = not os.path.exists(self.results_file)
+        with open(self.results_file, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(PERSONALITY_PARAMETERS) + CONFIG_COLUMNS + METRIC_COLUMNS)
+            if write_header:
+                writer.writeheader()
+
+            def record(i, row):
+                row.update(config)
+                writer.writerow(row)
+                f.flush()  # Each finished point is on disk even if the sweep is interrupted
+                if progress:
+                    progress(i, len(todo), row)
+
+            if max_workers is None:
+                max_workers = min(len(todo), os.cpu_count() or 1)
+
+            if max_workers <= 1:
+                for i, point in enumerate(todo, start=1):
+                    record(i, self.evaluate(point))
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    futures = [pool.submit(self.evaluate, point) for point in todo]
+                    for i, future in enumerate(as_completed(futures), start=1):
+                        record(i, future.result())
+
+        return len(todo)
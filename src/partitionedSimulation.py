@@ -0,0 +1,461 @@
+import copy
+import multiprocessing
+import pickle
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+from src.network import TrafficNetwork
+from src.driver import Driver
+from src.dataCollection import DataCollector
+from src.routeDictionary import RouteDictionary
+from src.simulation import choose_destination
+from src.networkPartition import NetworkPartition, partition_network
+
+"""
+Multi-process simulation with the network split into regions.
+
+The network is split with networkPartition. Every road belongs to the region of its
+start node, and a driver lives in the region that owns the road it is on. Each tick
+runs in lockstep phases driven by a coordinator, which acts as the barrier between them:
+
+1. move:      every region moves its drivers along their current road using road
+              speeds from the start of the tick. Trips that reach their goal end, and
+              with exact_transitions the next trip starts with the rest of the tick.
+              Drivers at the end of a road request the next one, carrying the time left.
+2. grant:     each road owner grants requests in global driver order while the road
+              has space, counting occupancy after trips ended but before road changes.
+3. emigrate:  granted drivers leave their old road, and those moving to a road owned
+              by another region are packed for it. Drivers that were not granted wait
+              for the rest of the tick.
+4. immigrate: drivers enter their new road in global driver order and travel the time
+              they carried along it, stopping at its end until their next grant.
+
+Handoffs are written to shared memory: each region worker has an outbox, and the
+coordinator only passes on where each batch is (see _region_worker). A region keeps
+the drivers that left it and updates them in place when they come back, so a handoff
+carries the driver's position and trip, plus only the memory learned since it last
+left the receiving region (see RegionEngine._pack). A driver is sent whole only the
+first time it enters a region.
+
+These rules do not depend on where region borders are, so the output for a fixed
+seed is identical for any number of regions, including num_regions=1 which runs
+in-process. A driver changes road at most once per tick, since each entry waits for
+the grant phase. Simulation(synchronous=True) runs the same phases on one in-process
+region and gives the same output as PartitionedSimulation.
+
+The default Simulation.run moves drivers one after another instead, and gives the
+same trips only while traffic flows freely and every road takes longer than a tick.
+When roads fill up, a driver earlier in the order takes the space, and its road slows
+down, before later drivers move. Matching that across processes would serialise the
+regions, so partitioned runs are compared with Simulation(synchronous=True).
+"""
+
+
+class RegionEngine:
+
+    def __init__(self, network: TrafficNetwork, road_owner: Dict[str, int], region_id: int):
+        self.network = network
+        self.road_owner = road_owner
+        self.region_id = region_id
+        self.node_ids = list(network.nodes.keys())
+        self.max_speed = max(road.speed_limit for road in network.roads.values()) if network.roads else 60
+        self.routes = RouteDictionary()  # Routes travelled in this region, logged as road ids
+
+        self.drivers: Dict[int, Driver] = {}  # global driver index -> driver
+        self.reserved: Dict[str, int] = {}    # road id -> granted entries not yet arrived
+        self.requesting: Dict[int, float] = {}  # driver index -> time left in the tick for its requested road
+        self.arriving: List[Tuple[int, Driver, str, float]] = []  # local moves waiting for immigrate
+
+        # Handoff bookkeeping, see _pack. Drivers that left stay in away and are updated in place
+        # when they come back, so only what changed since they left has to be sent
+        self.away: Dict[int, Driver] = {}
+        self.stamps: Dict[int, Dict[str, int]] = {}    # driver index -> road id -> trip that last updated its memory of it
+        self.departed: Dict[int, Dict[int, int]] = {}  # driver index -> region id -> trip count when it last left that region
+
+    def handle(self, message: Tuple):
+        kind = message[0]
+        if kind == "add":
+            return self.add_drivers(message[1])
+        if kind == "move":
+            return self.move(message[1])
+        if kind == "grant":
+            return self.grant(message[1])
+        if kind == "emigrate":
+            return self.emigrate(message[1])
+        if kind == "immigrate":
+            return self.immigrate(message[1], message[2])
+        raise ValueError(f"Unknown message: {kind}")
+
+    def add_drivers(self, states: List[Tuple[int, Dict]]):
+        for index, state in states:
+            self.drivers[index] = Driver.from_state(state, self.network, max_speed=self.max_speed, routes=self.routes)
+            self.stamps[index] = {}
+            self.departed[index] = {}
+
+    def adopt_drivers(self, drivers: List[Driver]):
+        # Runs the given drivers in place, for a single in-process region on their own network
+        for index, driver in enumerate(drivers):
+            driver.use_routes(self.routes)
+            self.drivers[index] = driver
+            self.stamps[index] = {}
+            self.departed[index] = {}
+
+    def move(self, time_step: float) -> Tuple[List, List]:
+
+        requests = []   # (driver index, road id)
+        finishing = []  # (driver index, driver, time left in the tick)
+        self.requesting = {}
+
+        for index in sorted(self.drivers):
+            driver = self.drivers[index]
+
+            if not driver.has_active_trip():
+                if self._start_trip(driver):
+                    self._request(requests, index, driver, time_step, time_step)
+                continue
+
+            if driver.waiting_to_start:
+                self._request(requests, index, driver, time_step, time_step)
+                continue
+
+            vehicle = driver.current_vehicle
+            road = vehicle.get_current_road()
+            driver._observe(road)
+
+            # Time left once the end of the road is reached, as update_position carries it
+            time_left = time_step if vehicle.waiting else vehicle.travel(time_step)
+
+            if vehicle.position < 1.0:
+                driver.current_trip_data.total_time += time_step
+            elif vehicle.route_index + 1 < len(vehicle.route):
+                vehicle.waiting = True
+                self._request(requests, index, driver, time_step, time_left)
+            else:
+                driver.current_trip_data.total_time += time_step - time_left
+                finishing.append((index, driver, time_left))
+
+        # Exits happen after everyone has moved so speeds stay fixed within the phase
+        finished = []
+        for index, driver, time_left in finishing:
+            vehicle = driver.current_vehicle
+            vehicle.get_current_road().remove_vehicle(vehicle)
+            vehicle.route_index += 1
+            driver.leftover_time = time_left
+            driver.finish_trip()
+            stamps = self.stamps[index]
+            for road in vehicle.route:
+                stamps[road.id] = driver.trip_count
+            summary = driver.get_trip_summary()
+            summary["route_taken"] = list(summary["route_taken"])
+            finished.append((index, summary))
+
+            # A trip that ended mid-tick hands the rest of the tick to the next trip
+            if time_left > 0 and self._start_trip(driver):
+                self._request(requests, index, driver, time_left, time_left)
+
+        return requests, finished
+
+    def _start_trip(self, driver: Driver) -> bool:
+        start, goal = choose_destination(driver, self.node_ids)
+        if not (start and goal):
+            return False
+        driver.start_trip(start, goal, self.network, enter=False)
+        return bool(driver.current_vehicle.route)  # No path to the goal, try another trip next tick
+
+    def _request(self, requests: List, index: int, driver: Driver, time_step: float, time_left: float):
+        # Asks for the driver's next road. The part of time_step before time_left is counted
+        # now, the rest once it is known whether the driver entered the road or waited
+        vehicle = driver.current_vehicle
+        road = vehicle.route[0] if driver.waiting_to_start else vehicle.route[vehicle.route_index + 1]
+        if not driver.exact_transitions:
+            time_left = 0.0  # One road change per tick, without travelling the new road
+        driver.current_trip_data.total_time += time_step - time_left
+        self.requesting[index] = time_left
+        requests.append((index, road.id))
+
+    def grant(self, requests: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        granted = []
+        for index, road_id in sorted(requests):
+            road = self.network.roads[road_id]
+            reserved = self.reserved.get(road_id, 0)
+            if road.occupancy + reserved < road.capacity:
+                self.reserved[road_id] = reserved + 1
+                granted.append((index, road_id))
+        return granted
+
+    def emigrate(self, granted: List[Tuple[int, str]]) -> Dict[int, List[Tuple]]:
+        outgoing = {}  # destination region -> moves
+        for index, road_id in granted:
+            driver = self.drivers[index]
+            vehicle = driver.current_vehicle
+            time_left = self.requesting.pop(index)
+
+            if driver.waiting_to_start:
+                driver.waiting_to_start = False
+            else:
+                vehicle.get_current_road().remove_vehicle(vehicle)
+                vehicle.route_index += 1
+                vehicle.position = 0.0
+                vehicle.waiting = False
+
+            owner = self.road_owner[road_id]
+            if owner == self.region_id:
+                self.arriving.append((index, driver, road_id, time_left))
+            else:
+                del self.drivers[index]
+                self.away[index] = driver
+                outgoing.setdefault(owner, []).append((index, self._pack(index, driver, owner), road_id, time_left))
+
+        # Requests that were not granted wait for the rest of the tick
+        for index, time_left in self.requesting.items():
+            self.drivers[index].current_trip_data.total_time += time_left
+        self.requesting = {}
+        return outgoing
+
+    def _pack(self, index: int, driver: Driver, destination: int) -> Tuple:
+        # A driver's memory only changes when a trip ends, and it always leaves a region during
+        # a trip, so the copy the destination kept when the driver last left it is missing only
+        # the memory of trips ending from that trip on, and its random state if a trip started since
+        departed = self.departed[index]
+        since = departed.get(destination)
+        departed[self.region_id] = driver.trip_count
+        stamps = self.stamps[index]
+
+        if since is None:  # First visit, the whole driver
+            return driver.to_state(), stamps, departed
+
+        changed = [road_id for road_id, trip in stamps.items() if trip >= since]
+        state = driver.to_state(memory_roads=changed, with_rng=driver.trip_count != since)
+        return state, {road_id: stamps[road_id] for road_id in changed}, departed
+
+    def immigrate(self, batches: List[List[Tuple]], snapshot: bool):
+        arrivals = self.arriving
+        self.arriving = []
+        for batch in batches:
+            for index, (state, stamps, departed), road_id, time_left in batch:
+                driver = self.away.pop(index, None)
+                if driver is None:
+                    driver = Driver.from_state(state, self.network, max_speed=self.max_speed, routes=self.routes)
+                else:
+                    driver.load_state(state, self.network)
+                self.stamps.setdefault(index, {}).update(stamps)
+                self.departed[index] = departed
+                arrivals.append((index, driver, road_id, time_left))
+
+        for index, driver, road_id, time_left in sorted(arrivals, key=lambda a: a[0]):
+            road = self.network.roads[road_id]
+            self.reserved[road_id] -= 1
+            vehicle = driver.current_vehicle
+            road.add_vehicle(vehicle)
+            trip = driver.current_trip_data
+            trip.roads_traveled = driver.routes.extend(trip.roads_traveled, road_id)
+
+            # A driver stopped at the end of a road is still on it for the rest of the tick,
+            # unless that was its last road; the trip then ends in the next move phase
+            unused = vehicle.travel(time_left)
+            trip.total_time += (time_left - unused) if vehicle.route_index + 1 == len(vehicle.route) else time_left
+            self.drivers[index] = driver
+
+        if not snapshot:
+            return None
+        return {road_id: (road.occupancy, road.current_speed)
+                for road_id, road in self.network.roads.items()
+                if self.road_owner[road_id] == self.region_id}
+
+
+def synchronous_tick(regions: List, road_owner: Dict[str, int], time_step: float,
+                     snapshot: bool = False) -> Tuple[List[Dict], Optional[List[Dict]]]:
+    # One tick of the phases above. Returns the summaries of trips that ended, in driver
+    # order, and with snapshot each region's road state as {road id: (vehicles, speed)}
+
+    replies = _call(regions, [("move", time_step)] * len(regions))
+
+    # Requests go to the owner of the requested road, and each request remembers
+    # which region the driver is in now
+    requests_by_owner = [[] for _ in regions]
+    driver_region = {}
+    finished = []
+    for region_id, (requests, trips) in enumerate(replies):
+        for index, road_id in requests:
+            requests_by_owner[road_owner[road_id]].append((index, road_id))
+            driver_region[index] = region_id
+        finished.extend(trips)
+
+    grants = _call(regions, [("grant", requests) for requests in requests_by_owner])
+
+    granted_by_source = [[] for _ in regions]
+    for granted in grants:
+        for index, road_id in granted:
+            granted_by_source[driver_region[index]].append((index, road_id))
+
+    outgoing = _call(regions, [("emigrate", sorted(granted)) for granted in granted_by_source])
+
+    # Each source sends one batch per destination, in source order
+    incoming = [[] for _ in regions]
+    for batches in outgoing:
+        for destination, batch in batches.items():
+            incoming[destination].append(batch)
+
+    states = _call(regions, [("immigrate", moves, snapshot) for moves in incoming])
+
+    summaries = [summary for _, summary in sorted(finished, key=lambda f: f[0])]
+    return summaries, states if snapshot else None
+
+
+def log_trip_summary(data_collector: DataCollector, summary: Dict):
+    data_collector.log_trip(
+        driver_id=summary["driver_id"],
+        trip_number=summary["trip_number"],
+        start_node=summary["start_node"],
+        goal_node=summary["goal_node"],
+        route_taken=summary["route_taken"],
+        trip_time=summary["trip_time"],
+        distance=summary["distance"],
+        avg_speed=summary["avg_speed"],
+        avg_stress=summary["avg_stress"]
+    )
+
+
+def _call(regions, messages: List):
+    for region, message in zip(regions, messages):
+        region.send(message)
+    return [region.recv() for region in regions]
+
+
+def _region_worker(connection, network: TrafficNetwork, road_owner: Dict[str, int], region_id: int,
+                   outboxes: List[str]):
+    # Handoffs go through shared memory: each region writes the batches it sends into its own
+    # outbox and the coordinator only passes on where they are, as (source region, offset, size).
+    # A batch that does not fit in the rest of the outbox is sent through the pipe instead
+    engine = RegionEngine(network, road_owner, region_id)
+    boxes = [shared_memory.SharedMemory(name=name) for name in outboxes]
+    outbox = boxes[region_id]
+    try:
+        while True:
+            message = connection.recv()
+            kind = message[0]
+            if kind == "stop":
+                break
+
+            if kind == "immigrate":
+                batches = []
+                for batch in message[1]:
+                    if isinstance(batch, tuple):
+                        source, offset, size = batch
+                        with boxes[source].buf[offset:offset + size] as view:
+                            batch = pickle.loads(view)
+                    batches.append(batch)
+                message = ("immigrate", batches, message[2])
+
+            reply = engine.handle(message)
+
+            if kind == "emigrate":
+                offset = 0
+                for destination, batch in reply.items():
+                    data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+                    if offset + len(data) <= outbox.size:
+                        outbox.buf[offset:offset + len(data)] = data
+                        reply[destination] = (region_id, offset, len(data))
+                        offset += len(data)
+            connection.send(reply)
+    finally:
+        for box in boxes:
+            box.close()
+        connection.close()
+
+
+class _LocalRegion:
+
+    def __init__(self, engine: RegionEngine):
+        self.engine = engine
+        self.reply = None
+
+    def send(self, message):
+        self.reply = self.engine.handle(message)
+
+    def recv(self):
+        return self.reply
+
+
+class PartitionedSimulation:
+
+    def __init__(self, network: TrafficNetwork, drivers: List[Driver], data_collector: DataCollector,
+                 num_regions: int = 2, seed: int = 0, partition: Optional[NetworkPartition] = None,
+                 handoff_bytes: int = 1 << 20):
+
+        # network and drivers must be fresh: no vehicles on roads and no trips in progress
+        self.network = network
+        self.drivers = drivers
+        self.data_collector = data_collector
+        self.seed = seed
+        self.time = 0.0
+        self.handoff_bytes = handoff_bytes  # Shared-memory outbox size of each region worker
+        self._mirror = copy.deepcopy(network)  # Road state gathered from the regions for snapshots
+
+        self.partition = partition or partition_network(network, num_regions)
+        self.num_regions = self.partition.num_regions
+        self.road_owner = self.partition.road_owner()
+
+        for driver in drivers:
+            driver.seed_stream(seed)  # Destinations must not depend on which region draws them
+
+    def run(self, duration: float, time_step: float = 1.0):
+
+        processes = []
+        outboxes = []
+        if self.num_regions == 1:
+            # Own copy, as a worker process would have, so the caller's network is left as it was
+            regions = [_LocalRegion(RegionEngine(copy.deepcopy(self.network), self.road_owner, 0))]
+        else:
+            regions = []
+            context = multiprocessing.get_context()
+            # Created here, before the workers start, so they share this process's resource tracker
+            outboxes = [shared_memory.SharedMemory(create=True, size=self.handoff_bytes)
+                        for _ in range(self.num_regions)]
+            names = [box.name for box in outboxes]
+            for region_id in range(self.num_regions):
+                parent, child = context.Pipe()
+                process = context.Process(target=_region_worker,
+                                          args=(child, self.network, self.road_owner, region_id, names), daemon=True)
+                process.start()
+                processes.append(process)
+                regions.append(parent)
+
+        try:
+            # Drivers start in round-robin regions; their first road request moves them
+            initial = [[] for _ in regions]
+            for index, driver in enumerate(self.drivers):
+                initial[index % len(regions)].append((index, driver.to_state()))
+            _call(regions, [("add", states) for states in initial])
+
+            while self.time < duration:
+                self._tick(regions, time_step)
+                self.time += time_step
+        finally:
+            if processes:
+                for region in regions:
+                    region.send(("stop",))
+            for process in processes:
+                process.join()
+            for box in outboxes:
+                box.close()
+                box.unlink()
+
+        self.data_collector.flush()
+        print(f"Partitioned simulation complete ({self.num_regions} regions). Time: {self.time}")
+
+    def _tick(self, regions, time_step: float):
+
+        snapshot = self.data_collector.should_log_roads(self.time)
+        summaries, states = synchronous_tick(regions, self.road_owner, time_step, snapshot)
+
+        for summary in summaries:
+            log_trip_summary(self.data_collector, summary)
+
+        if snapshot:
+            # Regions hold the live road state; copy it onto a private mirror of the network to log it
+            for region_state in states:
+                for road_id, (count, speed) in region_state.items():
+                    road = self._mirror.roads[road_id]
+                    road.occupancy = count
+                    road.current_speed = speed
+            self.data_collector.log_roads(self.time, self._mirror.roads)
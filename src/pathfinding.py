@@ -1,14 +1,153 @@
 import heapq
+import time
+import weakref
 from typing import List, Dict, Tuple, Optional
+from src.network import Road
 
 
-class AStar:    
+class SearchStats:
+    # Per-query search effort of one pathfinder, enabled with AStar.enable_stats()
+
+    def __init__(self, keep_worst: int = 10):
+        self.keep_worst = keep_worst
+        self.queries = 0
+        self.not_found = 0
+        self.totals = {"expanded": 0, "pushes": 0, "stale_pops": 0, "seconds": 0.0}
+        self.max_open_set = 0
+
+        # Power-of-two buckets -> queries
+        self.expanded_histogram: Dict[int, int] = {}
+        self.time_histogram_us: Dict[int, int] = {}
+
+        self.worst: List[Tuple] = []  # Min-heap of (expanded, seconds, start, goal), the most expensive queries
+        self.last: Optional[Dict] = None
+
+    def record(self, start_id: str, goal_id: str, found: bool, expanded: int, pushes: int,
+               stale_pops: int, max_open_set: int, seconds: float):
+
+        self.queries += 1
+        self.not_found += not found
+        self.totals["expanded"] += expanded
+        self.totals["pushes"] += pushes
+        self.totals["stale_pops"] += stale_pops
+        self.totals["seconds"] += seconds
+        self.max_open_set = max(self.max_open_set, max_open_set)
+
+        bucket = 1 << max(0, expanded - 1).bit_length()
+        self.expanded_histogram[bucket] = self.expanded_histogram.get(bucket, 0) + 1
+        bucket = 1 << max(0, int(seconds * 1e6) - 1).bit_length()
+        self.time_histogram_us[bucket] = self.time_histogram_us.get(bucket, 0) + 1
+
+        entry = (expanded, seconds, start_id, goal_id)
+        if len(self.worst) < self.keep_worst:
+            heapq.heappush(self.worst, entry)
+        elif entry > self.worst[0]:
+            heapq.heapreplace(self.worst, entry)
+
+        self.last = {"start": start_id, "goal": goal_id, "found": found, "expanded": expanded,
+                     "pushes": pushes, "stale_pops": stale_pops, "max_open_set": max_open_set,
+                     "seconds": seconds}
+
+    def worst_queries(self) -> List[Dict]: # Most nodes expanded first
+        return [{"start": start, "goal": goal, "expanded": expanded, "seconds": seconds}
+                for expanded, seconds, start, goal in sorted(self.worst, reverse=True)]
+
+    def to_dict(self) -> Dict:
+        n = self.queries or 1
+        return {
+            "queries": self.queries,
+            "not_found": self.not_found,
+            "totals": dict(self.totals),
+            "mean": {name: value / n for name, value in self.totals.items()},
+            "max_open_set": self.max_open_set,
+            "expanded_histogram": {f"<={b}": c for b, c in sorted(self.expanded_histogram.items())},
+            "time_histogram_us": {f"<={b}": c for b, c in sorted(self.time_histogram_us.items())},
+            "worst_queries": self.worst_queries(),
+        }
+
+
+class RoutingContext:
+    # What every pathfinder on a network shares, computed once per network instead of once per driver.
+    # max_speed, the heuristic's bound, is recomputed on the first read after roads were added or
+    # removed or any speed limit was set, so A* never searches with a stale bound
+
     def __init__(self, network):
+        try:
+            self._network = weakref.ref(network)  # Not a strong one, _CONTEXTS is keyed by the network
+        except TypeError:
+            self._network = lambda: network
+        self.road_count = None
+        self.limit_changes = None
+        self._max_speed = 60
+
+    @property
+    def max_speed(self) -> float: # Fastest speed limit in the network (m/s)
+        network = self._network()
+        if network is not None and (self.road_count != len(network.roads) or self.limit_changes != Road.limit_changes):
+            self.road_count = len(network.roads)
+            self.limit_changes = Road.limit_changes
+            self._max_speed = max(road.speed_limit for road in network.roads.values()) if network.roads else 60
+        return self._max_speed
+
+    @classmethod
+    def of(cls, network) -> 'RoutingContext':
+        # Cached per network object, so every pathfinder on it shares one
+        try:
+            context = _CONTEXTS.get(network)
+        except TypeError: # Not weak-referenceable, nothing to cache on
+            return cls(network)
+        if context is None:
+            context = _CONTEXTS[network] = cls(network)
+        return context
+
+
+_CONTEXTS = weakref.WeakKeyDictionary()  # network -> RoutingContext
+
+
+def memory_edge_cost(distance: float, speed_limit: float, mem: Optional[Dict],
+                     stress_tolerance: float, familiarity_weight: float) -> float:
+    # Time a driver expects a road to take, from its memory of the road (None if never driven):
+    # remembered travel time, more for stressful roads and for roads it knows less well
+    if mem is not None:
+        remembered_speed = mem["avg_speed"] / 3.6
+        remembered_stress = mem["avg_stress"]
+        usage = mem["usage"]
+    else:
+        remembered_speed = speed_limit
+        remembered_stress = 0.0
+        usage = 0
+
+    base_time = distance / remembered_speed
+
+    stress_penalty = remembered_stress * stress_tolerance
+
+    familiarity_penalty = familiarity_weight / (usage + 1)
+
+    return base_time * (1 + stress_penalty + familiarity_penalty)
+
+
+class AStar:    
+    def __init__(self, network, max_speed: Optional[float] = None, context: Optional[RoutingContext] = None):
 
         self.network = network
-        
-        # Find maximum speed in network for heuristic
-        self.max_speed = max(road.speed_limit for road in network.roads.values()) if network.roads else 60
+        self.context = context if context is not None else RoutingContext.of(network)
+
+        # Callers can pass a fixed max speed, e.g. that of the whole network for a region of it,
+        # otherwise the context's is used. bound is what the heuristic divides by, read once per search
+        self.fixed_max_speed = max_speed
+        self.bound = self.max_speed
+
+        self.last_expanded = 0  # Nodes expanded by the last find_path call
+        self.last_search = (0, 0, 0, 0)
+        self.stats: Optional[SearchStats] = None  # Off unless enable_stats() is called
+
+    @property
+    def max_speed(self) -> float:
+        return self.fixed_max_speed if self.fixed_max_speed is not None else self.context.max_speed
+
+    def enable_stats(self, keep_worst: int = 10) -> SearchStats:
+        self.stats = SearchStats(keep_worst)
+        return self.stats
     
     def heuristic(self, node_id: str, goal_id: str) -> float:
 
@@ -20,7 +159,7 @@ class AStar:
         # This never overestimates because:
         # 1. Can't travel faster than max_speed
         # 2. Straight line is shortest distance
-        return distance / self.max_speed
+        return distance / self.bound
     
     def get_edge_cost(self, road) -> float:
         # Cost = distance / speed (time to traverse)
@@ -28,6 +167,24 @@ class AStar:
         return road.distance / road.speed_limit
     
     def find_path(self, start_id: str, goal_id: str) -> Optional[List]: # Find shorthest path
+        # Only reads static network data and keeps search state in locals (apart from bound,
+        # which every thread sets to the same value, and the last_* / stats diagnostics), so it
+        # is safe to call from several threads while the topology (and driver memory) is not changing
+
+        if self.stats is None:
+            return self._search(start_id, goal_id)
+
+        started = time.perf_counter()
+        route = self._search(start_id, goal_id)
+        seconds = time.perf_counter() - started
+        self.stats.record(start_id, goal_id, route is not None, *self.last_search, seconds)
+        return route
+
+    def _search(self, start_id: str, goal_id: str) -> Optional[List]:
+
+        self.last_expanded = 0
+        self.last_search = (0, 0, 0, 0)  # expanded, heap pushes, stale pops skipped, max open set size
+        self.bound = self.max_speed
 
         # Check that start and goal exist
         if start_id not in self.network.nodes or goal_id not in self.network.nodes:
@@ -52,6 +209,11 @@ class AStar:
         
         # Nodes in open set (for quick lookup)
         open_set_hash = {start_id}
+
+        expanded = 0
+        pushes = 1
+        stale_pops = 0
+        max_open = 1
         
         while open_set:
             # Get node with lowest f_score
@@ -59,11 +221,15 @@ class AStar:
             
             # Skip stale entries
             if current not in open_set_hash:
+                stale_pops += 1
                 continue
             open_set_hash.remove(current)
+            expanded += 1
             
             # Found the goal
             if current == goal_id:
+                self.last_expanded = expanded
+                self.last_search = (expanded, pushes, stale_pops, max_open)
                 return self._reconstruct_path(came_from, current)
             
             # Explore neighbors
@@ -86,8 +252,13 @@ class AStar:
                     # Add to open set (allow duplicates, stale entries skipped on pop)
                     heapq.heappush(open_set, (f, neighbor_id))
                     open_set_hash.add(neighbor_id)
+                    pushes += 1
+                    if len(open_set) > max_open:
+                        max_open = len(open_set)
         
         # No path found
+        self.last_expanded = expanded
+        self.last_search = (expanded, pushes, stale_pops, max_open)
         return None
     
     def _reconstruct_path(self, came_from: Dict[str, Tuple[str, object]],
@@ -109,8 +280,8 @@ class AStar:
 
 class AdaptivePathfinder(AStar):
     
-    def __init__(self, network, driver=None):
-        super().__init__(network)
+    def __init__(self, network, driver=None, max_speed: Optional[float] = None, context: Optional[RoutingContext] = None):
+        super().__init__(network, max_speed, context)
         self.driver = driver
     
     def get_edge_cost(self, road) -> float:
@@ -119,22 +290,6 @@ class AdaptivePathfinder(AStar):
         if self.driver is None:
             return super().get_edge_cost(road)
         
-        if road.id in self.driver.memory:
-            mem = self.driver.memory[road.id]
-            remembered_speed = mem["avg_speed"] / 3.6
-            remembered_stress = mem["avg_stress"]
-            usage = mem["usage"]
-        else:
-            remembered_speed = road.speed_limit
-            remembered_stress = 0.0
-            usage = 0
-
-        base_time = road.distance / remembered_speed
-
-        stress_penalty = remembered_stress * self.driver.stress_tolerance
-
-        familiarity_penalty = self.driver.familiarity_weight / (usage + 1)
-
-        cost = base_time * (1 + stress_penalty + familiarity_penalty)
-        
-        return cost
\ No newline at end of file
+        driver = self.driver
+        return memory_edge_cost(road.distance, road.speed_limit, driver.memory.get(road.id),
+                                driver.stress_tolerance, driver.familiarity_weight)
\ No newline at end of file
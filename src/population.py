@@ -0,0 +1,165 @@
+import heapq
+import random
+from array import array
+from typing import Dict, List, Optional
+from src.driver import Driver
+from src.routeDictionary import RouteDictionary
+from src.randomStreams import stream
+
+"""
+A population of drivers that are only Python objects while they are driving.
+
+Idle drivers are kept as rows in typed columns: id, personality, current node (home
+at first), a reference to their memory, trip count, and a schedule entry with
+their next departure time. Simulation(population=...) asks depart() each tick for
+the drivers whose departure is due. Each one is materialised into a Driver, starts
+a trip from its current node, and is dropped again by arrive() when the trip ends.
+It then departs again dwell seconds later. Per-tick cost follows the number of
+vehicles on the road rather than the size of the population.
+
+Memory dicts are shared with the materialised Driver, so what a driver learns on a
+trip is kept. Driver objects are pooled: arrive() puts a driver back in the pool,
+and the next departure gives it another row's id, personality and memory, reusing
+its pathfinder and vehicle. So the number of Driver objects follows the peak
+number of vehicles on the road.
+
+When seeded, destinations come from a stream per (driver, trip), keyed
+"driver:{id}:{trip count}". Simulation(seed=) instead keeps one stream per driver,
+"driver:{id}", for the whole run, which here would mean a live random state of
+about 2.5 KB for every idle row. Homes and first departures are also drawn from
+the demand stream. So a seeded population does not give the same trips as the
+same drivers created with Simulation.create_drivers, but each is reproducible.
+"""
+
+
+class PopulationStore:
+
+    def __init__(self, network, seed: Optional[int] = None, dwell: float = 0.0, exact_transitions: bool = True):
+        self.network = network
+        self.node_ids = list(network.nodes.keys())
+        self.seed = seed
+        self.dwell = dwell  # Seconds a driver stays at its destination before leaving again
+        self.exact_transitions = exact_transitions
+        self.routes: Optional[RouteDictionary] = None  # Given to materialised drivers, Simulation sets its collector's
+
+        # Columns, one row per driver
+        self.ids: List[str] = []
+        self.stress_tolerance = array("d")
+        self.familiarity_weight = array("d")
+        self.learning_rate = array("d")
+        self.location: List[str] = []  # Node the next trip starts from
+        self.memory: List[Optional[Dict]] = []  # None until the first trip
+        self.trip_count = array("l")
+
+        self._schedule = []  # Min-heap of (departure time, row)
+        self._active: Dict[str, int] = {}  # Driver id -> row, for materialised drivers
+        self._pool: List[Driver] = []  # Drivers back from their trip, reused for the next departures
+
+    def add(self, driver_id: str, stress_tolerance: float = 0.5, familiarity_weight: float = 0.5,
+            learning_rate: float = 0.3, home: str = None, departure: float = 0.0) -> int:
+        row = len(self.ids)
+        self.ids.append(driver_id)
+        self.stress_tolerance.append(stress_tolerance)
+        self.familiarity_weight.append(familiarity_weight)
+        self.learning_rate.append(learning_rate)
+        self.location.append(home if home is not None else random.choice(self.node_ids))
+        self.memory.append(None)
+        self.trip_count.append(0)
+        heapq.heappush(self._schedule, (departure, row))
+        return row
+
+    @classmethod
+    def generate(cls, network, num_drivers: int, random_personalities: bool = True, seed: Optional[int] = None,
+                 departure_window: float = 0.0, dwell: float = 0.0) -> 'PopulationStore':
+        # Like Simulation.create_drivers, with homes and first departures spread over departure_window
+
+        population = cls(network, seed=seed, dwell=dwell)
+        rng = stream(seed, "demand") if seed is not None else random
+
+        for i in range(num_drivers):
+            if random_personalities:
+                personality = (rng.uniform(0.1, 0.9), rng.uniform(0.1, 0.9), rng.uniform(0.1, 0.5))
+            else:
+                personality = (0.5, 0.5, 0.3)
+            home = rng.choice(population.node_ids)
+            departure = rng.uniform(0, departure_window) if departure_window > 0 else 0.0
+            population.add(f"D{i}", *personality, home=home, departure=departure)
+
+        return population
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def active(self) -> int: # Drivers currently materialised
+        return len(self._active)
+
+    def next_departure(self) -> Optional[float]:
+        return self._schedule[0][0] if self._schedule else None
+
+    def materialise(self, row: int) -> Driver:
+        return self.materialise_many([row])[0]
+
+    def materialise_many(self, rows: List[int]) -> List[Driver]:
+        # Pooled drivers are taken first, the rest are built together with Driver.build_many
+        pool = self._pool
+        reused = [pool.pop() for _ in range(min(len(pool), len(rows)))]
+        built = Driver.build_many(self.network, ((self.ids[row], {}) for row in rows[len(reused):]),
+                                  exact_transitions=self.exact_transitions)
+        drivers = reused + built
+
+        for row, driver in zip(rows, drivers):
+            driver.id = self.ids[row]
+            driver.stress_tolerance = self.stress_tolerance[row]
+            driver.familiarity_weight = self.familiarity_weight[row]
+            driver.learning_rate = self.learning_rate[row]
+            driver.last_goal = None
+            driver.leftover_time = 0.0
+            driver.waiting_to_start = False
+            driver.routes = self.routes
+
+            if self.memory[row] is None:
+                self.memory[row] = {}
+            driver.memory = self.memory[row]
+            driver.trip_count = self.trip_count[row]
+            if self.seed is not None:
+                driver.rng = stream(self.seed, f"driver:{driver.id}:{driver.trip_count}")
+
+            self._active[driver.id] = row
+        return drivers
+
+    def depart(self, time: float) -> List[Driver]:
+        # Materialises every driver due to leave by time and starts its trip
+        rows = []
+        schedule = self._schedule
+        while schedule and schedule[0][0] <= time:
+            _, row = heapq.heappop(schedule)
+            if len(self.node_ids) < 2:
+                continue
+            rows.append(row)
+        if not rows:
+            return []
+
+        departing = self.materialise_many(rows)
+        for row, driver in zip(rows, departing):
+            start = self.location[row]
+            goal = driver.rng.choice(self.node_ids)
+            while goal == start:
+                goal = driver.rng.choice(self.node_ids)
+
+            driver.start_trip(start, goal, self.network)
+        return departing
+
+    def arrive(self, driver: Driver, time: float) -> bool:
+        # Back to a row once its trip has finished. False if the driver is not from this population
+        row = self._active.pop(driver.id, None)
+        if row is None:
+            return False
+
+        vehicle = driver.current_vehicle
+        if vehicle is not None and vehicle.route:
+            self.location[row] = vehicle.route[-1].end.id
+        self.trip_count[row] = driver.trip_count
+        heapq.heappush(self._schedule, (time + self.dwell, row))
+        self._pool.append(driver)
+        return True
@@ -0,0 +1,197 @@
+import functools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+"""
+Per-phase profiling for Simulation.run.
+
+While any run is being profiled, the methods listed in _instrumented() are replaced
+on their classes by timing wrappers, which are installed by the first profiled run
+and restored when the last one ends (under a lock, so runs may overlap). A wrapper
+records into the profiler registered for the calling thread, and calls straight
+through on any other thread or when that profiler's enabled is False. Runs with no
+profiler anywhere in the process execute exactly the normal code.
+
+Phases nest, so time is recorded per call path, e.g. "tick;plan;roads" for
+add_vehicle called from start_trip. Results can be written as JSON or as folded
+stacks ("tick;move;roads 1234", self time in microseconds) for flame graph tools
+such as flamegraph.pl or speedscope.
+
+Only calls made on the thread that started the run are recorded, so concurrent
+profiled runs on different threads, or the worker threads of a RoutingService, do
+not count into each other. A profiler records one run at a time.
+"""
+
+
+def _instrumented() -> List[Tuple[type, str, str]]:
+    # (class, method, phase). Imported here to keep this module free of import cycles
+    from src.driver import Driver
+    from src.network import Road
+    from src.pathfinding import AStar
+    from src.dataCollection import DataCollector
+    return [
+        (Driver, "start_trip", "plan"),
+        (AStar, "find_path", "astar"),
+        (Driver, "update", "move"),
+        (Road, "add_vehicle", "roads"),
+        (Road, "remove_vehicle", "roads"),
+        (DataCollector, "log_trip", "io"),
+        (DataCollector, "log_roads", "io"),
+        (DataCollector, "flush", "io"),
+    ]
+
+
+# Called with (instance, result) after a recorded call, names of Profiler methods
+_HOOKS = {"find_path": "_after_find_path", "start_trip": "_after_start_trip", "update": "_after_update"}
+
+_lock = threading.Lock()
+_originals: List[Tuple[type, str, object]] = []  # Methods replaced while any run is profiled
+_active: Dict[int, 'Profiler'] = {}  # thread id -> profiler recording calls made on it
+
+
+def _wrap(original, phase: str, hook: Optional[str]):
+
+    @functools.wraps(original)
+    def timed(*args, **kwargs):
+        profiler = _active.get(threading.get_ident())
+        if profiler is None or not profiler.enabled:
+            return original(*args, **kwargs)
+
+        parent = profiler._paths[-1]
+        path = f"{parent};{phase}" if parent else phase
+        profiler._paths.append(path)
+        started = time.perf_counter()
+        try:
+            result = original(*args, **kwargs)
+        finally:
+            profiler._record(path, time.perf_counter() - started)
+            profiler._paths.pop()
+        if hook:
+            getattr(profiler, hook)(args[0], result)
+        return result
+
+    return timed
+
+
+class Profiler:
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled  # Can be switched at any time, also during a run
+
+        self.phase_seconds: Dict[str, float] = {}  # call path -> total seconds
+        self.phase_calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+
+        self.ticks = 0
+        self.tick_seconds = 0.0
+        self.tick_max = 0.0
+        self.tick_histogram: Dict[int, int] = {}  # power of two (microseconds) -> ticks up to it
+
+        self._paths = [""]  # Stack of call paths
+        self._thread = None
+        self._tick_started = 0.0
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _record(self, path: str, seconds: float):
+        self.phase_seconds[path] = self.phase_seconds.get(path, 0.0) + seconds
+        self.phase_calls[path] = self.phase_calls.get(path, 0) + 1
+
+    def begin_tick(self):
+        self._paths.append("tick")
+        self._tick_started = time.perf_counter()
+
+    def end_tick(self):
+        seconds = time.perf_counter() - self._tick_started
+        self._paths.pop()
+        self._record("tick", seconds)
+
+        self.ticks += 1
+        self.tick_seconds += seconds
+        self.tick_max = max(self.tick_max, seconds)
+        bucket = 2 ** max(0, math.ceil(math.log2(max(seconds * 1e6, 1))))
+        self.tick_histogram[bucket] = self.tick_histogram.get(bucket, 0) + 1
+
+    def _after_find_path(self, pathfinder, route):
+        self.count("astar_queries")
+        self.count("astar_nodes_expanded", pathfinder.last_expanded)
+
+    def _after_start_trip(self, driver, result):
+        self.count("trips_started")
+
+    def _after_update(self, driver, finished):
+        if finished:
+            self.count("trips_completed")
+
+    @contextmanager
+    def instrumented(self):
+        # Records calls made on this thread for the duration of a run
+        thread = threading.get_ident()
+        with _lock:
+            if self._thread is not None or thread in _active:
+                raise ValueError("A profiled run is already in progress on this profiler or thread")
+            if not _active:
+                for owner, name, phase in _instrumented():
+                    original = owner.__dict__[name]
+                    _originals.append((owner, name, original))
+                    setattr(owner, name, _wrap(original, phase, _HOOKS.get(name)))
+            _active[thread] = self
+            self._thread = thread
+        try:
+            yield self
+        finally:
+            with _lock:
+                del _active[thread]
+                self._thread = None
+                if not _active:
+                    for owner, name, original in reversed(_originals):
+                        setattr(owner, name, original)
+                    _originals.clear()
+
+    def self_seconds(self) -> Dict[str, float]: # Time in each call path excluding nested phases
+        own = dict(self.phase_seconds)
+        for path, seconds in self.phase_seconds.items():
+            if ";" in path:
+                parent = path.rsplit(";", 1)[0]
+                if parent in own:
+                    own[parent] -= seconds
+        return own
+
+    def to_dict(self) -> Dict:
+        return {
+            "ticks": self.ticks,
+            "tick_seconds": {
+                "total": self.tick_seconds,
+                "mean": self.tick_seconds / self.ticks if self.ticks else 0.0,
+                "max": self.tick_max,
+            },
+            "tick_histogram_us": {f"<={bucket}": count for bucket, count in sorted(self.tick_histogram.items())},
+            "phases": {path: {"seconds": self.phase_seconds[path], "calls": self.phase_calls[path]}
+                       for path in sorted(self.phase_seconds)},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write_json(self, filepath: str):
+        with open(filepath, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_folded(self, filepath: str):
+        # One "path microseconds" line per call path, the input format of flame graph tools
+        with open(filepath, 'w') as f:
+            for path, seconds in sorted(self.self_seconds().items()):
+                microseconds = round(max(seconds, 0.0) * 1e6)
+                if microseconds:
+                    f.write(f"{path} {microseconds}\n")
+
+    def summary(self) -> str:
+        lines = [f"{self.ticks} ticks, {self.tick_seconds:.3f}s"]
+        for path, seconds in sorted(self.phase_seconds.items(), key=lambda item: -item[1]):
+            lines.append(f"  {path}: {seconds:.3f}s in {self.phase_calls[path]} calls")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
@@ -0,0 +1,19 @@
+import hashlib
+import random
+
+"""
+Independent random streams derived from one master seed.
+
+Each stream is keyed by a name (a driver id, "demand", ...) and seeded from a hash
+of (master seed, key), so the numbers an entity draws depend only on its own key and
+not on how many draws other entities made before it.
+"""
+
+
+def derive_seed(master_seed: int, key: str) -> int:
+    digest = hashlib.blake2b(f"{master_seed}:{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def stream(master_seed: int, key: str) -> random.Random:
+    return random.Random(derive_seed(master_seed, key))
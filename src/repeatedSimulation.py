@@ -1,7 +1,7 @@
 import random
 from typing import List, Dict, Optional
 from src.network import TrafficNetwork, Node, Road
-from src.driver import Driver
+from src.driver import Driver, TripRecord
 from src.simulation import Simulation
 from src.dataCollection import DataCollector
 from src.visualization import visualize_network_with_traffic
@@ -71,15 +71,7 @@ class RepeatedSimulation: #Runs multiple simulations with the same random seed.
     def _reset_driver_state(self, driver: Driver): # Reset driver state without memory
         driver.current_vehicle = None
         driver.trip_count = 0
-        driver.current_trip_data = {
-            "start_node": None,
-            "goal_node": None,
-            "roads_traveled": [],
-            "total_time": 0.0,
-            "total_distance": 0.0,
-            "speed_observations": [],
-            "stress_observations": []
-        }
+        driver.current_trip_data = TripRecord()
     
     def _print_summary(self):
         print(f"\n{'='*50}")
@@ -0,0 +1,199 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from statistics import NormalDist
+from typing import Callable, Dict, List, Optional
+from src.resultsLoader import load_run
+from src.scenarioRunner import ScenarioSpec, run_scenario
+
+"""
+Monte Carlo replication of scenarios over independent seeds.
+
+Replication i uses seed base_seed + i. Results are folded into running statistics
+strictly in seed order, and the stopping rule is checked after each one, so the
+number of replications and the reported intervals do not depend on how many
+workers ran them.
+"""
+
+
+EXACT_DF = 200  # Largest df for which t_critical inverts the exact distribution
+
+
+def t_coverage(t: float, df: int) -> float:
+    # P(|T| <= t) for Student's t with df degrees of freedom, by the finite series for integer df
+    # (Abramowitz and Stegun 26.7.3 and 26.7.4)
+    theta = math.atan(t / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    if df % 2:
+        total, term = 0.0, 1.0
+        for k in range(1, (df - 1) // 2 + 1):  # cos theta * (1 + 2/3 cos^2 + 2*4/(3*5) cos^4 + ...)
+            total += term
+            term *= 2 * k / (2 * k + 1) * cos2
+        return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+    total, term = 0.0, 1.0
+    for k in range(1, df // 2 + 1):  # 1 + 1/2 cos^2 + 1*3/(2*4) cos^4 + ...
+        total += term
+        term *= (2 * k - 1) / (2 * k) * cos2
+    return math.sin(theta) * total
+
+
+def t_critical(confidence: float, df: int) -> float:
+    # Two-sided Student t quantile. Up to EXACT_DF degrees of freedom t_coverage is inverted by
+    # bisection, exact to float precision; beyond that the Cornish-Fisher expansion is within 1e-7
+    if df <= EXACT_DF:
+        low, high = 0.0, math.pi / 2  # On theta = atan(t / sqrt(df)), so the interval is finite
+        for _ in range(60):
+            middle = (low + high) / 2
+            if t_coverage(math.sqrt(df) * math.tan(middle), df) < confidence:
+                low = middle
+            else:
+                high = middle
+        return math.sqrt(df) * math.tan((low + high) / 2)
+
+    p = 1 - (1 - confidence) / 2
+    z = NormalDist().inv_cdf(p)
+    return (z
+            + (z**3 + z) / (4 * df)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3))
+
+
+class OnlineStats: # Welford's running mean and variance
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        if self.count < 2:
+            return math.inf
+        return t_critical(confidence, self.count - 1) * math.sqrt(self.variance / self.count)
+
+
+def trip_metrics(output_dirs: List[str]) -> Dict[str, float]:
+    # Default metrics, computed on the first scenario of each replication
+    trips = load_run(output_dirs[0]).trips
+    count = len(trips)
+    return {
+        "trips": count,
+        "average_trip_time": sum(trips["total_trip_time"]) / count if count else 0.0,
+        "average_stress": sum(trips["average_stress"]) / count if count else 0.0,
+    }
+
+
+def trip_time_difference(output_dirs: List[str]) -> Dict[str, float]:
+    # Paired difference in mean trip time, first scenario minus second, under a common seed
+    first = trip_metrics(output_dirs[:1])["average_trip_time"]
+    second = trip_metrics(output_dirs[1:2])["average_trip_time"]
+    return {"trip_time_difference": first - second}
+
+
+def _run_replication(specs: List[ScenarioSpec], metrics: Callable) -> Dict[str, float]:
+    for spec in specs:
+        run_scenario(spec)
+    return metrics([spec.output_dir for spec in specs])
+
+
+class ReplicationReport:
+
+    def __init__(self, confidence: float):
+        self.confidence = confidence
+        self.stats: Dict[str, OnlineStats] = {}
+        self.samples: List[Dict[str, float]] = []
+
+    def add(self, values: Dict[str, float]):
+        self.samples.append(values)
+        for name, value in values.items():
+            self.stats.setdefault(name, OnlineStats()).add(value)
+
+    @property
+    def replications(self) -> int:
+        return len(self.samples)
+
+    def interval(self, name: str) -> tuple: # (mean, half width)
+        stats = self.stats[name]
+        return stats.mean, stats.half_width(self.confidence)
+
+    def summary(self) -> str:
+        lines = [f"{self.replications} replications, {self.confidence:.0%} confidence intervals:"]
+        for name in self.stats:
+            mean, half = self.interval(name)
+            lines.append(f"  {name}: {mean:.3f} +/- {half:.3f}")
+        return "\n".join(lines)
+
+
+def replicate(make_specs: Callable[[int, int], List[ScenarioSpec]], metrics: Callable = trip_metrics,
+              base_seed: int = 42, min_replications: int = 5, max_replications: int = 100,
+              precision: Optional[float] = None, relative: bool = False, target: Optional[str] = None,
+              confidence: float = 0.95, max_workers: Optional[int] = None) -> ReplicationReport:
+
+    # make_specs(index, seed) returns the scenarios of one replication, e.g. [adaptive, base]
+    # with separate output dirs. Stops once the target metric (default: every metric) has a
+    # half width <= precision (a fraction of the mean when relative=True).
+
+    report = ReplicationReport(confidence)
+
+    def precise_enough() -> bool:
+        if precision is None or report.replications < max(min_replications, 2):
+            return False
+        names = [target] if target else list(report.stats)
+        for name in names:
+            mean, half = report.interval(name)
+            limit = precision * abs(mean) if relative else precision
+            if half > limit:
+                return False
+        return True
+
+    def finished() -> bool:
+        if report.replications >= max_replications:
+            return True
+        if precision is None:
+            return report.replications >= min_replications
+        return precise_enough()
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers <= 1:
+        index = 0
+        while not finished():
+            report.add(_run_replication(make_specs(index, base_seed + index), metrics))
+            index += 1
+        return report
+
+    pending = {}   # future -> replication index
+    completed = {} # replication index -> metrics, waiting for earlier indices
+    next_index = 0
+
+    # Once the stopping rule is met, replications not yet started are cancelled. Running ones
+    # cannot be interrupted: the shutdown waits for them and their results are dropped
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        while not finished():
+            while len(pending) < max_workers and next_index < max_replications:
+                future = pool.submit(_run_replication, make_specs(next_index, base_seed + next_index), metrics)
+                pending[future] = next_index
+                next_index += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                completed[pending.pop(future)] = future.result()
+
+            # Fold results in seed order and re-check the stopping rule after each one
+            while report.replications in completed and not finished():
+                report.add(completed.pop(report.replications))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return report
@@ -0,0 +1,359 @@
+import json
+import os
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+from src.dataCollection import find_results_file, iter_row_batches
+
+"""
+Loads a results directory (trips + road snapshots) into typed column arrays.
+Plain, gzip and lzma compressed CSV output are all read the same way.
+
+Columns are stdlib arrays ('q' for integers, 'd' for floats). Text columns are
+dictionary encoded: an array of integer codes plus the list of distinct values.
+Routes are interned, so every distinct route is stored once as a tuple of road
+codes and each trip only keeps the integer id of its route.
+"""
+
+TRIPS_CSV = "trips.csv"
+ROADS_CSV = "road_snapshots.csv"
+ROUTES_CSV = "routes.csv"
+TRIPS_BIN = "trips.cols"
+ROADS_BIN = "road_snapshots.cols"
+
+BINARY_MAGIC = b"TYPCOLS1"
+
+# Column name -> kind. 's' = dictionary encoded text, 'r' = interned route
+TRIP_SCHEMA = {
+    "driver_id": "s",
+    "trip_number": "q",
+    "start_node": "s",
+    "goal_node": "s",
+    "route_taken": "r",
+    "total_trip_time": "d",
+    "total_distance": "d",
+    "average_speed": "d",
+    "average_stress": "d",
+}
+
+ROAD_SCHEMA = {
+    "timestamp": "d",
+    "road_id": "s",
+    "vehicle_count": "q",
+    "current_speed_kmh": "d",
+    "density": "d",
+    "stress_level": "d",
+}
+
+
+class StringColumn:
+
+    def __init__(self, codes: array = None, values: List[str] = None):
+        self.codes = codes if codes is not None else array('q')
+        self.values = values if values is not None else []
+        self._lookup = {v: i for i, v in enumerate(self.values)}
+
+    def intern(self, value: str) -> int:
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self._lookup[value] = code
+            self.values.append(value)
+        return code
+
+    def append(self, value: str):
+        self.codes.append(self.intern(value))
+
+    def code_of(self, value: str) -> Optional[int]:
+        return self._lookup.get(value)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[c] for c in self.codes)
+
+
+class RouteTable:
+    # Each distinct route is a tuple of road codes, road codes index into road_ids
+
+    def __init__(self, road_ids: StringColumn = None):
+        self.road_ids = road_ids if road_ids is not None else StringColumn()
+        self.routes: List[Tuple[int, ...]] = []
+        self._lookup: Dict[Tuple[int, ...], int] = {}
+
+    def intern(self, roads: Tuple[int, ...]) -> int:
+        route_id = self._lookup.get(roads)
+        if route_id is None:
+            route_id = len(self.routes)
+            self._lookup[roads] = route_id
+            self.routes.append(roads)
+        return route_id
+
+    def intern_string(self, route: str) -> int:
+        if not route:
+            return self.intern(())
+        intern_road = self.road_ids.intern
+        return self.intern(tuple(intern_road(r) for r in route.split("->")))
+
+    def road_names(self, route_id: int) -> List[str]:
+        values = self.road_ids.values
+        return [values[c] for c in self.routes[route_id]]
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+
+class Table:
+
+    def __init__(self, schema: Dict[str, str], routes: RouteTable = None):
+        self.schema = schema
+        self.routes = routes
+        self.columns: Dict[str, object] = {}
+        for name, kind in schema.items():
+            if kind == "s":
+                self.columns[name] = StringColumn()
+            elif kind == "r":
+                self.columns[name] = array('q')
+            else:
+                self.columns[name] = array(kind)
+
+    def __len__(self) -> int:
+        first = next(iter(self.columns.values()))
+        return len(first)
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def append_row(self, row: Dict[str, str]):
+        for name, kind in self.schema.items():
+            column = self.columns[name]
+            value = row[name]
+            if kind == "s":
+                column.append(value)
+            elif kind == "r":
+                column.append(value if isinstance(value, int) else self.routes.intern_string(value))
+            elif kind == "q":
+                column.append(int(float(value)))
+            else:
+                column.append(float(value))
+
+    def group_keys(self, name: str) -> Tuple[array, List]:
+        # Returns (codes, labels) for any column so it can be used as a group key
+        column = self.columns[name]
+        if isinstance(column, StringColumn):
+            return column.codes, column.values
+        labels = sorted(set(column))
+        index = {v: i for i, v in enumerate(labels)}
+        return array('q', (index[v] for v in column)), labels
+
+    def group_by(self, key: str, values: List[str]) -> Dict:
+        # Returns {label: {"count": n, "<value>": mean, ...}} for each group
+        codes, labels = self.group_keys(key)
+        counts = group_count(codes, len(labels))
+        sums = {v: group_sum(codes, self.columns[v], len(labels)) for v in values}
+
+        result = {}
+        for i, label in enumerate(labels):
+            if counts[i] == 0:
+                continue
+            stats = {"count": counts[i]}
+            for v in values:
+                stats[v] = sums[v][i] / counts[i]
+            result[label] = stats
+        return result
+
+
+def group_count(codes: array, num_groups: int) -> array:
+    counts = array('q', bytes(8 * num_groups))
+    for c in codes:
+        counts[c] += 1
+    return counts
+
+
+def group_sum(codes: array, values: array, num_groups: int) -> array:
+    sums = array('d', bytes(8 * num_groups))
+    for c, v in zip(codes, values):
+        sums[c] += v
+    return sums
+
+
+class RunResults:
+
+    def __init__(self, trips: Table, roads: Table, routes: RouteTable):
+        self.trips = trips
+        self.roads = roads
+        self.routes = routes
+
+    def per_road(self) -> Dict[str, Dict]:
+        # Average snapshot state per road
+        return self.roads.group_by("road_id", ["vehicle_count", "current_speed_kmh", "density", "stress_level"])
+
+    def per_driver(self) -> Dict[str, Dict]:
+        return self.trips.group_by("driver_id", ["total_trip_time", "total_distance", "average_speed", "average_stress"])
+
+    def per_trip_number(self) -> Dict[int, Dict]:
+        return self.trips.group_by("trip_number", ["total_trip_time", "total_distance", "average_speed", "average_stress"])
+
+    def road_usage(self) -> Dict[str, int]:
+        # Count each route once, then expand the distinct routes into roads
+        route_counts = group_count(self.trips["route_taken"], len(self.routes))
+        road_counts = array('q', bytes(8 * len(self.routes.road_ids.values)))
+        for route_id, n in enumerate(route_counts):
+            if n:
+                for road_code in self.routes.routes[route_id]:
+                    road_counts[road_code] += n
+        names = self.routes.road_ids.values
+        return {names[c]: n for c, n in enumerate(road_counts) if n}
+
+    def unique_routes(self) -> set:
+        return set(self.trips["route_taken"])
+
+
+def load_run(run_dir: str, fmt: Optional[str] = None) -> RunResults:
+    # fmt is "csv", "binary" or None to pick binary when it exists
+    if fmt is None:
+        fmt = "binary" if os.path.exists(os.path.join(run_dir, TRIPS_BIN)) else "csv"
+
+    if fmt == "binary":
+        return _load_binary(run_dir)
+    if fmt == "csv":
+        return _load_csv(run_dir)
+    raise ValueError(f"Unknown results format: {fmt}")
+
+
+def _load_csv(run_dir: str) -> RunResults:
+    routes = RouteTable()
+    trips = Table(TRIP_SCHEMA, routes)
+    roads = Table(ROAD_SCHEMA)
+
+    # Newer logs store a route id per trip and each distinct route once in routes.csv
+    route_lookup = {}
+    routes_path = find_results_file(run_dir, ROUTES_CSV)
+    if routes_path is not None:
+        for batch in iter_row_batches(routes_path):
+            for row in batch:
+                route_lookup[row["route_id"]] = routes.intern_string(row["route_taken"])
+
+    for batch in iter_row_batches(_require(run_dir, TRIPS_CSV)):
+        for row in batch:
+            if "route_id" in row:
+                row["route_taken"] = route_lookup[row["route_id"]]
+            trips.append_row(row)
+
+    for batch in iter_row_batches(_require(run_dir, ROADS_CSV)):
+        for row in batch:
+            roads.append_row(row)
+
+    return RunResults(trips, roads, routes)
+
+
+def _require(run_dir: str, filename: str) -> str:
+    filepath = find_results_file(run_dir, filename)
+    if filepath is None:
+        raise FileNotFoundError(f"No {filename} (plain or compressed) in {run_dir}")
+    return filepath
+
+
+def save_binary(results: RunResults, run_dir: str):
+    # Writes trips.cols and road_snapshots.cols next to (or instead of) the CSVs
+    if not os.path.exists(run_dir):
+        os.makedirs(run_dir)
+
+    route_offsets = array('q', [0])
+    route_roads = array('q')
+    for route in results.routes.routes:
+        route_roads.extend(route)
+        route_offsets.append(len(route_roads))
+
+    extra = {
+        "road_ids": results.routes.road_ids.values,
+        "route_offsets": route_offsets,
+        "route_roads": route_roads,
+    }
+    _write_table(os.path.join(run_dir, TRIPS_BIN), results.trips, extra)
+    _write_table(os.path.join(run_dir, ROADS_BIN), results.roads, {})
+
+
+def _write_table(filepath: str, table: Table, extra: Dict):
+    header = {"byteorder": sys.byteorder, "rows": len(table), "columns": [], "arrays": []}
+    blobs = []
+
+    for name, kind in table.schema.items():
+        column = table.columns[name]
+        entry = {"name": name, "kind": kind}
+        if isinstance(column, StringColumn):
+            entry["values"] = column.values
+            column = column.codes
+        header["columns"].append(entry)
+        blobs.append(column)
+
+    for name, value in extra.items():
+        if isinstance(value, array):
+            header["arrays"].append({"name": name, "typecode": value.typecode, "length": len(value)})
+            blobs.append(value)
+        else:
+            header[name] = value
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(filepath, 'wb') as f:
+        f.write(BINARY_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for blob in blobs:
+            blob.tofile(f)
+
+
+def _read_table(filepath: str, schema: Dict[str, str], routes: RouteTable = None) -> Tuple[Table, Dict]:
+    table = Table(schema, routes)
+    extras = {}
+
+    with open(filepath, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{filepath} is not a results column file")
+        header_len = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+        swap = header["byteorder"] != sys.byteorder
+        rows = header["rows"]
+
+        for entry in header["columns"]:
+            kind = entry["kind"]
+            data = array('q' if kind in ("s", "r") else kind)
+            data.fromfile(f, rows)
+            if swap:
+                data.byteswap()
+            if kind == "s":
+                table.columns[entry["name"]] = StringColumn(data, entry["values"])
+            else:
+                table.columns[entry["name"]] = data
+
+        for entry in header["arrays"]:
+            data = array(entry["typecode"])
+            data.fromfile(f, entry["length"])
+            if swap:
+                data.byteswap()
+            extras[entry["name"]] = data
+
+    for key in header:
+        if key not in ("byteorder", "rows", "columns", "arrays"):
+            extras[key] = header[key]
+
+    return table, extras
+
+
+def _load_binary(run_dir: str) -> RunResults:
+    routes = RouteTable()
+    trips, extras = _read_table(os.path.join(run_dir, TRIPS_BIN), TRIP_SCHEMA, routes)
+
+    routes.road_ids = StringColumn(values=list(extras["road_ids"]))
+    offsets = extras["route_offsets"]
+    roads_flat = extras["route_roads"]
+    for i in range(len(offsets) - 1):
+        routes.intern(tuple(roads_flat[offsets[i]:offsets[i + 1]]))
+
+    roads, _ = _read_table(os.path.join(run_dir, ROADS_BIN), ROAD_SCHEMA)
+    return RunResults(trips, roads, routes)
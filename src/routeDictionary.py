@@ -0,0 +1,81 @@
+from typing import Dict, List, Sequence, Tuple
+
+"""
+Interned routes.
+
+A route is stored as a node in a prefix tree: each id is (parent id, last road id),
+so a driver can extend the route it has travelled one road at a time with a single
+dict lookup, and drivers repeating the same commute end up with the same integer.
+Id 0 is the empty route.
+"""
+
+EMPTY_ROUTE = 0
+
+
+class RouteDictionary:
+
+    def __init__(self):
+        self.parents: List[int] = [EMPTY_ROUTE]
+        self.last_roads: List[str] = [None]
+        self.lengths: List[int] = [0]
+        self._children: Dict[Tuple[int, str], int] = {}
+        self._cache: Dict[int, Tuple[str, ...]] = {EMPTY_ROUTE: ()}
+        self.lookups = 0  # extend() calls, only counted after count_lookups()
+        self._counted_from = 1  # Routes that existed when counting started
+
+    def extend(self, route_id: int, road_id: str) -> int: # Route id of route_id followed by road_id
+        key = (route_id, road_id)
+        child = self._children.get(key)
+        if child is None:
+            child = len(self.parents)
+            self.parents.append(route_id)
+            self.last_roads.append(road_id)
+            self.lengths.append(self.lengths[route_id] + 1)
+            self._children[key] = child
+        return child
+
+    def count_lookups(self):
+        # Counts extend() calls from now on for dedup_ratio. The counting version shadows
+        # extend on this instance only, so dictionaries nobody reports on pay nothing
+        self._counted_from = len(self.parents)
+        self.extend = self._counted_extend
+
+    def _counted_extend(self, route_id: int, road_id: str) -> int:
+        self.lookups += 1
+        return RouteDictionary.extend(self, route_id, road_id)
+
+    def intern(self, road_ids: Sequence[str]) -> int:
+        route_id = EMPTY_ROUTE
+        for road_id in road_ids:
+            route_id = self.extend(route_id, road_id)
+        return route_id
+
+    def roads(self, route_id: int) -> Tuple[str, ...]:
+        cached = self._cache.get(route_id)
+        if cached is not None:
+            return cached
+
+        path = []
+        current = route_id
+        while current != EMPTY_ROUTE:
+            path.append(self.last_roads[current])
+            current = self.parents[current]
+        path.reverse()
+
+        roads = tuple(path)
+        self._cache[route_id] = roads
+        return roads
+
+    def to_string(self, route_id: int) -> str:
+        return "->".join(self.roads(route_id))
+
+    def length(self, route_id: int) -> int:
+        return self.lengths[route_id]
+
+    def dedup_ratio(self) -> float: # Share of counted extend() calls that found an existing route
+        if not self.lookups:
+            return 0.0
+        return 1 - (len(self.parents) - self._counted_from) / self.lookups
+
+    def __len__(self) -> int:
+        return len(self.parents)
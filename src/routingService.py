@@ -0,0 +1,158 @@
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Dict, List, Optional
+from src.network import TrafficNetwork
+from src.pathfinding import AdaptivePathfinder, RoutingContext
+from src.sharedNetwork import SharedNetwork, NetworkHandle, SharedNetworkView, ViewPathfinder, attach
+
+"""
+Route planning in a pool of worker processes or threads.
+
+In "processes" mode the network is exported once to shared memory (see sharedNetwork)
+and every worker searches the read-only views with ViewPathfinder, without building
+Node or Road objects. A request carries the start and goal node indices and a snapshot
+of what the driver's edge costs depend on (personality and memory keyed by road
+index), so workers plan exactly the route AdaptivePathfinder would plan inline.
+
+In "threads" mode requests are planned on the simulation's own network with no
+pickling. This is safe under the following model, and scales across cores on a
+free-threaded (no-GIL) build:
+
+- find_path only reads static network data (nodes, adjacency, distances, speed
+  limits) and keeps its search state in local variables. Nothing in planning reads
+  road.vehicles or current speeds.
+- Each request gets its own AdaptivePathfinder, reading a read-only view of the
+  driver's memory instead of a copy.
+- Driver memory and the network topology must not change while requests are in
+  flight. Simulation.plan_trips plans between ticks, and Simulation.queue_restart
+  submits a driver's next trip while the tick goes on, but that driver's memory
+  only changes again once that trip has started and ended.
+
+submit() blocks while max_pending requests are in flight, and plan() returns
+results in request order whatever order the workers finish in.
+"""
+
+
+class CostProfile: # Stand-in for a Driver with just what AdaptivePathfinder.get_edge_cost reads
+
+    def __init__(self, stress_tolerance: float, familiarity_weight: float, memory: Dict[str, Dict]):
+        self.stress_tolerance = stress_tolerance
+        self.familiarity_weight = familiarity_weight
+        self.memory = memory
+
+    @classmethod
+    def indexed(cls, driver, road_index: Dict[str, int]) -> 'CostProfile':
+        # Copy keyed by road index for ViewPathfinder. Memory entries are updated as
+        # trips finish, so the snapshot must not share them
+        return cls(driver.stress_tolerance, driver.familiarity_weight,
+                   {road_index[road_id]: dict(mem) for road_id, mem in driver.memory.items() if road_id in road_index})
+
+    @classmethod
+    def view(cls, driver) -> 'CostProfile': # No copy, only valid while the driver's memory is not updated
+        return cls(driver.stress_tolerance, driver.familiarity_weight, MappingProxyType(driver.memory))
+
+
+def free_threaded() -> bool: # True on a free-threaded build running with the GIL disabled
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+_view: Optional[SharedNetworkView] = None  # One per worker process, kept attached until it exits
+_pathfinder: Optional[ViewPathfinder] = None
+
+
+def _init_worker(handle: NetworkHandle, max_speed: float):
+    global _view, _pathfinder
+    _view = attach(handle)
+    _pathfinder = ViewPathfinder(_view, max_speed)
+
+
+def _plan(start: int, goal: int, profile: CostProfile) -> Optional[List[int]]: # Road indices
+    _pathfinder.profile = profile
+    return _pathfinder.find_path(start, goal)
+
+
+def _chain(future: Future, convert) -> Future: # Future of convert(result of future)
+    chained = Future()
+
+    def done(finished: Future):
+        error = finished.exception()
+        if error is not None:
+            chained.set_exception(error)
+        else:
+            chained.set_result(convert(finished.result()))
+
+    future.add_done_callback(done)
+    return chained
+
+
+class RoutingService:
+
+    def __init__(self, network: TrafficNetwork, max_workers: Optional[int] = None, max_pending: int = 256,
+                 mode: Optional[str] = None):
+
+        # Default: threads where they run in parallel, processes otherwise
+        if mode is None:
+            mode = "threads" if free_threaded() else "processes"
+        if mode not in ("processes", "threads"):
+            raise ValueError(f"Unknown mode: {mode}")
+
+        self.network = network
+        self.mode = mode
+        self.shared = None
+        workers = max_workers or os.cpu_count() or 1
+
+        self.context = RoutingContext.of(network)  # Looked up once, not from the worker threads
+        if mode == "processes":
+            self.shared = SharedNetwork.export(network)
+            # Same order as the export, to translate ids to the workers' indices and back
+            self.node_index = {node_id: i for i, node_id in enumerate(network.nodes)}
+            self.road_ids = list(network.roads)
+            self.road_index = {road_id: i for i, road_id in enumerate(self.road_ids)}
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(self.shared.handle, self.context.max_speed))
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        self.slots = threading.BoundedSemaphore(max_pending)  # Back-pressure on submitters
+        self.submitted = 0  # Routes requested so far
+
+    def _plan_here(self, start: str, goal: str, profile: CostProfile) -> Optional[List[str]]:
+        pathfinder = AdaptivePathfinder(self.network, driver=profile, context=self.context)
+        route = pathfinder.find_path(start, goal)
+        return None if route is None else [road.id for road in route]
+
+    def submit(self, driver, start: str, goal: str) -> Future: # Future of a list of road ids, or None
+        self.slots.acquire()
+        self.submitted += 1
+        if self.mode == "processes":
+            future = self.pool.submit(_plan, self.node_index.get(start, -1), self.node_index.get(goal, -1),
+                                      CostProfile.indexed(driver, self.road_index))
+            road_ids = self.road_ids
+            future = _chain(future, lambda roads: None if roads is None else [road_ids[road] for road in roads])
+        else:
+            future = self.pool.submit(self._plan_here, start, goal, CostProfile.view(driver))
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def plan(self, requests: List[tuple]) -> List[Optional[List[str]]]:
+        # requests: (driver, start, goal). Results come back in request order
+        futures = [self.submit(driver, start, goal) for driver, start, goal in requests]
+        return [future.result() for future in futures]
+
+    def roads(self, road_ids: List[str]) -> List: # Road objects of the simulation's network
+        return [self.network.roads[road_id] for road_id in road_ids]
+
+    def close(self):
+        self.pool.shutdown()
+        if self.shared is not None:
+            self.shared.close()
+
+    def __enter__(self) -> 'RoutingService':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
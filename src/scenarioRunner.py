@@ -0,0 +1,116 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from src.simulation import Simulation
+from src.dataCollection import DataCollector
+from src.routeDictionary import RouteDictionary
+
+"""
+Runs independent scenarios in a process pool.
+
+Each scenario is seeded from its own spec and gets its own route dictionary, so
+its output does not depend on which worker ran it or what ran there before.
+Builders, factories and hooks must be module-level functions so they can be pickled.
+"""
+
+
+class ScenarioSpec:
+
+    def __init__(self, name: str, network_builder: Callable, driver_factory: Callable,
+                 duration: float, seed: int, output_dir: str, time_step: float = 1.0,
+                 log_interval: int = 60, collector_options: Dict = None,
+                 run_function: Callable = None, finish: Callable = None,
+                 independent_streams: bool = False):
+
+        self.name = name
+        self.network_builder = network_builder  # () -> TrafficNetwork
+        self.driver_factory = driver_factory    # (network) -> List[Driver]
+        self.duration = duration
+        self.seed = seed
+        self.output_dir = output_dir
+        self.time_step = time_step
+        self.log_interval = log_interval
+        self.collector_options = collector_options or {}
+
+        # Optional (network, drivers, collector, spec) -> None replacing Simulation.run
+        self.run_function = run_function
+        # Optional (spec, network, drivers) -> None called after the run, e.g. to save plots
+        self.finish = finish
+        # Give every driver its own random stream derived from seed (see randomStreams)
+        self.independent_streams = independent_streams
+
+    def __repr__(self) -> str:
+        return f"ScenarioSpec({self.name}, seed={self.seed}, duration={self.duration})"
+
+
+def run_scenario(spec: ScenarioSpec) -> Dict:
+
+    started = time.perf_counter()
+
+    # Seed before building so random networks and personalities are reproducible,
+    # then again so the run itself does not depend on how many draws the factory made
+    random.seed(spec.seed)
+    network = spec.network_builder()
+    drivers = spec.driver_factory(network)
+    random.seed(spec.seed)
+
+    routes = RouteDictionary()
+    for driver in drivers:
+        driver.routes = routes
+
+    collector = DataCollector(output_dir=spec.output_dir, log_interval=spec.log_interval,
+                              route_dictionary=routes, **spec.collector_options)
+
+    if spec.run_function is not None:
+        spec.run_function(network, drivers, collector, spec)
+    else:
+        stream_seed = spec.seed if spec.independent_streams else None
+        Simulation(network, drivers, collector, seed=stream_seed).run(duration=spec.duration, time_step=spec.time_step)
+    collector.flush()
+
+    if spec.finish is not None:
+        spec.finish(spec, network, drivers)
+
+    return {
+        "name": spec.name,
+        "output_dir": spec.output_dir,
+        "trips_completed": sum(d.trip_count for d in drivers),
+        "wall_time": time.perf_counter() - started,
+    }
+
+
+def print_progress(done: int, total: int, result: Dict):
+    print(f"[{done}/{total}] {result['name']} finished in {result['wall_time']:.1f}s -> {result['output_dir']}")
+
+
+def run_scenarios(specs: List[ScenarioSpec], max_workers: Optional[int] = None,
+                  progress: Optional[Callable] = print_progress) -> List[Dict]:
+    # Results are returned in the order of specs whatever order they finish in
+
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Scenario names must be unique")
+
+    if max_workers is None:
+        max_workers = min(len(specs), os.cpu_count() or 1)
+
+    results: List[Optional[Dict]] = [None] * len(specs)
+
+    if max_workers <= 1:
+        for i, spec in enumerate(specs):
+            results[i] = run_scenario(spec)
+            if progress:
+                progress(i + 1, len(specs), results[i])
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run_scenario, spec): i for i, spec in enumerate(specs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            results[i] = future.result()
+            if progress:
+                progress(done, len(specs), results[i])
+
+    return results
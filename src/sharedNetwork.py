@@ -0,0 +1,320 @@
+import heapq
+import math
+from array import array
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+from src.network import Node, Road, TrafficNetwork
+from src.pathfinding import memory_edge_cost
+
+"""
+Static network topology in one multiprocessing.shared_memory block.
+
+The parent exports a TrafficNetwork once with SharedNetwork.export(). Workers get
+a small picklable NetworkHandle and attach() to it, which maps typed read-only
+views of the columns below without copying or unpickling anything:
+
+    nodes: id (utf-8 blob + offsets), x, y
+    roads: id (utf-8 blob + offsets), start / end node index, speed limit (km/h and m/s),
+           capacity, base_stress, distance
+    adjacency: CSR offsets per node into a list of outgoing road indices
+
+Workers that only plan routes (RoutingService in processes mode) search the views
+directly with ViewPathfinder, using node and road indices, so starting one is just
+an attach with no per-road work. Anything that needs Node and Road objects, such as
+a Simulation run by a scenario or sweep worker, calls the handle. The first call in
+a process builds a private TrafficNetwork from the views in one O(roads) pass; later
+calls return the same network with the traffic of the last task cleared and road
+attributes set back to the exported values, so a worker builds it once however many
+tasks it runs. to_network() always builds a new one.
+"""
+
+# Column name -> array typecode, in block order
+COLUMNS = [
+    ("node_x", "d"),
+    ("node_y", "d"),
+    ("node_id_offsets", "q"),
+    ("road_start", "q"),
+    ("road_end", "q"),
+    ("road_speed_limit_kmh", "d"),
+    ("road_speed_limit", "d"),
+    ("road_capacity", "q"),
+    ("road_base_stress", "d"),
+    ("road_distance", "d"),
+    ("road_id_offsets", "q"),
+    ("adjacency_offsets", "q"),
+    ("adjacency_roads", "q"),
+    ("node_id_blob", "B"),
+    ("road_id_blob", "B"),
+]
+
+
+def _encode_ids(ids: List[str]) -> Tuple[array, array]:
+    offsets = array("q", [0])
+    blob = bytearray()
+    for item in ids:
+        blob += item.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, array("B", blob)
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Older versions register the block again, which is harmless for workers
+        # started from the exporting process since they share its resource tracker
+        return shared_memory.SharedMemory(name=name)
+
+
+# Networks built by NetworkHandle calls in this process, by block name, with what is needed to reset them
+_built: Dict[str, Tuple[TrafficNetwork, Dict[str, Tuple], List[Tuple[Road, float, int, float]]]] = {}
+
+
+def _reset(network: TrafficNetwork, adjacency: Dict[str, Tuple], roads: List[Tuple[Road, float, int, float]]) -> bool:
+    # Clears traffic and restores the exported road attributes. False if roads were added,
+    # removed or replaced since, e.g. to close one, and the network has to be built again
+    if len(network.roads) != len(roads) or network.adjacency.keys() != adjacency.keys():
+        return False
+    for node_id, outgoing in adjacency.items():
+        if tuple(network.adjacency[node_id]) != outgoing:
+            return False
+
+    for road, speed_limit_kmh, capacity, base_stress in roads:
+        if network.roads.get(road.id) is not road:
+            return False
+        if road.speed_limit_kmh != speed_limit_kmh:
+            road.speed_limit_kmh = speed_limit_kmh
+        road.capacity = capacity
+        road.base_stress = base_stress
+        road.vehicles = []
+        road.current_speed = road.speed_limit
+    return True
+
+
+class NetworkHandle:
+    # Picklable description of an exported block, usable directly as a ScenarioSpec or
+    # PersonalitySweep network_builder. Calls in one process return the same network,
+    # reset for the next task (see the module docstring), so a caller must be done with it
+    # before calling again; use attach(handle).to_network() for networks used side by side
+
+    def __init__(self, name: str, layout: Dict[str, Tuple[str, int, int]], num_nodes: int, num_roads: int):
+        self.name = name
+        self.layout = layout  # column -> (typecode, byte offset, length)
+        self.num_nodes = num_nodes
+        self.num_roads = num_roads
+
+    def __call__(self) -> TrafficNetwork:
+        built = _built.get(self.name)
+        if built is not None and _reset(*built):
+            return built[0]
+
+        view = attach(self)
+        try:
+            network = view.to_network()
+        finally:
+            view.close()
+        adjacency = {node_id: tuple(outgoing) for node_id, outgoing in network.adjacency.items()}
+        roads = [(road, road.speed_limit_kmh, road.capacity, road.base_stress) for road in network.roads.values()]
+        _built[self.name] = (network, adjacency, roads)
+        return network
+
+    def __repr__(self) -> str:
+        return f"NetworkHandle({self.name}, nodes={self.num_nodes}, roads={self.num_roads})"
+
+
+class SharedNetworkView:
+
+    def __init__(self, handle: NetworkHandle, block: shared_memory.SharedMemory):
+        self.handle = handle
+        self.block = block
+        self.num_nodes = handle.num_nodes
+        self.num_roads = handle.num_roads
+
+        buffer = block.buf.toreadonly()
+        self._views = []
+        for column, (typecode, offset, length) in handle.layout.items():
+            itemsize = array(typecode).itemsize
+            view = buffer[offset:offset + length * itemsize].cast(typecode)
+            self._views.append(view)
+            setattr(self, column, view)
+        self._views.append(buffer)
+
+        self._node_index: Optional[Dict[str, int]] = None
+        self._road_index: Optional[Dict[str, int]] = None
+
+    def node_id(self, index: int) -> str:
+        return bytes(self.node_id_blob[self.node_id_offsets[index]:self.node_id_offsets[index + 1]]).decode("utf-8")
+
+    def road_id(self, index: int) -> str:
+        return bytes(self.road_id_blob[self.road_id_offsets[index]:self.road_id_offsets[index + 1]]).decode("utf-8")
+
+    def node_index(self, node_id: str) -> int: # Lookup table is built on first use
+        if self._node_index is None:
+            self._node_index = {self.node_id(i): i for i in range(self.num_nodes)}
+        return self._node_index[node_id]
+
+    def road_index(self, road_id: str) -> int:
+        if self._road_index is None:
+            self._road_index = {self.road_id(i): i for i in range(self.num_roads)}
+        return self._road_index[road_id]
+
+    def outgoing_roads(self, node: int) -> memoryview: # Road indices leaving node index
+        return self.adjacency_roads[self.adjacency_offsets[node]:self.adjacency_offsets[node + 1]]
+
+    def to_network(self) -> TrafficNetwork: # O(roads), every Node and Road is built in this process
+        network = TrafficNetwork()
+        nodes = []
+        for i in range(self.num_nodes):
+            node = Node(self.node_id(i), self.node_x[i], self.node_y[i])
+            network.add_node(node)
+            nodes.append(node)
+
+        for i in range(self.num_roads):
+            network.add_road(Road(self.road_id(i), nodes[self.road_start[i]], nodes[self.road_end[i]],
+                                  speed_limit_kmh=self.road_speed_limit_kmh[i],
+                                  capacity=self.road_capacity[i],
+                                  base_stress=self.road_base_stress[i]))
+        return network
+
+    def close(self):
+        # Views must be released before the mapping can be closed
+        for view in self._views:
+            view.release()
+        self._views = []
+        self.block.close()
+
+
+class ViewPathfinder:
+    # A* over a SharedNetworkView with the edge costs and heuristic of AdaptivePathfinder,
+    # so it plans the same routes. Nodes and roads are indices into the view's columns,
+    # and profile.memory is keyed by road index (see routingService.CostProfile)
+
+    def __init__(self, view: SharedNetworkView, max_speed: float):
+        self.view = view
+        self.max_speed = max_speed  # Of the whole network, as the inline pathfinders use
+        self.profile = None
+
+    def heuristic(self, node: int, goal: int) -> float:
+        view = self.view
+        distance = math.sqrt((view.node_x[node] - view.node_x[goal])**2 + (view.node_y[node] - view.node_y[goal])**2)
+        return distance / self.max_speed
+
+    def get_edge_cost(self, road: int) -> float:
+        view = self.view
+        profile = self.profile
+        if profile is None:
+            return view.road_distance[road] / view.road_speed_limit[road]
+
+        return memory_edge_cost(view.road_distance[road], view.road_speed_limit[road], profile.memory.get(road),
+                                profile.stress_tolerance, profile.familiarity_weight)
+
+    def find_path(self, start: int, goal: int) -> Optional[List[int]]: # Road indices, None if there is no path
+        view = self.view
+        if not (0 <= start < view.num_nodes and 0 <= goal < view.num_nodes):
+            return None
+        if start == goal:
+            return []
+
+        # Heap entries carry the node id so ties break as they do in AStar
+        open_set = [(0, view.node_id(start), start)]
+        came_from: Dict[int, Tuple[int, int]] = {}
+        g_score: Dict[int, float] = {start: 0}
+        open_set_hash = {start}
+
+        while open_set:
+            _, _, current = heapq.heappop(open_set)
+            if current not in open_set_hash:
+                continue
+            open_set_hash.remove(current)
+
+            if current == goal:
+                path = []
+                while current in came_from:
+                    current, road = came_from[current]
+                    path.append(road)
+                path.reverse()
+                return path
+
+            for road in view.outgoing_roads(current):
+                neighbor = view.road_end[road]
+                tentative_g = g_score[current] + self.get_edge_cost(road)
+                if neighbor not in g_score or tentative_g < g_score[neighbor]:
+                    came_from[neighbor] = (current, road)
+                    g_score[neighbor] = tentative_g
+                    f = tentative_g + self.heuristic(neighbor, goal)
+                    heapq.heappush(open_set, (f, view.node_id(neighbor), neighbor))
+                    open_set_hash.add(neighbor)
+
+        return None
+
+
+def attach(handle: NetworkHandle) -> SharedNetworkView:
+    return SharedNetworkView(handle, _attach_block(handle.name))
+
+
+class SharedNetwork:
+    # Owner of the exported block. Keep it alive while workers use the handle,
+    # then close() (or use it as a context manager) to free the memory.
+
+    def __init__(self, block: shared_memory.SharedMemory, handle: NetworkHandle):
+        self.block = block
+        self.handle = handle
+
+    @classmethod
+    def export(cls, network: TrafficNetwork) -> 'SharedNetwork':
+
+        node_ids = list(network.nodes)
+        node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        roads = list(network.roads.values())
+        road_index = {road.id: i for i, road in enumerate(roads)}
+
+        adjacency_offsets = array("q", [0])
+        adjacency_roads = array("q")
+        for node_id in node_ids:
+            adjacency_roads.extend(road_index[road.id] for road in network.adjacency.get(node_id, []))
+            adjacency_offsets.append(len(adjacency_roads))
+
+        node_id_offsets, node_id_blob = _encode_ids(node_ids)
+        road_id_offsets, road_id_blob = _encode_ids([road.id for road in roads])
+
+        columns = {
+            "node_x": array("d", (network.nodes[n].x for n in node_ids)),
+            "node_y": array("d", (network.nodes[n].y for n in node_ids)),
+            "node_id_offsets": node_id_offsets,
+            "road_start": array("q", (node_index[r.start.id] for r in roads)),
+            "road_end": array("q", (node_index[r.end.id] for r in roads)),
+            "road_speed_limit_kmh": array("d", (r.speed_limit_kmh for r in roads)),
+            "road_speed_limit": array("d", (r.speed_limit for r in roads)),
+            "road_capacity": array("q", (r.capacity for r in roads)),
+            "road_base_stress": array("d", (r.base_stress for r in roads)),
+            "road_distance": array("d", (r.distance for r in roads)),
+            "road_id_offsets": road_id_offsets,
+            "adjacency_offsets": adjacency_offsets,
+            "adjacency_roads": adjacency_roads,
+            "node_id_blob": node_id_blob,
+            "road_id_blob": road_id_blob,
+        }
+
+        layout = {}
+        size = 0
+        for column, typecode in COLUMNS:
+            data = columns[column]
+            layout[column] = (typecode, size, len(data))
+            size += -(-len(data) * data.itemsize // 8) * 8  # Keep every column 8-byte aligned
+
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for column, (typecode, offset, length) in layout.items():
+            data = columns[column].tobytes()
+            block.buf[offset:offset + len(data)] = data
+
+        return cls(block, NetworkHandle(block.name, layout, len(node_ids), len(roads)))
+
+    def close(self):
+        self.block.close()
+        self.block.unlink()
+
+    def __enter__(self) -> 'SharedNetwork':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
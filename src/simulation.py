@@ -1,109 +1,297 @@
+import contextlib
 import random
 from typing import List, Optional
 from src.network import TrafficNetwork
 from src.driver import Driver
 from src.dataCollection import DataCollector
+from src.randomStreams import stream
 
 class Simulation:
 
-    def __init__(self, network: TrafficNetwork, drivers: List[Driver], data_collector: DataCollector):
+    def __init__(self, network: TrafficNetwork, drivers: List[Driver], data_collector: DataCollector, seed: Optional[int] = None, routing_service = None, profiler = None, metrics = None, memory_report = None, population = None, synchronous: bool = False):
 
         self.network = network
         self.drivers = drivers
         self.data_collector = data_collector
         self.time = 0.0
+        self.trips_completed = 0
+        self.vehicle_updates = 0  # Moves of a vehicle on the road, counted by the default sequential updates
+
+        # Optional RoutingService planning the routes of trips starting each tick in worker processes
+        self.routing_service = routing_service
+        self.restarts = {}  # driver id -> (start, goal, future route, time left), see queue_restart
+
+        # Optional Profiler timing each phase of run(), see src/profiler.py
+        self.profiler = profiler
+
+        # Optional started LiveMetrics, given a snapshot of progress after each tick
+        self.metrics = metrics
+        if metrics is not None:
+            data_collector.route_dictionary.count_lookups()  # For route_dedup_ratio
+
+        # Optional MemoryReport sampling memory use per component, see src/memoryReport.py
+        self.memory_report = memory_report
+
+        # Optional PopulationStore: its drivers join self.drivers when they depart and leave
+        # again when their trip ends, see src/population.py
+        self.population = population
+        if population is not None:
+            self.drivers = list(drivers)  # Changes every tick, keep the caller's list as it was
+            population.routes = data_collector.route_dictionary
+
+        # Optional synchronous updates: every road change waits for a grant phase, as in
+        # PartitionedSimulation, which gives the same output. See src/partitionedSimulation.py
+        self.synchronous = synchronous
+        self._region = None
+        if synchronous and (population is not None or routing_service is not None):
+            raise ValueError("Synchronous updates do not support a population or a routing service")
+
+        # Drivers intern their routes in the collector's dictionary, so logged route ids resolve there
+        for driver in drivers:
+            driver.use_routes(data_collector.route_dictionary)
 
         self.node_ids = list(network.nodes.keys())
 
+        # With a master seed every driver draws destinations from its own stream,
+        # so results do not depend on the order drivers are updated in
+        if seed is not None:
+            for driver in drivers:
+                driver.seed_stream(seed)
+
     def run(self, duration: float, time_step: float = 1.0):
 
+        profiler = self.profiler
+        with profiler.instrumented() if profiler else contextlib.nullcontext():
+            self._run(duration, time_step, profiler)
+
+        print(f"Simulation complete. Time: {self.time}")
+        print(f"Total trips logged: check {self.data_collector.trips_file}")
+
+    def _run(self, duration: float, time_step: float, profiler):
+
         while self.time < duration:
 
-            for driver in self.drivers:
+            profiling = profiler is not None and profiler.enabled
+            if profiling:
+                profiler.begin_tick()
 
-                # If the driver doesnt have an active trip start one
-                if not driver.has_active_trip():
-                    start, goal = self.get_destination(driver)
-                    if start and goal:
-                        driver.start_trip(start, goal, self.network)
-
-                trip_finished = driver.update(time_step) # driver.update return true if trip is finished
-
-                if trip_finished:
-                    summary = driver.get_trip_summary()
-                    self.data_collector.log_trip(
-                        driver_id=summary["driver_id"],
-                        trip_number=summary["trip_number"],
-                        start_node=summary["start_node"],
-                        goal_node=summary["goal_node"],
-                        route_taken=summary["route_taken"],
-                        trip_time=summary["trip_time"],
-                        distance=summary["distance"],
-                        avg_speed=summary["avg_speed"],
-                        avg_stress=summary["avg_stress"]
-                    )
+            if self.synchronous:
+                self._synchronous_tick(time_step)
+            else:
+                self._sequential_tick(time_step)
 
             if self.data_collector.should_log_roads(self.time):
                 self.data_collector.log_roads(self.time, self.network.roads)
 
+            if profiling:
+                profiler.count("vehicles_blocked", self.count_blocked())
+                profiler.end_tick()
+
             self.time += time_step
 
-        print(f"Simulation complete. Time: {self.time}")
-        print(f"Total trips logged: check {self.data_collector.trips_file}")
+            if self.metrics is not None:
+                self.metrics.tick(self)
+            if self.memory_report is not None:
+                self.memory_report.tick(self)
+
+        self.data_collector.flush()
+
+        if self.metrics is not None:
+            self.metrics.publish(self)
+        if self.memory_report is not None:
+            self.memory_report.finish(self)
+
+    def _sequential_tick(self, time_step: float):
+
+        population = self.population
+        arrived = []
+        if population is not None:
+            self.drivers.extend(population.depart(self.time))
+
+        planned = self.plan_trips() if self.routing_service else {}
+        updates = 0
+
+        for driver in self.drivers:
+
+            remaining = time_step
+
+            while remaining > 0:
+
+                # If the driver doesnt have an active trip start one
+                if not driver.has_active_trip():
+                    if driver.id in planned:
+                        start, goal, route, carried = planned.pop(driver.id)
+                        driver.start_trip(start, goal, self.network, route=route)
+                        remaining += carried
+                    else:
+                        start, goal = self.get_destination(driver)
+                        if start and goal:
+                            driver.start_trip(start, goal, self.network)
+
+                trip_finished = driver.update(remaining) # driver.update return true if trip is finished
+
+                if not trip_finished:
+                    vehicle = driver.current_vehicle  # Updated if it is on a road, not waiting to start or done
+                    if vehicle is not None and not driver.waiting_to_start and vehicle.route_index < len(vehicle.route):
+                        updates += 1
+                    break
+                updates += 1
+
+                self.log_finished_trip(driver)
+
+                if population is not None and population.arrive(driver, self.time + time_step):
+                    arrived.append(driver)
+                    break
+
+                # A trip that ended mid-tick hands the rest of the tick to the next trip
+                if not driver.exact_transitions or driver.leftover_time >= remaining:
+                    break
+                if self.routing_service is not None:
+                    self.queue_restart(driver, driver.leftover_time)
+                    break
+                remaining = driver.leftover_time
+
+        self.vehicle_updates += updates
+
+        if arrived:
+            gone = set(map(id, arrived))
+            self.drivers = [driver for driver in self.drivers if id(driver) not in gone]
+
+    def _synchronous_tick(self, time_step: float):
+        # Imported here, partitionedSimulation imports this module
+        from src.partitionedSimulation import RegionEngine, synchronous_tick, log_trip_summary, _LocalRegion
+
+        if self._region is None:
+            engine = RegionEngine(self.network, dict.fromkeys(self.network.roads, 0), 0)
+            engine.adopt_drivers(self.drivers)
+            self._region = _LocalRegion(engine)
+
+        summaries, _ = synchronous_tick([self._region], self._region.engine.road_owner, time_step)
+        for summary in summaries:
+            self.trips_completed += 1
+            log_trip_summary(self.data_collector, summary)
+
+    def count_blocked(self) -> int: # Drivers waiting to enter a full road
+        blocked = 0
+        for driver in self.drivers:
+            if driver.current_vehicle is None:
+                continue
+            if driver.waiting_to_start or driver.current_vehicle.waiting:
+                blocked += 1
+        return blocked
                 
-    def get_destination(self, driver: Driver) -> tuple:
+    def log_finished_trip(self, driver: Driver):
 
-        if driver.fixed_route:
-            if driver.current_vehicle and driver.current_vehicle.route:
-                last_road = driver.current_vehicle.route[-1]
-                current_node = last_road.end.id
-            else:
-                current_node = driver.fixed_route[0]
+        self.trips_completed += 1
 
-            goal = driver.get_next_destination(current_node, self.node_ids)
-            
-            return current_node, goal
-        
-        else:
-            if len(self.node_ids) < 2:
-                return None, None
-            
-            if driver.current_vehicle and driver.current_vehicle.route:
-                last_road = driver.current_vehicle.route[-1]
-                start = last_road.end.id
-            else:
-                start = random.choice(self.node_ids)
+        if not self.data_collector.wants_trip(driver.id):
+            # Skip building the summary for drivers that are not sampled
+            self.data_collector.count_trip(driver.current_trip_data.total_time,
+                                           driver.current_trip_data.total_distance)
+            return
+
+        summary = driver.get_trip_summary()
+        self.data_collector.log_trip(
+            driver_id=summary["driver_id"],
+            trip_number=summary["trip_number"],
+            start_node=summary["start_node"],
+            goal_node=summary["goal_node"],
+            route_taken=driver.current_trip_data.roads_traveled if driver.routes is self.data_collector.route_dictionary
+                        else summary["route_taken"],
+            trip_time=summary["trip_time"],
+            distance=summary["distance"],
+            avg_speed=summary["avg_speed"],
+            avg_stress=summary["avg_stress"]
+        )
 
-            goal = random.choice(self.node_ids)
-            while goal == start:
-                goal = random.choice(self.node_ids)
+    def plan_trips(self) -> dict:
+        # Destinations for drivers idle at the start of the tick are drawn in driver order and
+        # their routes planned together; each trip still starts at the driver's turn in the tick.
+        # Trips queued by queue_restart last tick are collected too. Every trip of a run with a
+        # routing service is planned by the service, none inline
+        requests = []
+        for driver in self.drivers:
+            if not driver.has_active_trip() and driver.id not in self.restarts:
+                start, goal = self.get_destination(driver)
+                if start and goal:
+                    requests.append((driver, start, goal))
 
-            return start, goal
+        # No route: leave it to start_trip, which raises as it would inline
+        service = self.routing_service
+        planned = {}
+        for (driver, start, goal), road_ids in zip(requests, service.plan(requests)):
+            planned[driver.id] = (start, goal, None if road_ids is None else service.roads(road_ids), 0.0)
+        for driver_id, (start, goal, future, carried) in self.restarts.items():
+            road_ids = future.result()
+            planned[driver_id] = (start, goal, None if road_ids is None else service.roads(road_ids), carried)
+        self.restarts = {}
+        return planned
+
+    def queue_restart(self, driver: Driver, carried: float):
+        # With a routing service, a trip that ended mid-tick does not start the next one inline.
+        # Its route is submitted now and planned while the tick goes on, and the trip starts at
+        # the driver's turn next tick with the time left carried over. Free-flowing trips take
+        # the same time as inline, but the vehicle enters its first road a tick later
+        start, goal = self.get_destination(driver)
+        if start and goal:
+            self.restarts[driver.id] = (start, goal, self.routing_service.submit(driver, start, goal), carried)
+
+    def get_destination(self, driver: Driver) -> tuple:
+        return choose_destination(driver, self.node_ids)
         
     def create_drivers(network: TrafficNetwork, num_drivers: int, 
-                   random_personalities: bool = True) -> List[Driver]:
+                   random_personalities: bool = True, seed: Optional[int] = None) -> List[Driver]:
     
-        drivers = []
+        personalities = []
+
+        # Personalities come from a dedicated demand stream when seeded
+        rng = stream(seed, "demand") if seed is not None else random
         
         for i in range(num_drivers):
             
             if random_personalities:
-                stress_tolerance = random.uniform(0.1, 0.9)
-                familiarity_weight = random.uniform(0.1, 0.9)
-                learning_rate = random.uniform(0.1, 0.5)
+                stress_tolerance = rng.uniform(0.1, 0.9)
+                familiarity_weight = rng.uniform(0.1, 0.9)
+                learning_rate = rng.uniform(0.1, 0.5)
             else:
                 stress_tolerance = 0.5
                 familiarity_weight = 0.5
                 learning_rate = 0.3
             
-            driver = Driver(
-                driver_id=f"D{i}",
-                network=network,
+            personalities.append((f"D{i}", dict(
                 stress_tolerance=stress_tolerance,
                 familiarity_weight=familiarity_weight,
                 learning_rate=learning_rate
-            )
-            
-            drivers.append(driver)
+            )))
+        
+        return Driver.build_many(network, personalities, seed=seed)
+
+
+def choose_destination(driver: Driver, node_ids: List[str]) -> tuple:
+
+    if driver.fixed_route:
+        if driver.current_vehicle and driver.current_vehicle.route:
+            last_road = driver.current_vehicle.route[-1]
+            current_node = last_road.end.id
+        else:
+            current_node = driver.fixed_route[0]
+
+        goal = driver.get_next_destination(current_node, node_ids)
+        
+        return current_node, goal
+    
+    else:
+        if len(node_ids) < 2:
+            return None, None
         
-        return drivers
\ No newline at end of file
+        if driver.current_vehicle and driver.current_vehicle.route:
+            last_road = driver.current_vehicle.route[-1]
+            start = last_road.end.id
+        else:
+            start = driver.rng.choice(node_ids)
+
+        goal = driver.rng.choice(node_ids)
+        while goal == start:
+            goal = driver.rng.choice(node_ids)
+
+        return start, goal
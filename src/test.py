@@ -1,9 +1,37 @@
+import copy
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
 import unittest
+import urllib.request
 
 from src.network import Node, Road, TrafficNetwork
 from src.vehicle import Vehicle
-from src.pathfinding import AStar
+from src.pathfinding import AStar, RoutingContext
 from src.driver import Driver
+from src.dataCollection import DataCollector, iter_row_batches
+from src.resultsLoader import load_run, save_binary
+from src.routeDictionary import RouteDictionary, EMPTY_ROUTE
+from src.loggingPolicy import LoggingPolicy, arterials
+from src.scenarioRunner import ScenarioSpec, run_scenarios
+from src.parameterSweep import PersonalitySweep, grid, latin_hypercube
+from src.replication import replicate, t_critical
+from src.simulation import Simulation
+from src.partitionedSimulation import PartitionedSimulation, RegionEngine, _LocalRegion, _call, synchronous_tick
+from src.networkPartition import partition_network
+from src.sharedNetwork import SharedNetwork, ViewPathfinder, attach
+from src.workQueue import WorkCoordinator, start_local_workers, _write_outputs
+from src.routingService import RoutingService, CostProfile
+from src.networkGenerators import grid_network, random_geometric_network, radial_ring_network, braess_network
+from src.benchmark import run_benchmarks, compare
+from src.profiler import Profiler
+from src.liveMetrics import LiveMetrics
+from src.memoryReport import MemoryReport, SizeWalker
+from src.population import PopulationStore
+from src.randomStreams import stream
 
 class TestNetwork(unittest.TestCase):
     
@@ -112,6 +140,22 @@ class TestVehicle(unittest.TestCase):
         
         self.assertTrue(vehicle.has_reached_destination())
 
+    def test_exact_transitions_large_time_step(self):
+        #Test that leftover time carries across road ends within one tick.
+        road1 = Road("R1", Node("A", 0, 0), Node("B", 100, 0), 
+                     speed_limit_kmh=36, capacity=10)  # 10 m/s
+        road2 = Road("R2", Node("B", 100, 0), Node("C", 150, 0), 
+                     speed_limit_kmh=36, capacity=10)
+        vehicle = Vehicle("Car1", route=[road1, road2])
+        road1.add_vehicle(vehicle)
+        
+        # 150m at 10 m/s finishes 15s into a 20s step
+        elapsed = vehicle.update_position(time_step=20.0)
+        
+        self.assertTrue(vehicle.has_reached_destination())
+        self.assertAlmostEqual(elapsed, 15.0)
+        self.assertEqual(len(road2.vehicles), 0)
+
     def test_different_roads_converging(self):
         # Create network: RoadA → RoadC
         #                 RoadB → RoadC
@@ -173,6 +217,44 @@ class TestVehicle(unittest.TestCase):
         self.assertIn(car2, road_b.vehicles, "Car2 should still be on RoadB")
         self.assertIn(car3, road_a.vehicles, "Car3 should still be on RoadA")
 
+
+class TestTimeStep(unittest.TestCase):
+
+    def run_trips(self, network, drivers, duration, time_step):
+        with tempfile.TemporaryDirectory() as d:
+            collector = DataCollector(output_dir=d, route_dictionary=RouteDictionary())
+            Simulation(network, drivers, collector, seed=2).run(duration=duration, time_step=time_step)
+            with open(os.path.join(d, "routes.csv")) as f:
+                routes = {row["route_id"]: row["route_taken"] for row in csv.DictReader(f)}
+            with open(collector.trips_file) as f:
+                return [(row["driver_id"], row["trip_number"], routes[row["route_id"]], row["total_trip_time"])
+                        for row in csv.DictReader(f)]
+
+    def test_trip_times_independent_of_time_step(self):
+        # Free-flowing: roads never get over half full, so every road stays at its speed limit
+        trips = {}
+        for time_step in (1, 10):
+            network = grid_network(4, 4, seed=3)
+            for road in network.roads.values():
+                road.capacity = 100
+            drivers = [Driver(f"D{i}", network) for i in range(3)]
+            trips[time_step] = self.run_trips(network, drivers, 2000, time_step)
+
+        # Trips ending in the same tick are logged in driver order, so compare them per driver
+        self.assertGreater(len(trips[1]), 10)
+        self.assertEqual(sorted(trips[1]), sorted(trips[10]))
+
+    def test_next_trip_starts_in_the_tick_the_last_one_ended(self):
+        # A to D and back is 300 m at 50 km/h, 21.6 s, so trips end mid-tick at 21.6 and 43.2
+        network = _line_network()
+        driver = Driver("D0", network, fixed_route=["A", "D"])
+        trips = self.run_trips(network, [driver], 50, 10)
+
+        self.assertEqual([(trip[1], float(trip[3])) for trip in trips], [("1", 21.6), ("2", 21.6)])
+        self.assertEqual(driver.current_vehicle.start_node, "A")
+        self.assertAlmostEqual(driver.current_trip_data.total_time, 50 - 43.2)
+
+
 class TestPathfinding(unittest.TestCase):
 
     def setUp(self):
@@ -208,6 +290,60 @@ class TestPathfinding(unittest.TestCase):
         self.assertEqual(car1.route[0].start.id, "A")
         self.assertEqual(car1.route[-1].end.id, "C")
 
+    def test_shared_routing_context(self):
+        """Test that pathfinders on one network share a context, refreshed when roads are added."""
+        drivers = Simulation.create_drivers(self.network, 5, seed=1)
+        context = self.pathfinder.context
+        self.assertIs(RoutingContext.of(self.network), context)
+        self.assertTrue(all(d.pathfinder.context is context for d in drivers))
+        self.assertAlmostEqual(context.max_speed, 50 / 3.6)
+
+        self.network.add_road(Road("AC", self.node_a, self.node_c, speed_limit_kmh=100, capacity=10))
+        self.assertIs(RoutingContext.of(self.network), context)
+        self.assertAlmostEqual(drivers[0].pathfinder.max_speed, 100 / 3.6)
+        self.assertEqual(AStar(self.network, max_speed=30.0).max_speed, 30.0)
+
+    def test_speed_limit_change_refreshes_heuristic_bound(self):
+        # A to B direct at 150 km/h takes 4.8 s, through D at 400 km/h 1.8 s. With the bound
+        # of 100 km/h from before the change, D looks 6.1 s from done and the direct road wins
+        network = TrafficNetwork()
+        a, d, b = Node("A", 0, 0), Node("D", 40, 0), Node("B", 200, 0)
+        for node in (a, d, b):
+            network.add_node(node)
+        network.add_road(Road("AB", a, b, speed_limit_kmh=100, capacity=10))
+        network.add_road(Road("AD", a, d, speed_limit_kmh=50, capacity=10))
+        network.add_road(Road("DB", d, b, speed_limit_kmh=50, capacity=10))
+        pathfinder = AStar(network)
+        self.assertEqual([road.id for road in pathfinder.find_path("A", "B")], ["AB"])
+
+        network.roads["AB"].speed_limit_kmh = 150
+        network.roads["AD"].speed_limit_kmh = 400
+        network.roads["DB"].speed_limit_kmh = 400
+        self.assertEqual([road.id for road in pathfinder.find_path("A", "B")], ["AD", "DB"])
+        self.assertAlmostEqual(pathfinder.bound, 400 / 3.6)
+
+class TestSearchStats(unittest.TestCase):
+
+    def test_per_query_and_aggregate_stats(self):
+        network = _line_network()
+        pathfinder = AStar(network)
+        self.assertIsNone(pathfinder.stats)
+
+        stats = pathfinder.enable_stats(keep_worst=2)
+        pathfinder.find_path("A", "D")
+        self.assertEqual(stats.last["expanded"], 4)
+        self.assertGreaterEqual(stats.last["pushes"], stats.last["expanded"])
+        self.assertTrue(stats.last["found"])
+
+        pathfinder.find_path("B", "C")
+        pathfinder.find_path("A", "Z")  # Unknown node
+        report = stats.to_dict()
+        self.assertEqual(report["queries"], 3)
+        self.assertEqual(report["not_found"], 1)
+        self.assertEqual(sum(report["expanded_histogram"].values()), 3)
+        self.assertEqual([(q["start"], q["goal"]) for q in stats.worst_queries()], [("A", "D"), ("B", "C")])
+
+
 class TestDriverMemory(unittest.TestCase):
 
     def setUp(self):
@@ -274,6 +410,923 @@ class TestDriverMemory(unittest.TestCase):
         # Should avoid the short path and take the longer path due to bad memory
         self.assertEqual(path_ids, ["AD", "DC"])
 
+    def test_trip_record_and_slots(self):
+        """Test that trip data keeps per-road sums, still reads by key, and core objects have no __dict__."""
+        self.driver.start_trip("A", "C", self.network)
+        for _ in range(30):
+            if self.driver.update(1.0):
+                break
+
+        trip = self.driver.current_trip_data
+        self.assertEqual(trip["goal_node"], "C")
+        self.assertEqual(trip["total_distance"], trip.total_distance)
+        self.assertAlmostEqual(trip.total_distance, 200.0)
+        self.assertEqual(sum(entry[2] for entry in trip.observations.values()), trip.observation_count)
+        self.assertAlmostEqual(self.driver.get_trip_summary()["avg_speed"], 50.0)
+        self.assertAlmostEqual(self.driver.memory["AB"]["avg_speed"], 50.0)
+        with self.assertRaises(KeyError):
+            trip["speed_observations"]
+
+        for obj in (self.driver, trip, self.driver.current_vehicle, self.road_ab, self.node_a):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def test_vehicle_and_trip_record_reused(self):
+        """Test that a finished vehicle and the trip record are reset in place for the next trip."""
+        self.driver.start_trip("A", "C", self.network)
+        vehicle, trip = self.driver.current_vehicle, self.driver.current_trip_data
+        self.assertIsNone(vehicle._id)
+        self.assertEqual(vehicle.id, "TestDriver_trip_1")
+
+        while not self.driver.update(1.0):
+            pass
+        self.driver.start_trip("A", "C", self.network)
+
+        self.assertIs(self.driver.current_vehicle, vehicle)
+        self.assertIs(self.driver.current_trip_data, trip)
+        self.assertEqual(vehicle.id, "TestDriver_trip_2")
+        self.assertEqual((vehicle.route_index, vehicle.position, vehicle.goal_node), (0, 0.0, "C"))
+        self.assertEqual((trip.total_time, trip.observation_count, trip.observations), (0.0, 0, {}))
+        self.assertEqual(self.road_ab.vehicles, [vehicle])
+        self.assertEqual(self.road_bc.vehicles, [])
+
+        # A vehicle still on the road is never reused
+        self.driver.start_trip("A", "C", self.network)
+        self.assertIsNot(self.driver.current_vehicle, vehicle)
+
+
+class TestRouteDictionary(unittest.TestCase):
+
+    def test_same_route_same_id(self):
+        routes = RouteDictionary()
+        first = routes.intern(["AB", "BC"])
+        extended = routes.extend(routes.extend(EMPTY_ROUTE, "AB"), "BC")
+
+        self.assertEqual(first, extended)
+        self.assertNotEqual(first, routes.intern(["AB"]))
+        self.assertEqual(routes.roads(first), ("AB", "BC"))
+        self.assertEqual(routes.to_string(first), "AB->BC")
+
+    def test_dedup_ratio_counts_only_when_enabled(self):
+        routes = RouteDictionary()
+        routes.intern(["AB", "BC"])
+        self.assertEqual(routes.lookups, 0)
+
+        routes.count_lookups()
+        routes.intern(["AB", "BC"])
+        routes.intern(["AB", "BD"])
+        self.assertEqual(routes.lookups, 4)
+        self.assertEqual(routes.dedup_ratio(), 0.75)  # Only BD was new
+
+    def test_driver_records_interned_route(self):
+        network = TrafficNetwork()
+        for node in [Node("A", 0, 0), Node("B", 100, 0), Node("C", 200, 0)]:
+            network.add_node(node)
+        network.add_road(Road("AB", network.nodes["A"], network.nodes["B"], speed_limit_kmh=50, capacity=10))
+        network.add_road(Road("BC", network.nodes["B"], network.nodes["C"], speed_limit_kmh=50, capacity=10))
+
+        driver = Driver("D0", network)
+        driver.start_trip("A", "C", network)
+        while not driver.update(1.0):
+            pass
+
+        route_id = driver.current_trip_data.roads_traveled
+        self.assertIsInstance(route_id, int)
+        self.assertEqual(driver.routes.roads(route_id), ("AB", "BC"))
+        self.assertEqual(driver.get_trip_summary()["route_taken"], ("AB", "BC"))
+        self.assertAlmostEqual(driver.current_trip_data["total_distance"], 200.0)
+
+    def test_simulation_hands_collector_dictionary_to_drivers(self):
+        network = grid_network(4, 4)
+        drivers = Simulation.create_drivers(network, 10)
+        with tempfile.TemporaryDirectory() as d:
+            collector = DataCollector(output_dir=d, route_dictionary=RouteDictionary())
+            Simulation(network, drivers, collector).run(duration=600)
+
+            self.assertTrue(all(driver.routes is collector.route_dictionary for driver in drivers))
+            with open(os.path.join(d, "routes.csv")) as f:
+                routes = {int(row["route_id"]): row["route_taken"] for row in csv.DictReader(f)}
+            with open(os.path.join(d, "trips.csv")) as f:
+                trips = list(csv.DictReader(f))
+
+        self.assertTrue(trips)
+        for trip in trips:
+            self.assertIn(int(trip["route_id"]), routes)
+
+
+class TestResultsLoader(unittest.TestCase):
+
+    def setUp(self):
+        """Write a small results directory with a repeated route."""
+        self.tmp = tempfile.TemporaryDirectory()
+        collector = DataCollector(output_dir=self.tmp.name)
+        collector.log_trip("D0", 1, "A", "C", ["AB", "BC"], 10.0, 200.0, 50.0, 0.1)
+        collector.log_trip("D0", 2, "A", "C", ["AB", "BC"], 12.0, 200.0, 40.0, 0.2)
+        collector.log_trip("D1", 1, "A", "B", ["AB"], 5.0, 100.0, 50.0, 0.0)
+
+        road = Road("AB", Node("A", 0, 0), Node("B", 100, 0), speed_limit_kmh=50, capacity=10)
+        collector.log_roads(0, {"AB": road})
+        road.vehicles = [1, 2]
+        collector.log_roads(60, {"AB": road})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_routes_are_interned(self):
+        results = load_run(self.tmp.name)
+
+        self.assertEqual(len(results.trips), 3)
+        self.assertEqual(len(results.unique_routes()), 2)
+        self.assertEqual(results.road_usage(), {"AB": 3, "BC": 2})
+
+    def test_group_by_helpers(self):
+        results = load_run(self.tmp.name)
+
+        self.assertAlmostEqual(results.per_driver()["D0"]["total_trip_time"], 11.0)
+        self.assertEqual(results.per_trip_number()[1]["count"], 2)
+        self.assertAlmostEqual(results.per_road()["AB"]["density"], 0.1)
+
+    def test_binary_round_trip(self):
+        results = load_run(self.tmp.name, fmt="csv")
+        save_binary(results, self.tmp.name)
+        loaded = load_run(self.tmp.name)
+
+        self.assertEqual(list(loaded.trips["driver_id"]), ["D0", "D0", "D1"])
+        self.assertEqual(loaded.road_usage(), results.road_usage())
+        self.assertEqual(loaded.per_road(), results.per_road())
+
+
+class TestCompressedOutput(unittest.TestCase):
+
+    def test_compressed_round_trip(self):
+        road = Road("AB", Node("A", 0, 0), Node("B", 100, 0), speed_limit_kmh=50, capacity=10)
+
+        for compression, extension in [("gzip", ".gz"), ("lzma", ".xz")]:
+            with tempfile.TemporaryDirectory() as tmp:
+                # Tiny block size so the file is written as several blocks
+                collector = DataCollector(output_dir=tmp, compression=compression, block_size=64)
+                for t in range(20):
+                    collector.log_roads(t, {"AB": road})
+                collector.log_trip("D0", 1, "A", "B", ["AB"], 5.0, 100.0, 50.0, 0.0)
+                collector.flush()
+
+                self.assertTrue(collector.roads_file.endswith(extension))
+                batches = list(iter_row_batches(collector.roads_file, batch_size=8))
+                self.assertEqual([len(b) for b in batches], [8, 8, 4])
+                self.assertEqual(batches[0][0]["road_id"], "AB")
+
+                results = load_run(tmp)
+                self.assertEqual(len(results.roads), 20)
+                self.assertEqual(results.road_usage(), {"AB": 1})
+
+
+class TestLoggingPolicy(unittest.TestCase):
+
+    def test_driver_sampling_is_deterministic(self):
+        ids = [f"D{i}" for i in range(1000)]
+        first = [d for d in ids if LoggingPolicy(driver_sample_rate=0.1).samples_driver(d)]
+        second = [d for d in ids if LoggingPolicy(driver_sample_rate=0.1).samples_driver(d)]
+
+        self.assertEqual(first, second)
+        self.assertTrue(50 < len(first) < 150)
+
+    def test_tiered_logging(self):
+        fast = Road("AB", Node("A", 0, 0), Node("B", 100, 0), speed_limit_kmh=80, capacity=10)
+        slow = Road("BC", Node("B", 100, 0), Node("C", 200, 0), speed_limit_kmh=30, capacity=10)
+        slow.vehicles = [1, 2]
+        policy = LoggingPolicy(driver_sample_rate=0.0, road_filter=arterials(60), tiered=True)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            collector = DataCollector(output_dir=tmp, policy=policy)
+            collector.log_trip("D0", 1, "A", "C", ["AB", "BC"], 10.0, 200.0, 50.0, 0.1)
+            collector.log_roads(0, {"AB": fast, "BC": slow})
+            collector.flush()
+
+            results = load_run(tmp)
+            self.assertEqual(len(results.trips), 0)
+            self.assertEqual(list(results.roads["road_id"]), ["AB"])
+            self.assertEqual(collector.aggregates.trips, 1)
+            self.assertEqual(collector.aggregates.vehicle_count, 2)
+
+
+def _line_network():
+    network = TrafficNetwork()
+    nodes = [Node(n, i * 100, 0) for i, n in enumerate("ABCD")]
+    for node in nodes:
+        network.add_node(node)
+    for a, b in zip(nodes, nodes[1:]):
+        network.add_road(Road(f"{a.id}{b.id}", a, b, speed_limit_kmh=50, capacity=3))
+        network.add_road(Road(f"{b.id}{a.id}", b, a, speed_limit_kmh=50, capacity=3))
+    return network
+
+
+def _four_drivers(network):
+    return [Driver(f"D{i}", network) for i in range(4)]
+
+
+class TestScenarioRunner(unittest.TestCase):
+
+    def test_results_independent_of_worker_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = {}
+            for workers in (1, 2):
+                specs = [ScenarioSpec(f"S{seed}", _line_network, _four_drivers, 200, seed,
+                                      os.path.join(tmp, f"w{workers}", f"S{seed}"))
+                         for seed in (1, 2, 3)]
+                results = run_scenarios(specs, max_workers=workers, progress=None)
+                self.assertEqual([r["name"] for r in results], ["S1", "S2", "S3"])
+
+                outputs[workers] = []
+                for spec in specs:
+                    for name in ("trips.csv", "routes.csv"):
+                        with open(os.path.join(spec.output_dir, name)) as f:
+                            outputs[workers].append(f.read())
+
+            self.assertEqual(outputs[1], outputs[2])
+
+
+class TestParameterSweep(unittest.TestCase):
+
+    def test_grid_and_latin_hypercube(self):
+        points = grid({"stress_tolerance": [0.1, 0.9], "learning_rate": [0.1, 0.3, 0.5]})
+        self.assertEqual(len(points), 6)
+
+        samples = latin_hypercube({"familiarity_weight": (0.0, 1.0)}, samples=10, seed=1)
+        strata = sorted(int(p["familiarity_weight"] * 10) for p in samples)
+        self.assertEqual(strata, list(range(10)))
+
+    def test_sweep_skips_completed_points(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            results_file = os.path.join(tmp, "sweep.csv")
+            sweep = PersonalitySweep(_line_network, results_file, num_drivers=2, duration=100)
+            points = grid({"stress_tolerance": [0.1, 0.9]})
+
+            self.assertEqual(sweep.run(points, max_workers=1), 2)
+            self.assertEqual(sweep.run(points + [{"stress_tolerance": 0.5}], max_workers=1), 1)
+
+            with open(results_file) as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(len(rows), 3)
+            self.assertTrue(all(int(r["trips"]) > 0 for r in rows))
+            self.assertEqual({(r["seed"], r["num_drivers"], r["duration"]) for r in rows}, {("42", "2", "100.0")})
+
+    def test_sweep_refuses_other_configuration(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            results_file = os.path.join(tmp, "sweep.csv")
+            points = grid({"stress_tolerance": [0.1, 0.9]})
+            PersonalitySweep(_line_network, results_file, num_drivers=2, duration=100).run(points, max_workers=1)
+
+            for sweep in (PersonalitySweep(_line_network, results_file, num_drivers=3, duration=100),
+                          PersonalitySweep(_line_network, results_file, num_drivers=2, duration=100, seed=1),
+                          PersonalitySweep(lambda: grid_network(3, 3), results_file, num_drivers=2, duration=100)):
+                with self.assertRaises(ValueError):
+                    sweep.run(points, max_workers=1)
+
+            # The same configuration, with the duration given as a float, resumes
+            same = PersonalitySweep(_line_network, results_file, num_drivers=2, duration=100.0)
+            self.assertEqual(same.run(points, max_workers=1), 0)
+
+
+class TestReplication(unittest.TestCase):
+
+    def test_t_critical(self):
+        self.assertAlmostEqual(t_critical(0.95, 1), 12.706, places=2)
+        self.assertAlmostEqual(t_critical(0.95, 2), 4.303, places=2)
+        self.assertAlmostEqual(t_critical(0.95, 10), 2.228, places=2)
+
+        # Table values, to their printed precision, where an expansion in 1/df is least accurate
+        for confidence, df, expected in ((0.95, 3, 3.182), (0.99, 3, 5.841), (0.99, 5, 4.032),
+                                         (0.90, 30, 1.697), (0.99, 30, 2.750), (0.95, 1000, 1.962)):
+            self.assertAlmostEqual(t_critical(confidence, df), expected, places=3)
+
+    def test_replication_independent_of_worker_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            def make_specs(workers):
+                return lambda index, seed: [ScenarioSpec("S", _line_network, _four_drivers, 200, seed,
+                                                         os.path.join(tmp, f"w{workers}", f"rep{index}"))]
+
+            reports = [replicate(make_specs(w), min_replications=3, max_replications=6,
+                                 precision=0.5, target="average_trip_time", max_workers=w)
+                       for w in (1, 2)]
+
+            self.assertEqual(reports[0].samples, reports[1].samples)
+            self.assertGreaterEqual(reports[0].replications, 3)
+            mean, half = reports[0].interval("average_trip_time")
+            self.assertGreater(mean, 0)
+
+
+class TestRandomStreams(unittest.TestCase):
+
+    def test_destinations_independent_of_driver_order(self):
+        network = _line_network()
+
+        def destinations(order):
+            drivers = {d.id: d for d in _four_drivers(network)}
+            with tempfile.TemporaryDirectory() as tmp:
+                sim = Simulation(network, [drivers[i] for i in order], DataCollector(output_dir=tmp), seed=7)
+            picks = {i: [] for i in order}
+            for _ in range(5):
+                for i in order:
+                    picks[i].append(sim.get_destination(drivers[i]))
+            return picks
+
+        self.assertEqual(destinations(["D0", "D1", "D2", "D3"]), destinations(["D3", "D1", "D0", "D2"]))
+
+    def test_seeded_personalities_are_reproducible(self):
+        network = _line_network()
+        first = Simulation.create_drivers(network, 5, seed=3)
+        second = Simulation.create_drivers(network, 5, seed=3)
+
+        self.assertEqual([d.stress_tolerance for d in first], [d.stress_tolerance for d in second])
+        self.assertNotEqual(first[0].rng.random(), first[1].rng.random())
+
+
+class TestPartitionedSimulation(unittest.TestCase):
+
+    def grid(self, capacity=2):
+        network = TrafficNetwork()
+        for x in range(3):
+            for y in range(3):
+                network.add_node(Node(f"N{x}{y}", x * 100, y * 100))
+        for a in network.nodes.values():
+            for b in network.nodes.values():
+                if abs(a.x - b.x) + abs(a.y - b.y) == 100:
+                    network.add_road(Road(f"{a.id}{b.id}", a, b, speed_limit_kmh=50, capacity=capacity))
+        return network
+
+    def test_output_independent_of_region_count(self):
+        grid_network = self.grid
+
+        def read_outputs(collector):
+            outputs = []
+            for name in ("trips.csv", "road_snapshots.csv"):
+                with open(os.path.join(collector.output_dir, name)) as f:
+                    outputs.append(f.read())
+            return outputs
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Large time steps with exact transitions carry the time left at each road end
+            for time_step in (1.0, 25.0):
+                network = grid_network()
+                drivers = [Driver(f"D{i}", network) for i in range(12)]
+                collector = DataCollector(output_dir=os.path.join(tmp, f"single_{time_step}"), log_interval=50,
+                                          route_dictionary=RouteDictionary())
+                Simulation(network, drivers, collector, seed=5, synchronous=True).run(duration=300, time_step=time_step)
+                expected = read_outputs(collector)
+                self.assertGreater(expected[0].count("\n"), 10)
+
+                # 256 bytes of shared memory is too small for most handoffs, which then go through the pipes
+                for regions, handoff_bytes in ((1, 0), (2, 1 << 20), (3, 1 << 20), (3, 256)):
+                    network = grid_network()
+                    drivers = [Driver(f"D{i}", network) for i in range(12)]
+                    collector = DataCollector(output_dir=os.path.join(tmp, f"{regions}_{handoff_bytes}_{time_step}"),
+                                              log_interval=50, route_dictionary=RouteDictionary())
+                    PartitionedSimulation(network, drivers, collector, num_regions=regions, seed=5,
+                                          handoff_bytes=handoff_bytes).run(duration=300, time_step=time_step)
+
+                    self.assertEqual(read_outputs(collector), expected)
+                    self.assertTrue(all(not road.vehicles for road in network.roads.values()))
+
+    def test_matches_default_engine_in_free_flow(self):
+        # Roads never fill up and each takes longer than a tick, so moving drivers one after
+        # another, as the default engine does, gives the same trips as the synchronous phases
+        trips = []
+        for regions in (None, 2):
+            network = self.grid(capacity=100)
+            drivers = [Driver(f"D{i}", network) for i in range(12)]
+            with tempfile.TemporaryDirectory() as d:
+                collector = DataCollector(output_dir=d, route_dictionary=RouteDictionary())
+                if regions is None:
+                    Simulation(network, drivers, collector, seed=5).run(duration=300)
+                else:
+                    PartitionedSimulation(network, drivers, collector, num_regions=regions, seed=5).run(duration=300)
+                with open(os.path.join(d, "routes.csv")) as f:
+                    routes = {row["route_id"]: row["route_taken"] for row in csv.DictReader(f)}
+                with open(collector.trips_file) as f:
+                    trips.append([(row["driver_id"], row["trip_number"], routes[row["route_id"]],
+                                   row["total_trip_time"], row["average_speed"]) for row in csv.DictReader(f)])
+
+        self.assertGreater(len(trips[0]), 100)
+        self.assertEqual(trips[0], trips[1])
+
+    def test_returning_driver_updated_in_place(self):
+        network = _line_network()
+        owner = {road_id: 0 if road_id in ("AB", "BA") else 1 for road_id in network.roads}
+        regions = [_LocalRegion(RegionEngine(copy.deepcopy(network), owner, region_id)) for region_id in (0, 1)]
+        driver = Driver("D0", network, fixed_route=["A", "D"])
+        _call(regions, [("add", [(0, driver.to_state())]), ("add", [])])
+
+        # Trip 1 goes from A into region 1 and ends at D there, trip 2 comes back to A and
+        # trip 3 starts on AB, about 43 s in
+        kept = None
+        for _ in range(45):
+            synchronous_tick(regions, owner, 1.0)
+            if 0 in regions[0].engine.away:
+                kept = kept or regions[0].engine.away[0]
+        self.assertIs(regions[0].engine.drivers[0], kept)
+        self.assertEqual(kept.trip_count, 3)
+        self.assertEqual(kept.memory["CD"]["usage"], 1)  # Learned in region 1 and sent back
+
+    def test_trip_time_carries_time_left_at_road_ends(self):
+        network = _line_network()
+        driver = Driver("D0", network, fixed_route=["A", "C"])
+        with tempfile.TemporaryDirectory() as d:
+            collector = DataCollector(output_dir=d, route_dictionary=RouteDictionary())
+            Simulation(network, [driver], collector, synchronous=True).run(duration=100, time_step=5)
+            with open(os.path.join(d, "trips.csv")) as f:
+                trips = list(csv.DictReader(f))
+
+        # 200 m at 50 km/h is 14.4 s, not rounded up to whole ticks, and the next trip
+        # starts with the rest of the tick it ended in
+        self.assertAlmostEqual(float(trips[0]["total_trip_time"]), 14.4)
+        self.assertEqual(trips[1]["start_node"], "C")
+
+
+class TestNetworkPartition(unittest.TestCase):
+
+    def setUp(self):
+        # 6 x 4 grid of two-way streets
+        self.network = TrafficNetwork()
+        for x in range(6):
+            for y in range(4):
+                self.network.add_node(Node(f"N{x}{y}", x * 100, y * 100))
+        for a in self.network.nodes.values():
+            for b in self.network.nodes.values():
+                if abs(a.x - b.x) + abs(a.y - b.y) == 100:
+                    self.network.add_road(Road(f"{a.id}{b.id}", a, b, speed_limit_kmh=50, capacity=5))
+
+    def test_balanced_regions_with_small_cut(self):
+        partition = partition_network(self.network, 2)
+        self.assertEqual(partition.sizes(), [12, 12])
+        self.assertEqual(partition.cut_size(), 8)  # Cut across the long side: 4 streets, both ways
+
+        partition = partition_network(self.network, 3)
+        self.assertEqual(sorted(partition.sizes()), [8, 8, 8])
+
+    def test_subgraphs_and_boundary_roads(self):
+        partition = partition_network(self.network, 2)
+        boundary = partition.boundary_roads(0)
+        self.assertEqual(len(boundary), partition.cut_size())
+
+        inner = partition.subgraph(0, include_boundary=False)
+        halo = partition.subgraph(0)
+        self.assertEqual(len(inner.nodes), 12)
+        self.assertTrue(all(partition.road_region(r) == 0 and not partition.is_boundary(r) for r in inner.roads.values()))
+        self.assertEqual(len(halo.roads) - len(inner.roads), len(boundary) // 2)
+        self.assertEqual(len(halo.nodes), 16)
+
+
+class TestSharedNetwork(unittest.TestCase):
+
+    def test_views_match_network(self):
+        network = _line_network()
+        with SharedNetwork.export(network) as shared:
+            view = attach(shared.handle)
+            self.assertEqual(view.num_roads, len(network.roads))
+            index = view.road_index("BC")
+            self.assertEqual(view.road_id(index), "BC")
+            self.assertEqual(view.node_id(view.road_start[index]), "B")
+            self.assertAlmostEqual(view.road_distance[index], 100.0)
+            self.assertEqual(sorted(view.road_id(r) for r in view.outgoing_roads(view.node_index("B"))), ["BA", "BC"])
+            with self.assertRaises(TypeError):
+                view.road_capacity[index] = 10  # Static data is read-only
+            view.close()
+
+    def test_view_pathfinder_matches_adaptive_pathfinder(self):
+        network = grid_network(6, 6, seed=4)
+        driver = Driver("D0", network, stress_tolerance=0.7, familiarity_weight=0.6)
+        for i, road_id in enumerate(sorted(network.roads)[::3]):
+            driver.memory[road_id] = {"usage": i % 4, "avg_speed": 20.0 + i % 30, "avg_stress": (i % 7) / 7}
+        node_ids = list(network.nodes)
+        road_ids = list(network.roads)
+
+        with SharedNetwork.export(network) as shared:
+            view = attach(shared.handle)
+            pathfinder = ViewPathfinder(view, RoutingContext.of(network).max_speed)
+            pathfinder.profile = CostProfile.indexed(driver, {road_id: i for i, road_id in enumerate(road_ids)})
+            for start in node_ids[::5]:
+                for goal in node_ids[::7]:
+                    expected = [road.id for road in driver.pathfinder.find_path(start, goal)]
+                    route = pathfinder.find_path(node_ids.index(start), node_ids.index(goal))
+                    self.assertEqual([road_ids[road] for road in route], expected)
+            view.close()
+
+    def test_workers_build_network_from_handle(self):
+        with tempfile.TemporaryDirectory() as tmp, SharedNetwork.export(_line_network()) as shared:
+            outputs = []
+            # With one worker both scenarios run in this process on the same network
+            for builder, workers in ((_line_network, 1), (shared.handle, 2), (shared.handle, 1)):
+                specs = [ScenarioSpec(f"S{seed}", builder, _four_drivers, 200, seed,
+                                      os.path.join(tmp, f"w{workers}", f"S{seed}"))
+                         for seed in (1, 2)]
+                run_scenarios(specs, max_workers=workers, progress=None)
+                for spec in specs:
+                    with open(os.path.join(spec.output_dir, "trips.csv")) as f:
+                        outputs.append(f.read())
+
+            self.assertEqual(outputs[:2], outputs[2:4])
+            self.assertEqual(outputs[:2], outputs[4:])
+
+    def test_handle_resets_network_between_tasks(self):
+        with SharedNetwork.export(_line_network()) as shared:
+            network = shared.handle()
+            road = network.roads["AB"]
+            road.add_vehicle(Vehicle("V", route=[road]))
+            road.speed_limit_kmh = 20
+            self.assertIs(shared.handle(), network)
+            self.assertEqual((road.occupancy, road.vehicles, road.speed_limit_kmh), (0, [], 50))
+            self.assertAlmostEqual(road.current_speed, 50 / 3.6)
+
+            # Closing a road changes the topology, so the next call builds a new network
+            del network.roads["AB"]
+            network.adjacency["A"] = []
+            rebuilt = shared.handle()
+            self.assertIsNot(rebuilt, network)
+            self.assertIn("AB", rebuilt.roads)
+
+
+def _die_once(network, drivers, collector, spec):
+    # Kills the worker the first time it runs, as if the host went down
+    if not os.path.exists(spec.marker):
+        open(spec.marker, 'w').close()
+        os._exit(1)
+    Simulation(network, drivers, collector).run(duration=spec.duration)
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def test_local_workers_with_retry(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            def make_specs(folder):
+                specs = [ScenarioSpec(f"S{seed}", _line_network, _four_drivers, 200, seed,
+                                      os.path.join(tmp, folder, f"S{seed}"))
+                         for seed in (1, 2, 3, 4)]
+                specs[1].run_function = _die_once
+                specs[1].marker = os.path.join(tmp, f"{folder}.died")
+                return specs
+
+            coordinator = WorkCoordinator(make_specs("unused"), os.path.join(tmp, "queue"))
+            workers = start_local_workers(coordinator.address, 3, coordinator.authkey)
+            results = coordinator.serve(progress=None)
+            for worker in workers:
+                worker.join(timeout=10)
+
+            self.assertEqual([r["name"] for r in results], ["S1", "S2", "S3", "S4"])
+            self.assertEqual(results[1]["attempts"], 2)
+            self.assertNotIn("error", results[1])
+
+            # Same output as running the scenarios directly
+            local = make_specs("local")
+            open(local[1].marker, 'w').close()
+            run_scenarios(local, max_workers=1, progress=None)
+            for spec, result in zip(local, results):
+                for name in ("trips.csv", "routes.csv"):
+                    with open(os.path.join(spec.output_dir, name)) as f, \
+                         open(os.path.join(result["output_dir"], name)) as g:
+                        self.assertEqual(f.read(), g.read())
+
+    def test_authkey_required_off_loopback(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                WorkCoordinator([], tmp, address=("0.0.0.0", 0))
+
+            first, second = WorkCoordinator([], tmp), WorkCoordinator([], tmp)
+            self.assertNotEqual(first.authkey, second.authkey)
+            first.listener.close()
+            second.listener.close()
+
+    def test_outputs_stay_in_results_dir(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            results = os.path.join(tmp, "results")
+            for path in ("../escaped.csv", "a/../../escaped.csv", os.path.join(tmp, "escaped.csv"), "."):
+                with self.assertRaises(ValueError):
+                    _write_outputs(results, {"trips.csv": b"ok", path: b"bad"})
+            self.assertFalse(os.path.exists(os.path.join(tmp, "escaped.csv")))
+            self.assertFalse(os.path.exists(results))
+
+            _write_outputs(results, {"a/../trips.csv": b"ok"})
+            with open(os.path.join(results, "trips.csv"), 'rb') as f:
+                self.assertEqual(f.read(), b"ok")
+
+
+class TestRoutingService(unittest.TestCase):
+
+    def test_same_trips_as_inline_planning(self):
+        # Free-flowing, so trips restarted a tick later through the service take the same time
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = []
+            for mode in (None, "processes", "threads"):
+                network = grid_network(5, 5, seed=2)
+                for road in network.roads.values():
+                    road.capacity = 100
+                drivers = [Driver(f"D{i}", network, familiarity_weight=0.9) for i in range(6)]
+                collector = DataCollector(output_dir=os.path.join(tmp, str(mode)))
+                if mode:
+                    with RoutingService(network, max_workers=2, max_pending=2, mode=mode) as service:
+                        Simulation(network, drivers, collector, seed=3, routing_service=service).run(duration=1500)
+                else:
+                    Simulation(network, drivers, collector, seed=3).run(duration=1500)
+
+                with open(os.path.join(collector.output_dir, "routes.csv")) as f:
+                    routes = {row["route_id"]: row["route_taken"] for row in csv.DictReader(f)}
+                with open(os.path.join(collector.output_dir, "trips.csv")) as f:
+                    outputs.append(sorted((row["driver_id"], int(row["trip_number"]), routes[row["route_id"]],
+                                           row["total_trip_time"], row["total_distance"])
+                                          for row in csv.DictReader(f)))
+
+            self.assertGreater(len(outputs[0]), 50)
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(outputs[0], outputs[2])
+
+    def test_service_plans_every_trip(self):
+        for mode in ("processes", "threads"):
+            network = grid_network(6, 6, seed=1)
+            drivers = [Driver(f"D{i}", network) for i in range(30)]
+            stats = [driver.pathfinder.enable_stats() for driver in drivers]
+            with tempfile.TemporaryDirectory() as tmp, \
+                 RoutingService(network, max_workers=2, mode=mode) as service:
+                simulation = Simulation(network, drivers, DataCollector(output_dir=tmp), seed=1, routing_service=service)
+                simulation.run(duration=1000)
+
+            started = sum(driver.trip_count for driver in drivers)
+            self.assertGreater(started, 100)
+            self.assertEqual(service.submitted, started + len(simulation.restarts))
+            self.assertEqual(sum(s.queries for s in stats), 0)  # Nothing planned inline
+
+    def test_results_in_request_order(self):
+        network = _line_network()
+        driver = Driver("D0", network)
+        for mode in ("processes", "threads"):
+            with RoutingService(network, max_workers=2, max_pending=1, mode=mode) as service:
+                routes = service.plan([(driver, "A", "D"), (driver, "D", "B"), (driver, "B", "B")])
+            self.assertEqual(routes, [["AB", "BC", "CD"], ["DC", "CB"], []])
+
+
+class TestNetworkGenerators(unittest.TestCase):
+
+    def assertStronglyConnected(self, network):
+        start = next(iter(network.nodes))
+        reached, frontier = {start}, [start]
+        while frontier:
+            for node, _ in network.get_neighbors(frontier.pop()):
+                if node.id not in reached:
+                    reached.add(node.id)
+                    frontier.append(node.id)
+        self.assertEqual(len(reached), len(network.nodes))
+
+    def test_sizes_and_connectivity(self):
+        grid = grid_network(10, 12)
+        self.assertEqual(len(grid.nodes), 120)
+        self.assertEqual(len(grid.roads), 2 * (10 * 11 + 9 * 12))
+
+        ring = radial_ring_network(rings=4, spokes=6)
+        self.assertEqual(len(ring.nodes), 1 + 4 * 6)
+
+        geometric = random_geometric_network(500, seed=2)
+        self.assertGreater(len(geometric.nodes), 400)
+
+        for network in (grid, ring, geometric):
+            self.assertStronglyConnected(network)
+
+    def test_seeded_attributes(self):
+        first, second, other = grid_network(5, 5, seed=1), grid_network(5, 5, seed=1), grid_network(5, 5, seed=2)
+
+        def attributes(network):
+            return [(r.speed_limit_kmh, r.capacity, r.base_stress) for r in network.roads.values()]
+
+        self.assertEqual(attributes(first), attributes(second))
+        self.assertNotEqual(attributes(first), attributes(other))
+        # Row 0 is an arterial, row 1 a local street
+        self.assertGreater(first.roads["r0c0-r0c1"].speed_limit_kmh, first.roads["r1c0-r1c1"].speed_limit_kmh)
+
+    def test_braess_gadgets(self):
+        network = braess_network(gadgets=2)
+        self.assertEqual(len(network.nodes), 7)
+        self.assertEqual(len(network.roads), 10)
+        route = AStar(network).find_path("A0", "B1")
+        self.assertEqual([r.id for r in route], ["A0-S0", "S0-T0", "T0-B0", "B0-S1", "S1-T1", "T1-B1"])
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_report_and_baseline_comparison(self):
+        report = run_benchmarks(["tiny"], repeat=1, queries=10, ticks=10, rows=200, progress=None)
+        results = report["results"]["tiny"]
+        for metric in ("astar_queries_per_sec", "vehicle_updates_per_sec", "trip_rows_per_sec", "bytes_per_driver"):
+            self.assertGreater(results[metric], 0)
+
+        self.assertEqual(compare(report, report), [])
+        faster = {"results": {"tiny": {"astar_queries_per_sec": results["astar_queries_per_sec"] * 2,
+                                       "bytes_per_road": results["bytes_per_road"] / 2}}}
+        self.assertEqual(len(compare(report, faster, tolerance=0.2)), 2)
+
+    def test_vehicle_updates_skip_waiting_drivers(self):
+        # AB holds one vehicle and takes 7.2 s, so D1 waits to start for the first 5 ticks
+        network = _line_network()
+        network.roads["AB"].capacity = 1
+        drivers = [Driver(f"D{i}", network, fixed_route=["A", "D"]) for i in range(2)]
+        with tempfile.TemporaryDirectory() as tmp:
+            simulation = Simulation(network, drivers, DataCollector(output_dir=tmp))
+            simulation.run(duration=5)
+        self.assertTrue(drivers[1].waiting_to_start)
+        self.assertEqual(simulation.vehicle_updates, 5)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_profiled_run(self):
+        add_vehicle = Road.add_vehicle
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = []
+            for profiler in (None, Profiler()):
+                network = _line_network()
+                drivers = [Driver(f"D{i}", network) for i in range(8)]
+                collector = DataCollector(output_dir=os.path.join(tmp, str(bool(profiler))))
+                Simulation(network, drivers, collector, seed=1, profiler=profiler).run(duration=200)
+                with open(collector.trips_file) as f:
+                    outputs.append(f.read())
+
+            self.assertEqual(outputs[0], outputs[1])  # Profiling does not change the run
+            self.assertIs(Road.add_vehicle, add_vehicle)  # Wrappers are removed afterwards
+
+            self.assertEqual(profiler.ticks, 200)
+            self.assertEqual(profiler.phase_calls["tick"], 200)
+            self.assertIn("tick;plan;astar", profiler.phase_seconds)
+            self.assertIn("tick;move;roads", profiler.phase_seconds)
+            self.assertEqual(profiler.counters["trips_completed"], outputs[1].count("\n") - 1)
+            self.assertGreater(profiler.counters["astar_nodes_expanded"], profiler.counters["astar_queries"])
+
+            folded = os.path.join(tmp, "profile.folded")
+            profiler.write_folded(folded)
+            with open(folded) as f:
+                self.assertTrue(all(line.startswith(("tick", "io")) for line in f))
+
+    def test_disabled_profiler_records_nothing(self):
+        network = _line_network()
+        profiler = Profiler(enabled=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            Simulation(network, _four_drivers(network), DataCollector(output_dir=tmp), profiler=profiler).run(duration=50)
+        self.assertEqual(profiler.ticks, 0)
+        self.assertEqual(profiler.phase_seconds, {})
+
+    def test_concurrent_profiled_runs(self):
+        update = Driver.update
+        profilers = [Profiler(), Profiler()]
+        trips = [None, None]
+
+        def run(i, tmp):
+            network = _line_network()
+            drivers = [Driver(f"D{j}", network) for j in range(4 + 4 * i)]
+            collector = DataCollector(output_dir=os.path.join(tmp, str(i)))
+            Simulation(network, drivers, collector, seed=i, profiler=profilers[i]).run(duration=300)
+            with open(collector.trips_file) as f:
+                trips[i] = f.read().count("\n") - 1
+
+        with tempfile.TemporaryDirectory() as tmp:
+            threads = [threading.Thread(target=run, args=(i, tmp)) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Each profiler only counted its own run, and the wrappers are gone once both ended
+        for profiler, count in zip(profilers, trips):
+            self.assertEqual(profiler.counters["trips_completed"], count)
+        self.assertIs(Driver.update, update)
+
+        with profilers[0].instrumented():
+            with self.assertRaises(ValueError):
+                with profilers[0].instrumented():
+                    pass
+        self.assertIs(Driver.update, update)
+
+
+class TestLiveMetrics(unittest.TestCase):
+
+    def test_file_and_http_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = []
+            for live in (False, True):
+                network = _line_network()
+                drivers = [Driver(f"D{i}", network) for i in range(8)]
+                collector = DataCollector(output_dir=os.path.join(tmp, str(live)), route_dictionary=RouteDictionary())
+
+                if live:
+                    path = os.path.join(tmp, "metrics.prom")
+                    with LiveMetrics(path=path, port=0, interval=0.0) as metrics:
+                        simulation = Simulation(network, drivers, collector, seed=1, metrics=metrics)
+                        simulation.run(duration=200)
+                        with urllib.request.urlopen(f"http://127.0.0.1:{metrics.port}/metrics.json") as response:
+                            served = json.load(response)
+                else:
+                    Simulation(network, drivers, collector, seed=1).run(duration=200)
+
+                with open(collector.trips_file) as f:
+                    outputs.append(f.read())
+
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(served["ticks_total"], 200)
+            self.assertEqual(served["simulation_time_seconds"], 200.0)
+            self.assertEqual(served["trips_completed_total"], outputs[1].count("\n") - 1)
+            self.assertGreater(served["route_dedup_ratio"], 0.5)
+
+            with open(path) as f:
+                lines = dict(line.split() for line in f)
+            self.assertEqual(lines["typ_ticks_total"], "200")
+
+
+class TestMemoryReport(unittest.TestCase):
+
+    def test_samples_components(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            network = _line_network()
+            drivers = [Driver(f"D{i}", network) for i in range(8)]
+            collector = DataCollector(output_dir=tmp, route_dictionary=RouteDictionary())
+
+            report = MemoryReport(tmp, interval=50)
+            Simulation(network, drivers, collector, seed=1, memory_report=report).run(duration=120)
+
+            self.assertEqual([s["timestamp"] for s in report.samples], [1.0, 50.0, 100.0, 120.0])
+            last = report.samples[-1]
+            self.assertGreater(last["driver_memory"], 0)
+            self.assertGreater(last["drivers"], 0)
+            self.assertGreater(last["network"], last["road_vehicles"])
+            self.assertIn("driver_memory", report.summary())
+
+            with open(report.filepath) as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(int(rows[-1]["pathfinders"]), last["pathfinders"])
+
+    def test_objects_counted_once(self):
+        shared = [1.5] * 10
+        walker = SizeWalker()
+        first = walker.size({"a": shared})
+        self.assertGreater(first, sys.getsizeof(shared))
+        self.assertEqual(walker.size(shared), 0)
+
+
+class TestPopulationStore(unittest.TestCase):
+
+    def _run(self, directory, duration=900):
+        network = grid_network(6, 6, seed=2)
+        population = PopulationStore.generate(network, 200, seed=4, departure_window=600, dwell=300)
+        collector = DataCollector(output_dir=directory, route_dictionary=RouteDictionary())
+
+        simulation = Simulation(network, [], collector, population=population)
+        peak = 0
+        for step in range(0, duration, 60):
+            simulation.run(duration=step + 60)
+            peak = max(peak, len(simulation.drivers))
+            self.assertEqual(len(simulation.drivers), population.active)
+
+        with open(collector.trips_file) as f:
+            return population, peak, simulation, f.read()
+
+    def test_only_departed_drivers_are_materialised(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            population, peak, simulation, trips = self._run(os.path.join(tmp, "a"))
+            _, _, _, again = self._run(os.path.join(tmp, "b"))
+
+        self.assertEqual(trips, again)
+        self.assertLess(peak, len(population))
+        self.assertGreater(simulation.trips_completed, len(population))
+
+        # Learned memory and trip numbers survive between trips
+        row = max(range(len(population)), key=lambda r: population.trip_count[r])
+        self.assertGreater(population.trip_count[row], 1)
+        self.assertTrue(population.memory[row])
+        numbers = [int(line.split(",")[1]) for line in trips.splitlines()[1:]
+                   if line.startswith(population.ids[row] + ",")]
+        self.assertEqual(numbers, list(range(1, len(numbers) + 1)))
+
+        # Drivers back from a trip are reused, so few objects are ever built
+        self.assertLess(population.active + len(population._pool), len(population))
+
+    def test_seeded_destinations_come_from_per_trip_streams(self):
+        network = _line_network()
+        goals = []
+        for trip in range(3):
+            rng = stream(3, f"driver:P0:{trip}")
+            start = "A" if trip % 2 == 0 else goals[-1]
+            goal = rng.choice(list(network.nodes))
+            while goal == start:
+                goal = rng.choice(list(network.nodes))
+            goals.append(goal)
+
+        # Unlike Simulation(seed=3), which draws every trip from the one stream "driver:P0"
+        population = PopulationStore(network, seed=3)
+        population.add("P0", home="A")
+        with tempfile.TemporaryDirectory() as tmp:
+            simulation = Simulation(network, [], DataCollector(output_dir=tmp, route_dictionary=RouteDictionary()),
+                                    population=population)
+            trips = []
+            while len(trips) < 3:
+                simulation.run(duration=simulation.time + 1)
+                for driver in simulation.drivers:
+                    if driver.trip_count > len(trips):
+                        trips.append(driver.current_vehicle.goal_node)
+        self.assertEqual(trips, goals)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
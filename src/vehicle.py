@@ -1,38 +1,138 @@
 from typing import List, Optional
 
 class Vehicle:
-    
-    def __init__(self, vehicle_id: str, route: List = None, start_node: str = None, goal_node: str = None, pathfinder = None):
 
-        self.id = vehicle_id
+    __slots__ = ("_id", "owner", "trip_number", "route", "start_node", "goal_node", "route_index", "position",
+                 "waiting", "pathfinder", "exact_transitions")
+
+    def __init__(self, vehicle_id: str, route: List = None, start_node: str = None, goal_node: str = None, pathfinder = None, exact_transitions: bool = True):
+
+        self.owner = None  # Driver id when the id is generated lazily, see reset()
+        self.trip_number = 0
+        self.reset(vehicle_id, route, start_node, goal_node, pathfinder, exact_transitions)
+
+    def reset(self, vehicle_id: Optional[str], route: List = None, start_node: str = None, goal_node: str = None, pathfinder = None, exact_transitions: bool = True):
+        # Reuses this vehicle for a new trip. With vehicle_id None the id is built from owner
+        # and trip_number only when it is read, so trips that are never logged never format one
 
         if route is not None: # so you can set custom paths
-            self.route = route
-            self.start_node = route[0].start.id if route else None
-            self.goal_node = route[-1].end.id if route else None
+            start_node = route[0].start.id if route else None
+            goal_node = route[-1].end.id if route else None
         
         elif start_node and goal_node and pathfinder: #A* handles the path
-            self.start_node = start_node
-            self.goal_node = goal_node
-            self.route = pathfinder.find_path(start_node, goal_node)
+            route = pathfinder.find_path(start_node, goal_node)
             
-            if self.route is None:
+            if route is None:
                 raise ValueError(f"No path found from {start_node} to {goal_node}")
         
         else:
             raise ValueError("Must provide either 'route' OR (start_node, goal_node, pathfinder)")
-        
+
+        # Only changed once the new route is known, a failed reset leaves the vehicle as it was
+        self._id = vehicle_id
+        self.route = route
+        self.start_node = start_node
+        self.goal_node = goal_node
         self.route_index = 0
         self.position = 0.0
         self.waiting = False
         self.pathfinder = pathfinder
+
+        # Carry leftover time across road ends within a tick, so large time steps stay accurate
+        self.exact_transitions = exact_transitions
+
+    @property
+    def id(self) -> str:
+        if self._id is None and self.owner is not None:
+            return f"{self.owner}_trip_{self.trip_number}"
+        return self._id
+
+    @id.setter
+    def id(self, vehicle_id: str):
+        self._id = vehicle_id
     
     def get_current_road(self):
         if self.route_index < len(self.route):
             return self.route[self.route_index]
         return None
     
-    def update_position(self, time_step: float):
+    def update_position(self, time_step: float) -> float: # Returns the time actually spent, less than time_step if the trip ended mid-tick
+
+        if not self.exact_transitions:
+            self._update_position_stepped(time_step)
+            return time_step
+
+        remaining = time_step
+
+        while remaining > 0 and not self.has_reached_destination():
+            road = self.route[self.route_index]
+
+            if self.waiting or self.position >= 1.0:
+                if not self._advance(road):
+                    return time_step  # Blocked for the rest of the tick
+                continue
+
+            speed = road.current_speed
+            if speed <= 0:
+                return time_step
+
+            # Time needed to reach the end of the road at its current speed
+            time_to_exit = (1.0 - self.position) * road.distance / speed
+
+            if time_to_exit > remaining:
+                self.position += remaining * speed / road.distance
+                return time_step
+
+            remaining -= time_to_exit
+            self.position = 1.0
+            if not self._advance(road):
+                return time_step
+
+        return time_step - remaining
+
+    def travel(self, time_step: float) -> float: # Moves along the current road only, returns the time left once its end is reached
+
+        # Used by synchronous updates, where changing road waits for a grant. The time left is
+        # carried onto the next road as update_position does, or dropped without exact_transitions
+        if self.position >= 1.0:
+            return time_step if self.exact_transitions else 0.0
+
+        road = self.route[self.route_index]
+        speed = road.current_speed
+        if speed <= 0:
+            return 0.0
+
+        if not self.exact_transitions:
+            self.position = min(1.0, self.position + speed * time_step / road.distance)
+            return 0.0
+
+        time_to_exit = (1.0 - self.position) * road.distance / speed
+        if time_to_exit > time_step:
+            self.position += time_step * speed / road.distance
+            return 0.0
+
+        self.position = 1.0
+        return time_step - time_to_exit
+
+    def _advance(self, road) -> bool: # Move from the end of road onto the next one, False if blocked
+
+        if self.route_index + 1 < len(self.route):
+            next_road = self.route[self.route_index + 1]
+            if not next_road.has_space():
+                self.position = 1.0
+                self.waiting = True
+                return False
+            road.remove_vehicle(self)
+            self.position = 0.0
+            self.route_index += 1
+            next_road.add_vehicle(self)
+            self.waiting = False
+        else:
+            road.remove_vehicle(self)
+            self.route_index += 1
+        return True
+
+    def _update_position_stepped(self, time_step: float): # Original fixed-step movement, one transition per tick at most
 
         if self.has_reached_destination():
             return
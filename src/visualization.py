@@ -99,7 +99,7 @@ def visualize_network_with_traffic(network: TrafficNetwork, title: str = "Traffi
     edge_labels = {}
     for u, v, data in G.edges(data=True):
         road = data["road"]
-        edge_labels[(u, v)] = f"{data['road_id']}\n{len(road.vehicles)}/{road.capacity}"
+        edge_labels[(u, v)] = f"{data['road_id']}\n{road.occupancy}/{road.capacity}"
 
     nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, ax=ax,
                                   font_size=7, label_pos=0.3)
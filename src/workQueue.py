@@ -0,0 +1,249 @@
+import argparse
+import copy
+import ipaddress
+import multiprocessing
+import os
+import secrets
+import socket
+import tempfile
+import threading
+import traceback
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, List, Optional, Tuple
+from src.scenarioRunner import ScenarioSpec, run_scenario, print_progress
+
+"""
+Coordinator / worker queue for running scenarios on several hosts.
+
+The coordinator listens on a TCP port (multiprocessing.connection, authenticated
+with a shared key) and hands out one ScenarioSpec at a time to each connected
+worker. A worker runs the spec with run_scenario into a temporary directory and
+sends back the result together with every file it wrote, which the coordinator
+saves under results_dir/<spec name>. If a worker dies or its run raises, the spec
+goes back on the queue, up to max_attempts times.
+
+Workers need the same code as the coordinator, since specs refer to module-level
+builders and factories. Start one on another host with:
+
+    python -m src.workQueue HOST PORT --authkey KEY
+
+Messages are pickled, so anyone holding the key can run code on the other side.
+There is no default key: a coordinator listening on a loopback address without
+one generates a random key and prints it, and any other address requires an
+explicit key. Files sent back by workers are only written inside results_dir.
+"""
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def _read_outputs(directory: str) -> Dict[str, bytes]: # relative path -> contents
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, directory)] = f.read()
+    return files
+
+
+def _output_path(directory: str, relative: str) -> str:
+    # Paths come from the worker: refuse absolute ones and any that resolve outside directory
+    normal = os.path.normpath(relative)
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, normal))
+    escapes = path == root or os.path.commonpath([root, path]) != root
+    if os.path.isabs(normal) or os.path.splitdrive(normal)[0] or escapes:
+        raise ValueError(f"Output path outside the results directory: {relative!r}")
+    return path
+
+
+def _write_outputs(directory: str, files: Dict[str, bytes]):
+    paths = {relative: _output_path(directory, relative) for relative in files}  # Check all before writing any
+    for relative, data in files.items():
+        path = paths[relative]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+class WorkCoordinator:
+
+    def __init__(self, specs: List[ScenarioSpec], results_dir: str,
+                 address: Tuple[str, int] = ("127.0.0.1", 0), authkey: Optional[bytes] = None,
+                 max_attempts: int = 3):
+
+        if authkey is None:
+            if not _is_loopback(address[0]):
+                raise ValueError("An explicit authkey is required to listen on a non-loopback address")
+            authkey = secrets.token_hex(32).encode()
+            print(f"Work queue authkey: {authkey.decode()}")
+
+        names = [spec.name for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError("Scenario names must be unique")
+
+        self.specs = specs
+        self.results_dir = results_dir
+        self.authkey = authkey
+        self.max_attempts = max_attempts
+
+        self.pending = list(range(len(specs)))  # spec indices waiting for a worker
+        self.attempts = [0] * len(specs)
+        self.results: List[Optional[Dict]] = [None] * len(specs)
+        self.remaining = len(specs)
+        self.condition = threading.Condition()
+        self.progress: Optional[Callable] = None
+
+        # Bind now so workers can be pointed at self.address before serve() is called
+        self.listener = Listener(address, authkey=authkey)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.listener.address
+
+    def serve(self, progress: Optional[Callable] = print_progress) -> List[Dict]:
+        # Blocks until every spec has a result, returned in spec order. Failed specs
+        # have an "error" entry instead of output.
+
+        self.progress = progress
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        threading.Thread(target=self._accept, daemon=True).start()
+
+        with self.condition:
+            while self.remaining:
+                self.condition.wait()
+
+        self.listener.close()
+        return self.results
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError):
+                return  # Listener closed by serve()
+            threading.Thread(target=self._serve_worker, args=(connection,), daemon=True).start()
+
+    def _next_job(self) -> Optional[int]:
+        with self.condition:
+            if self.pending:
+                index = self.pending.pop(0)
+                self.attempts[index] += 1
+                return index
+            return None
+
+    def _finish(self, index: int, result: Dict):
+        with self.condition:
+            self.results[index] = result
+            self.remaining -= 1
+            done = len(self.specs) - self.remaining
+            if self.progress:
+                self.progress(done, len(self.specs), result)
+            self.condition.notify_all()
+
+    def _retry(self, index: int, error: str):
+        with self.condition:
+            if self.attempts[index] < self.max_attempts:
+                self.pending.insert(0, index)
+                return
+        self._finish(index, {"name": self.specs[index].name, "output_dir": None,
+                             "attempts": self.attempts[index], "error": error, "wall_time": 0.0})
+
+    def _serve_worker(self, connection):
+        index = None
+        try:
+            while True:
+                message = connection.recv()
+
+                if message[0] == "result":
+                    _, result, files = message
+                    output_dir = os.path.join(self.results_dir, self.specs[index].name)
+                    try:
+                        _write_outputs(output_dir, files)
+                    except ValueError as error:
+                        self._retry(index, str(error))
+                    else:
+                        result.update(output_dir=output_dir, attempts=self.attempts[index])
+                        self._finish(index, result)
+                    index = None
+                elif message[0] == "failed":
+                    self._retry(index, message[1])
+                    index = None
+
+                # Every message is also a request for the next job
+                index = self._next_job()
+                if index is not None:
+                    connection.send(("job", self.specs[index]))
+                elif self.remaining:
+                    connection.send(("wait", 0.5))  # Others are still running, one may be retried
+                else:
+                    connection.send(("stop",))
+                    return
+        except (EOFError, OSError):
+            # Worker died or disconnected, its spec goes back on the queue
+            if index is not None:
+                self._retry(index, "worker disconnected")
+        finally:
+            connection.close()
+
+
+def run_worker(address: Tuple[str, int], authkey: bytes) -> int:
+    # Runs specs from the coordinator until told to stop. Returns how many it ran
+
+    connection = Client(tuple(address), authkey=authkey)
+    connection.send(("ready", socket.gethostname(), os.getpid()))
+    completed = 0
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break  # Coordinator finished and closed the connection
+
+        if message[0] == "stop":
+            break
+        if message[0] == "wait":
+            threading.Event().wait(message[1])
+            connection.send(("ready",))
+            continue
+
+        spec = copy.copy(message[1])
+        with tempfile.TemporaryDirectory() as run_dir:
+            spec.output_dir = run_dir
+            try:
+                result = run_scenario(spec)
+            except Exception:
+                connection.send(("failed", traceback.format_exc()))
+                continue
+            result["worker"] = f"{socket.gethostname()}:{os.getpid()}"
+            connection.send(("result", result, _read_outputs(run_dir)))
+            completed += 1
+
+    connection.close()
+    return completed
+
+
+def start_local_workers(address: Tuple[str, int], count: int, authkey: bytes) -> List:
+    # Worker processes on this machine, pass coordinator.authkey; join() them after serve() returns
+    processes = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=run_worker, args=(address, authkey), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run scenarios from a work queue coordinator")
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--authkey", required=True, help="key the coordinator was given or printed")
+    args = parser.parse_args()
+
+    print(f"Completed {run_worker((args.host, args.port), args.authkey.encode())} scenarios")